@@ -7,7 +7,6 @@ import uuid
 from datetime import timedelta
 from typing import Optional
 
-from botocore.exceptions import ClientError
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.db import IntegrityError, models, transaction
@@ -26,6 +25,7 @@ from apps.accounts.serializers import (
     RegisterProfileSerializer,
 )
 from apps.files.minio_client import presign_get, s3_client
+from apps.files.uploads import stream_uploads_to_minio
 
 logger = logging.getLogger(__name__)
 
@@ -543,42 +543,28 @@ class UploadAvatarView(APIView):
 
     def post(self, request):
         user: User = request.user
-        
-        if "file" not in request.FILES:
-            return JsonResponse({"error": "No file provided"}, status=400)
-        
-        file_obj = request.FILES["file"]
-        content_type = getattr(file_obj, "content_type", None) or "application/octet-stream"
-        
-        # Validate file type
-        if not content_type.startswith("image/"):
-            return JsonResponse({"error": "Only image files are allowed"}, status=400)
-        
-        # Validate file size (max 5MB for avatars)
-        max_size = 5 * 1024 * 1024  # 5MB
-        if getattr(file_obj, "size", 0) > max_size:
-            return JsonResponse({"error": "File is too large (max 5MB)"}, status=400)
-        
-        # Generate safe filename
-        safe_name = _sanitize_filename(getattr(file_obj, "name", "avatar"))
+
+        # The file is streamed into MinIO while the request body is read (apps/files/uploads.py).
         # Use user ID in key to avoid conflicts
-        key = f"avatars/{user.id}/{int(time.time())}_{safe_name}"
-        
-        # Upload to MinIO
+        upload = stream_uploads_to_minio(
+            request,
+            key_for=lambda name, _ct: f"avatars/{user.id}/{int(time.time())}_{_sanitize_filename(name or 'avatar')}",
+            content_type_prefix="image/",
+            content_type_error="Only image files are allowed",
+            max_size=5 * 1024 * 1024,  # 5MB
+        )
+
+        file_obj = request.FILES.get("file")
+        if upload.error is not None:
+            logger.error(f"[UploadAvatar] Upload rejected for user {user.id}: {upload.error.message}")
+            return JsonResponse({"error": upload.error.message}, status=upload.error.status)
+        if file_obj is None:
+            return JsonResponse({"error": "No file provided"}, status=400)
+
+        key = file_obj.key
+        content_type = file_obj.content_type
         client = s3_client()
-        try:
-            client.upload_fileobj(
-                file_obj,
-                settings.MINIO_BUCKET,
-                key,
-                ExtraArgs={"ContentType": content_type},
-            )
-        except ClientError as e:
-            code = (e.response.get("Error") or {}).get("Code")
-            message = (e.response.get("Error") or {}).get("Message", "Upload failed")
-            logger.error(f"[UploadAvatar] MinIO upload failed for user {user.id}: {code} - {message}")
-            return JsonResponse({"error": f"Upload failed: {code} - {message}"}, status=500)
-        
+
         # Update user profile with MinIO key
         with transaction.atomic():
             profile, created = UserProfile.objects.get_or_create(id=user.id)
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_client = None
+_client_url: str | None = None
+_unavailable_logged = False
+_down_until = 0.0
+
+# After a connection error Redis is skipped for this long, so an outage costs one
+# timeout per worker instead of one per request.
+_BACKOFF_SEC = 30.0
+
+
+def get_redis():
+    """
+    Shared Redis client (redis-py keeps a fork-safe connection pool), or None when
+    REDIS_URL is not configured or the redis package is not installed.
+    Callers must treat Redis as an optional tier and fall back when this returns None
+    or a command raises.
+    """
+    global _client, _client_url, _unavailable_logged
+    url = getattr(settings, "REDIS_URL", None)
+    if not url or time.monotonic() < _down_until:
+        return None
+    if _client is not None and _client_url == url:
+        return _client
+    with _lock:
+        if _client is not None and _client_url == url:
+            return _client
+        try:
+            import redis
+        except ImportError:
+            if not _unavailable_logged:
+                logger.warning("[redis] REDIS_URL is set but the redis package is not installed")
+                _unavailable_logged = True
+            return None
+        _client = redis.Redis.from_url(
+            url,
+            socket_connect_timeout=float(getattr(settings, "REDIS_SOCKET_TIMEOUT", 0.5)),
+            socket_timeout=float(getattr(settings, "REDIS_SOCKET_TIMEOUT", 0.5)),
+        )
+        _client_url = url
+        return _client
+
+
+def report_redis_error(exc: Exception) -> None:
+    """Record a failed Redis call; get_redis() returns None for a short backoff period."""
+    global _down_until
+    _down_until = time.monotonic() + _BACKOFF_SEC
+    logger.warning(f"[redis] {exc}; skipping Redis for {int(_BACKOFF_SEC)}s")
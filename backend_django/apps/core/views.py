@@ -11,7 +11,8 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 
 from apps.core.models import HeroSliderImage, SiteSettings
-from apps.files.minio_client import presign_get, s3_client
+from apps.files.minio_client import presign_get, presign_many, s3_client, transfer_config
+from apps.files.uploads import stream_uploads_to_minio
 
 
 class IsAdmin(IsAuthenticated):
@@ -107,37 +108,26 @@ class HeroImageView(APIView):
         if not row:
             return JsonResponse({"error": "Site settings not initialized"}, status=500)
 
+        # A multipart file is streamed into MinIO while the body is read (apps/files/uploads.py).
+        upload = stream_uploads_to_minio(
+            request,
+            key_for=lambda name, _ct: f"hero/{int(time.time())}_{_sanitize_filename(name or 'image')}",
+            content_type_prefix="image/",
+            content_type_error="Only image uploads are allowed",
+            max_size=20 * 1024 * 1024,  # 20MB
+        )
         file_obj = request.FILES.get("file")
         key_from_body = request.data.get("key")
 
+        if upload.error is not None:
+            return JsonResponse({"error": upload.error.message}, status=upload.error.status)
         if file_obj is None and not key_from_body:
             return JsonResponse({"error": "Missing file or key"}, status=400)
 
-        # Case A: file upload via backend
+        # Case A: file upload via backend (already stored by the upload handler)
         if file_obj is not None:
-            content_type = getattr(file_obj, "content_type", None) or "application/octet-stream"
-            if not content_type.startswith("image/"):
-                return JsonResponse({"error": "Only image uploads are allowed"}, status=400)
-
-            max_size = 20 * 1024 * 1024  # 20MB
-            if getattr(file_obj, "size", 0) > max_size:
-                return JsonResponse({"error": "File is too large (max 20MB)"}, status=400)
-
-            safe_name = _sanitize_filename(getattr(file_obj, "name", "image"))
-            key = f"hero/{int(time.time())}_{safe_name}"
-
-            client = s3_client()
-            try:
-                client.upload_fileobj(
-                    file_obj,
-                    settings.MINIO_BUCKET,
-                    key,
-                    ExtraArgs={"ContentType": content_type},
-                )
-            except ClientError as e:
-                code = (e.response.get("Error") or {}).get("Code")
-                message = (e.response.get("Error") or {}).get("Message", "Upload failed")
-                return JsonResponse({"error": f"Upload failed: {code} - {message}"}, status=500)
+            key = file_obj.key
+            content_type = file_obj.content_type
 
             row.hero_background_image = key
             row.save(update_fields=["hero_background_image"])
@@ -179,15 +169,12 @@ class HeroSliderView(APIView):
                 .order_by("order_index", "id")
                 .values("id", "key", "order_index")
             )
+            urls = presign_many([item["key"] for item in items], expires_in=60 * 60 * 24 * 7)
             result = []
             for item in items:
                 key = (item["key"] or "").lstrip("/")
-                if not key:
-                    continue
-                try:
-                    url = presign_get(key, expires_in=60 * 60 * 24 * 7)
-                except (ClientError, Exception) as e:
-                    # If presigned URL fails, skip this item
+                url = urls.get(item["key"])
+                if not key or not url:
                     continue
                 result.append(
                     {
@@ -281,15 +268,13 @@ class HeroSliderView(APIView):
                 .order_by("order_index", "id")
                 .values("id", "key", "order_index")
             )
+            urls = presign_many([item["key"] for item in items], expires_in=60 * 60 * 24 * 7)
             result = []
             for item in items:
                 key = (item["key"] or "").lstrip("/")
                 if not key:
                     continue
-                try:
-                    url = presign_get(key, expires_in=60 * 60 * 24 * 7)
-                except (ClientError, Exception):
-                    url = None
+                url = urls.get(item["key"])
                 result.append(
                     {
                         "id": item["id"],
@@ -341,6 +326,7 @@ class HeroSliderUploadView(APIView):
                     settings.MINIO_BUCKET,
                     key,
                     ExtraArgs={"ContentType": content_type},
+                    Config=transfer_config(),
                 )
                 url = presign_get(key, expires_in=60 * 60 * 24 * 7, response_content_type=content_type)
                 uploaded.append({"key": key, "url": url})
@@ -430,6 +416,7 @@ class HeroSliderLoadFromPublicView(APIView):
                         settings.MINIO_BUCKET,
                         key,
                         ExtraArgs={"ContentType": content_type},
+                        Config=transfer_config(),
                     )
 
                 url = presign_get(key, expires_in=60 * 60 * 24 * 7, response_content_type=content_type)
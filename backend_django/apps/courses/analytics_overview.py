@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import json
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+# Live numbers for the admin analytics overview in one round-trip.
+#
+# Status counts and averages come from a single scan of user_course_programs with
+# FILTER (WHERE ...) aggregates; the 30-day activity timeline is built by CTEs over
+# generate_series and returned as JSON in the same row. Used by
+# AdminAnalyticsOverviewView whenever the rollups (analytics_rollups.py) are not fresh.
+#
+# `manage.py check_analytics_queries` locks in the endpoint's query budget.
+
+# Round-trips per AdminAnalyticsOverviewView request: the rollup read, plus this
+# statement when the rollup is missing or stale.
+OVERVIEW_QUERY_BUDGET = 2
+
+_OVERVIEW_SQL = """
+    WITH enrollments AS (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'not_started') AS not_started,
+               COUNT(*) FILTER (WHERE status = 'in_progress') AS in_progress,
+               COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+               AVG(progress_percent) AS avg_progress,
+               COUNT(DISTINCT user_id) FILTER (WHERE last_activity >= %(active_since)s) AS active_users
+        FROM user_course_programs
+    ),
+    completed_materials AS (
+        SELECT material_type, COUNT(*) AS cnt
+        FROM user_course_materials
+        WHERE is_completed = true
+        GROUP BY material_type
+    ),
+    days AS (
+        SELECT d::date AS day
+        FROM generate_series(%(since)s::date, %(today)s::date, interval '1 day') AS d
+    ),
+    enrolled AS (
+        SELECT DATE(created_at) AS day, COUNT(*) AS cnt
+        FROM user_course_programs WHERE created_at >= %(since)s GROUP BY 1
+    ),
+    finished AS (
+        SELECT DATE(completed_at) AS day, COUNT(*) AS cnt
+        FROM user_course_programs WHERE completed_at >= %(since)s GROUP BY 1
+    ),
+    viewed AS (
+        SELECT DATE(viewed_at) AS day, COUNT(*) AS cnt
+        FROM user_course_materials WHERE viewed_at >= %(since)s GROUP BY 1
+    )
+    SELECT
+        (SELECT COUNT(*) FROM users),
+        (SELECT COUNT(DISTINCT user_id) FROM user_sessions WHERE last_activity >= %(active_since)s),
+        (SELECT COUNT(*) FROM course_programs),
+        e.total, e.not_started, e.in_progress, e.completed, e.avg_progress, e.active_users,
+        (SELECT AVG(score) FROM test_results),
+        (SELECT jsonb_object_agg(material_type, cnt) FROM completed_materials),
+        (
+            SELECT jsonb_agg(
+                jsonb_build_object(
+                    'date', to_char(days.day, 'YYYY-MM-DD'),
+                    'enrollments', COALESCE(enrolled.cnt, 0),
+                    'completions', COALESCE(finished.cnt, 0),
+                    'materials_viewed', COALESCE(viewed.cnt, 0)
+                )
+                ORDER BY days.day
+            )
+            FROM days
+            LEFT JOIN enrolled ON enrolled.day = days.day
+            LEFT JOIN finished ON finished.day = days.day
+            LEFT JOIN viewed ON viewed.day = days.day
+        )
+    FROM enrollments e
+"""
+
+
+def _json(value, default):
+    if value is None:
+        return default
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def overview_snapshot(days: int = 30, active_days: int = 30) -> dict:
+    """AdminAnalyticsOverviewView payload computed live, in a single query."""
+    now = timezone.now()
+    today = now.date()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            _OVERVIEW_SQL,
+            {
+                "active_since": now - timedelta(days=active_days),
+                "since": today - timedelta(days=days - 1),
+                "today": today,
+            },
+        )
+        (
+            total_users,
+            session_users,
+            total_course_programs,
+            total_enrollments,
+            not_started,
+            in_progress,
+            completed,
+            avg_progress,
+            enrollment_users,
+            avg_test_score,
+            completed_by_type,
+            timeline,
+        ) = cursor.fetchone()
+
+    materials_by_type = {"video": 0, "pdf": 0, "test": 0}
+    materials_by_type.update(_json(completed_by_type, {}))
+
+    return {
+        "total_users": total_users,
+        # Users with a recent session; without session tracking, recently active learners.
+        "active_users": session_users or enrollment_users,
+        "total_course_programs": total_course_programs,
+        "total_enrollments": total_enrollments,
+        "active_enrollments": in_progress,
+        "completed_enrollments": completed,
+        "total_materials_viewed": sum(materials_by_type.values()),
+        "average_progress": round(float(avg_progress or 0), 2),
+        "average_test_score": round(float(avg_test_score or 0), 2),
+        "materials_by_type": materials_by_type,
+        "enrollments_by_status": {
+            "not_started": not_started,
+            "in_progress": in_progress,
+            "completed": completed,
+        },
+        "activity_timeline": _json(timeline, []),
+    }
@@ -0,0 +1,656 @@
+from __future__ import annotations
+
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Pre-aggregated admin analytics (migrations/analytics_rollups.sql).
+#
+# `manage.py refresh_analytics_rollups --loop` rebuilds the rollup tables every
+# ANALYTICS_ROLLUP_REFRESH_SEC with set-based INSERT ... SELECT statements, one
+# transaction per refresh: readers keep seeing the previous snapshot until it commits.
+# The admin analytics endpoints (AdminAnalytics{Overview,Stations,Users,Materials}View)
+# then read a handful of rows per page instead of grouping user_course_programs,
+# user_course_materials and test_results on every load.
+#
+# The readers below return None when rollups are disabled, the schema is not applied,
+# or the last refresh is older than ANALYTICS_ROLLUP_MAX_AGE_SEC; the views then
+# compute the numbers live, as before.
+
+STATE_NAME = "admin_analytics"
+# Advisory lock key: only one refresh at a time across worker containers.
+_REFRESH_LOCK_ID = 7_310_021
+
+STATION_MATERIAL_TYPES = ("video", "pdf", "text", "presentation", "test")
+PROGRAM_MATERIAL_TYPES = ("video", "pdf", "test")
+
+
+def rollups_enabled() -> bool:
+    return bool(getattr(settings, "ANALYTICS_ROLLUPS_ENABLED", True))
+
+
+def _zeros(types) -> str:
+    return json.dumps({t: 0 for t in types})
+
+
+def _as_dict(value) -> dict:
+    # JSONB comes back decoded from psycopg; tolerate text just in case.
+    if isinstance(value, str):
+        return json.loads(value)
+    return dict(value or {})
+
+
+def _as_list(value) -> list:
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value or [])
+
+
+# -- refresh --
+
+def _refresh_overview(cur, now, active_since) -> None:
+    cur.execute("DELETE FROM analytics_overview_rollup")
+    cur.execute(
+        """
+        INSERT INTO analytics_overview_rollup (
+            id, total_users, active_users, total_course_programs,
+            total_enrollments, not_started_enrollments, active_enrollments, completed_enrollments,
+            total_materials_viewed, average_progress, average_test_score,
+            materials_total, materials_completed, most_viewed, refreshed_at
+        )
+        SELECT
+            1,
+            (SELECT COUNT(*) FROM users),
+            COALESCE(
+                NULLIF((SELECT COUNT(DISTINCT user_id) FROM user_sessions WHERE last_activity >= %(since)s), 0),
+                (SELECT COUNT(DISTINCT user_id) FROM user_course_programs WHERE last_activity >= %(since)s)
+            ),
+            (SELECT COUNT(*) FROM course_programs),
+            e.total, e.not_started, e.in_progress, e.completed,
+            m.viewed,
+            COALESCE(e.avg_progress, 0),
+            COALESCE((SELECT AVG(score) FROM test_results), 0),
+            jsonb_build_object(
+                'video', f.video,
+                'pdf', f.pdf,
+                'test', (SELECT COUNT(*) FROM course_program_lesson_tests WHERE is_active = true)
+                      + (SELECT COUNT(*) FROM final_tests WHERE is_active = true)
+            ),
+            %(zeros)s::jsonb || COALESCE(m.by_type, '{}'::jsonb),
+            COALESCE(
+                (
+                    SELECT jsonb_agg(v ORDER BY v.view_count DESC)
+                    FROM (
+                        SELECT ucm.material_key, ucm.material_type, cp.title AS course_title, COUNT(*) AS view_count
+                        FROM user_course_materials ucm
+                        JOIN course_programs cp ON cp.id = ucm.course_program_id
+                        WHERE ucm.is_completed = true
+                        GROUP BY ucm.material_key, ucm.material_type, cp.title
+                        ORDER BY view_count DESC
+                        LIMIT 20
+                    ) v
+                ),
+                '[]'::jsonb
+            ),
+            %(now)s
+        FROM (
+            SELECT COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE status = 'not_started') AS not_started,
+                   COUNT(*) FILTER (WHERE status = 'in_progress') AS in_progress,
+                   COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+                   AVG(progress_percent) AS avg_progress
+            FROM user_course_programs
+        ) e,
+        (
+            SELECT COALESCE(SUM(cnt), 0) AS viewed, jsonb_object_agg(material_type, cnt) AS by_type
+            FROM (
+                SELECT material_type, COUNT(*) AS cnt
+                FROM user_course_materials
+                WHERE is_completed = true
+                GROUP BY material_type
+            ) t
+        ) m,
+        (
+            SELECT COUNT(*) FILTER (WHERE file_type = 'video') AS video,
+                   COUNT(*) FILTER (WHERE file_type = 'pdf') AS pdf
+            FROM course_program_topic_files
+            WHERE is_active = true
+        ) f
+        """,
+        {"since": active_since, "now": now, "zeros": _zeros(PROGRAM_MATERIAL_TYPES)},
+    )
+
+
+def _refresh_stations(cur, now, active_since) -> None:
+    cur.execute("DELETE FROM analytics_station_rollup")
+    cur.execute(
+        """
+        INSERT INTO analytics_station_rollup (
+            station_id, course_programs,
+            total_enrollments, active_enrollments, completed_enrollments,
+            unique_users, active_users, average_progress, total_hours,
+            average_test_score, test_attempts, tests_passed,
+            materials_total, materials_completed, last_activity, refreshed_at
+        )
+        SELECT
+            s.id,
+            COALESCE(p.programs, 0),
+            COALESCE(e.total, 0), COALESCE(e.active, 0), COALESCE(e.completed, 0),
+            COALESCE(e.unique_users, 0), COALESCE(e.active_users, 0),
+            COALESCE(e.avg_progress, 0), COALESCE(e.total_hours, 0),
+            COALESCE(r.avg_score, 0), COALESCE(r.attempts, 0), COALESCE(r.passed, 0),
+            jsonb_build_object(
+                'video', COALESCE(f.video, 0),
+                'pdf', COALESCE(f.pdf, 0),
+                'text', COALESCE(tp.topics, 0),
+                'presentation', COALESCE(f.other, 0),
+                'test', COALESCE(lt.tests, 0) + COALESCE(ft.tests, 0)
+            ),
+            %(zeros)s::jsonb || COALESCE(c.by_type, '{}'::jsonb),
+            e.last_activity,
+            %(now)s
+        FROM stations s
+        LEFT JOIN (
+            SELECT station_id, COUNT(*) AS programs FROM course_programs GROUP BY station_id
+        ) p ON p.station_id = s.id
+        LEFT JOIN (
+            SELECT cp.station_id,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE ucp.status = 'in_progress') AS active,
+                   COUNT(*) FILTER (WHERE ucp.status = 'completed') AS completed,
+                   COUNT(DISTINCT ucp.user_id) AS unique_users,
+                   COUNT(DISTINCT ucp.user_id) FILTER (WHERE ucp.last_activity >= %(since)s) AS active_users,
+                   AVG(ucp.progress_percent) AS avg_progress,
+                   SUM(ucp.hours_studied) AS total_hours,
+                   MAX(ucp.last_activity) AS last_activity
+            FROM user_course_programs ucp
+            JOIN course_programs cp ON cp.id = ucp.course_program_id
+            GROUP BY cp.station_id
+        ) e ON e.station_id = s.id
+        LEFT JOIN (
+            SELECT cp.station_id,
+                   AVG(r.score) AS avg_score,
+                   COUNT(*) AS attempts,
+                   COUNT(*) FILTER (WHERE r.is_passed) AS passed
+            FROM test_results r
+            LEFT JOIN course_program_lesson_tests lt ON lt.id = r.test_id AND r.test_type = 'lesson'
+            LEFT JOIN course_program_lessons l ON l.id = lt.course_program_lesson_id
+            LEFT JOIN final_tests ft ON ft.id = r.test_id AND r.test_type = 'final'
+            JOIN course_programs cp ON cp.id = COALESCE(l.course_program_id, ft.course_program_id)
+            GROUP BY cp.station_id
+        ) r ON r.station_id = s.id
+        LEFT JOIN (
+            SELECT cp.station_id, COUNT(*) AS topics
+            FROM course_program_topics t
+            JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
+            JOIN course_programs cp ON cp.id = l.course_program_id
+            WHERE t.is_active = true
+            GROUP BY cp.station_id
+        ) tp ON tp.station_id = s.id
+        LEFT JOIN (
+            SELECT cp.station_id,
+                   COUNT(*) FILTER (WHERE f.file_type = 'video') AS video,
+                   COUNT(*) FILTER (WHERE f.file_type = 'pdf') AS pdf,
+                   COUNT(*) FILTER (WHERE f.file_type NOT IN ('video', 'pdf')) AS other
+            FROM course_program_topic_files f
+            JOIN course_program_topics t ON t.id = f.course_program_topic_id
+            JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
+            JOIN course_programs cp ON cp.id = l.course_program_id
+            WHERE f.is_active = true
+            GROUP BY cp.station_id
+        ) f ON f.station_id = s.id
+        LEFT JOIN (
+            SELECT cp.station_id, COUNT(*) AS tests
+            FROM course_program_lesson_tests lt
+            JOIN course_program_lessons l ON l.id = lt.course_program_lesson_id
+            JOIN course_programs cp ON cp.id = l.course_program_id
+            WHERE lt.is_active = true
+            GROUP BY cp.station_id
+        ) lt ON lt.station_id = s.id
+        LEFT JOIN (
+            SELECT cp.station_id, COUNT(*) AS tests
+            FROM final_tests ft
+            JOIN course_programs cp ON cp.id = ft.course_program_id
+            WHERE ft.is_active = true
+            GROUP BY cp.station_id
+        ) ft ON ft.station_id = s.id
+        LEFT JOIN (
+            SELECT station_id, jsonb_object_agg(material_type, cnt) AS by_type
+            FROM (
+                SELECT cp.station_id, ucm.material_type, COUNT(*) AS cnt
+                FROM user_course_materials ucm
+                JOIN course_programs cp ON cp.id = ucm.course_program_id
+                WHERE ucm.is_completed = true
+                GROUP BY cp.station_id, ucm.material_type
+            ) t
+            GROUP BY station_id
+        ) c ON c.station_id = s.id
+        """,
+        {"since": active_since, "now": now, "zeros": _zeros(STATION_MATERIAL_TYPES)},
+    )
+
+
+def _refresh_programs(cur, now) -> None:
+    cur.execute("DELETE FROM analytics_program_rollup")
+    cur.execute(
+        """
+        INSERT INTO analytics_program_rollup (
+            course_program_id, station_id,
+            total_enrollments, active_enrollments, completed_enrollments, average_progress,
+            materials_total, materials_completed, refreshed_at
+        )
+        SELECT
+            cp.id, cp.station_id,
+            COALESCE(e.total, 0), COALESCE(e.active, 0), COALESCE(e.completed, 0),
+            COALESCE(e.avg_progress, 0),
+            jsonb_build_object(
+                'video', COALESCE(f.video, 0),
+                'pdf', COALESCE(f.pdf, 0),
+                'test', COALESCE(lt.tests, 0) + COALESCE(ft.tests, 0)
+            ),
+            %(zeros)s::jsonb || COALESCE(c.by_type, '{}'::jsonb),
+            %(now)s
+        FROM course_programs cp
+        LEFT JOIN (
+            SELECT course_program_id,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE status = 'in_progress') AS active,
+                   COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+                   AVG(progress_percent) AS avg_progress
+            FROM user_course_programs
+            GROUP BY course_program_id
+        ) e ON e.course_program_id = cp.id
+        LEFT JOIN (
+            SELECT l.course_program_id,
+                   COUNT(*) FILTER (WHERE f.file_type = 'video') AS video,
+                   COUNT(*) FILTER (WHERE f.file_type = 'pdf') AS pdf
+            FROM course_program_topic_files f
+            JOIN course_program_topics t ON t.id = f.course_program_topic_id
+            JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
+            WHERE f.is_active = true
+            GROUP BY l.course_program_id
+        ) f ON f.course_program_id = cp.id
+        LEFT JOIN (
+            SELECT l.course_program_id, COUNT(*) AS tests
+            FROM course_program_lesson_tests lt
+            JOIN course_program_lessons l ON l.id = lt.course_program_lesson_id
+            WHERE lt.is_active = true
+            GROUP BY l.course_program_id
+        ) lt ON lt.course_program_id = cp.id
+        LEFT JOIN (
+            SELECT course_program_id, COUNT(*) AS tests
+            FROM final_tests
+            WHERE is_active = true
+            GROUP BY course_program_id
+        ) ft ON ft.course_program_id = cp.id
+        LEFT JOIN (
+            SELECT course_program_id, jsonb_object_agg(material_type, cnt) AS by_type
+            FROM (
+                SELECT course_program_id, material_type, COUNT(*) AS cnt
+                FROM user_course_materials
+                WHERE is_completed = true
+                GROUP BY course_program_id, material_type
+            ) t
+            GROUP BY course_program_id
+        ) c ON c.course_program_id = cp.id
+        """,
+        {"now": now, "zeros": _zeros(PROGRAM_MATERIAL_TYPES)},
+    )
+
+
+def _refresh_users(cur, now) -> None:
+    cur.execute("DELETE FROM analytics_user_rollup")
+    cur.execute(
+        """
+        INSERT INTO analytics_user_rollup (
+            user_id, total_enrollments, active_courses, completed_courses,
+            total_hours_studied, average_progress, average_test_score,
+            materials_completed, last_activity, refreshed_at
+        )
+        SELECT
+            u.id,
+            COALESCE(e.total, 0), COALESCE(e.active, 0), COALESCE(e.completed, 0),
+            COALESCE(e.total_hours, 0), COALESCE(e.avg_progress, 0), COALESCE(r.avg_score, 0),
+            %(zeros)s::jsonb || COALESCE(c.by_type, '{}'::jsonb),
+            e.last_activity,
+            %(now)s
+        FROM users u
+        LEFT JOIN (
+            SELECT user_id,
+                   COUNT(*) AS total,
+                   COUNT(*) FILTER (WHERE status = 'in_progress') AS active,
+                   COUNT(*) FILTER (WHERE status = 'completed') AS completed,
+                   AVG(progress_percent) AS avg_progress,
+                   SUM(hours_studied) AS total_hours,
+                   MAX(last_activity) AS last_activity
+            FROM user_course_programs
+            GROUP BY user_id
+        ) e ON e.user_id = u.id
+        LEFT JOIN (
+            SELECT user_id, AVG(score) AS avg_score FROM test_results GROUP BY user_id
+        ) r ON r.user_id = u.id
+        LEFT JOIN (
+            SELECT user_id, jsonb_object_agg(material_type, cnt) AS by_type
+            FROM (
+                SELECT user_id, material_type, COUNT(*) AS cnt
+                FROM user_course_materials
+                WHERE is_completed = true
+                GROUP BY user_id, material_type
+            ) t
+            GROUP BY user_id
+        ) c ON c.user_id = u.id
+        """,
+        {"now": now, "zeros": _zeros(STATION_MATERIAL_TYPES)},
+    )
+
+
+def _refresh_daily(cur, now, days: int) -> None:
+    # UTC days, like DATE(...) on the (UTC) database session and _build_activity_timeline
+    today = now.date()
+    since = today - timedelta(days=days - 1)
+    cur.execute("DELETE FROM analytics_daily_activity WHERE day >= %s", [since])
+    cur.execute(
+        """
+        INSERT INTO analytics_daily_activity (day, enrollments, completions, materials_viewed, refreshed_at)
+        SELECT d.day::date,
+               COALESCE(en.cnt, 0), COALESCE(co.cnt, 0), COALESCE(mv.cnt, 0),
+               %(now)s
+        FROM generate_series(%(since)s::date, %(today)s::date, interval '1 day') AS d(day)
+        LEFT JOIN (
+            SELECT DATE(created_at) AS day, COUNT(*) AS cnt
+            FROM user_course_programs WHERE created_at >= %(since)s GROUP BY 1
+        ) en ON en.day = d.day::date
+        LEFT JOIN (
+            SELECT DATE(completed_at) AS day, COUNT(*) AS cnt
+            FROM user_course_programs WHERE completed_at >= %(since)s GROUP BY 1
+        ) co ON co.day = d.day::date
+        LEFT JOIN (
+            SELECT DATE(viewed_at) AS day, COUNT(*) AS cnt
+            FROM user_course_materials WHERE viewed_at >= %(since)s GROUP BY 1
+        ) mv ON mv.day = d.day::date
+        """,
+        {"since": since, "today": today, "now": now},
+    )
+
+
+def refresh_rollups() -> float | None:
+    """
+    Rebuild every rollup table in one transaction; returns the duration in seconds,
+    or None when another refresh is already running.
+    """
+    started = time.monotonic()
+    now = timezone.now()
+    active_since = now - timedelta(days=30)
+    days = max(30, int(getattr(settings, "ANALYTICS_ROLLUP_DAYS", 90)))
+    with transaction.atomic():
+        with connection.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s)", [_REFRESH_LOCK_ID])
+            if not cur.fetchone()[0]:
+                return None
+            _refresh_overview(cur, now, active_since)
+            _refresh_stations(cur, now, active_since)
+            _refresh_programs(cur, now)
+            _refresh_users(cur, now)
+            _refresh_daily(cur, now, days)
+            elapsed = time.monotonic() - started
+            cur.execute(
+                """
+                INSERT INTO analytics_rollup_state (name, refreshed_at, duration_ms)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (name) DO UPDATE
+                SET refreshed_at = EXCLUDED.refreshed_at, duration_ms = EXCLUDED.duration_ms
+                """,
+                [STATE_NAME, now, int(elapsed * 1000)],
+            )
+    return elapsed
+
+
+# -- readers (None = use live queries) --
+
+def _fresh_since():
+    return timezone.now() - timedelta(seconds=float(getattr(settings, "ANALYTICS_ROLLUP_MAX_AGE_SEC", 900)))
+
+
+def _fresh() -> bool:
+    if not rollups_enabled():
+        return False
+    try:
+        with connection.cursor() as cur:
+            cur.execute("SELECT refreshed_at FROM analytics_rollup_state WHERE name = %s", [STATE_NAME])
+            row = cur.fetchone()
+    except DatabaseError as e:
+        logger.warning(f"[analytics_rollups] Rollup state unavailable, using live queries: {e}")
+        return False
+    return row is not None and row[0] >= _fresh_since()
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def overview() -> dict | None:
+    """AdminAnalyticsOverviewView payload from the rollups (one query, freshness included), or None."""
+    if not rollups_enabled():
+        return None
+    today = timezone.now().date()
+    try:
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                SELECT o.total_users, o.active_users, o.total_course_programs,
+                       o.total_enrollments, o.not_started_enrollments, o.active_enrollments, o.completed_enrollments,
+                       o.total_materials_viewed, o.average_progress, o.average_test_score, o.materials_completed,
+                       (
+                           SELECT jsonb_agg(
+                               jsonb_build_object(
+                                   'date', to_char(d.day, 'YYYY-MM-DD'),
+                                   'enrollments', COALESCE(a.enrollments, 0),
+                                   'completions', COALESCE(a.completions, 0),
+                                   'materials_viewed', COALESCE(a.materials_viewed, 0)
+                               )
+                               ORDER BY d.day
+                           )
+                           FROM generate_series(%(since)s::date, %(today)s::date, interval '1 day') AS d(day)
+                           LEFT JOIN analytics_daily_activity a ON a.day = d.day::date
+                       )
+                FROM analytics_overview_rollup o
+                JOIN analytics_rollup_state s ON s.name = %(state)s
+                WHERE o.id = 1 AND s.refreshed_at >= %(fresh_since)s
+                """,
+                {
+                    "since": today - timedelta(days=29),
+                    "today": today,
+                    "state": STATE_NAME,
+                    "fresh_since": _fresh_since(),
+                },
+            )
+            row = cur.fetchone()
+    except DatabaseError as e:
+        logger.warning(f"[analytics_rollups] Overview rollup unavailable, using live queries: {e}")
+        return None
+    if row is None:
+        return None
+    (
+        total_users,
+        active_users,
+        total_course_programs,
+        total_enrollments,
+        not_started,
+        active_enrollments,
+        completed_enrollments,
+        materials_viewed,
+        avg_progress,
+        avg_test_score,
+        materials_completed,
+        timeline,
+    ) = row
+    return {
+        "total_users": total_users,
+        "active_users": active_users,
+        "total_course_programs": total_course_programs,
+        "total_enrollments": total_enrollments,
+        "active_enrollments": active_enrollments,
+        "completed_enrollments": completed_enrollments,
+        "total_materials_viewed": materials_viewed,
+        "average_progress": round(float(avg_progress), 2),
+        "average_test_score": round(float(avg_test_score), 2),
+        "materials_by_type": _as_dict(materials_completed),
+        "enrollments_by_status": {
+            "not_started": not_started,
+            "in_progress": active_enrollments,
+            "completed": completed_enrollments,
+        },
+        "activity_timeline": _as_list(timeline),
+    }
+
+
+def station_stats() -> list[dict] | None:
+    """AdminAnalyticsStationsView rows (all stations), or None."""
+    if not _fresh():
+        return None
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT s.id, s.name, s.short_name, s.status,
+                   r.course_programs, r.total_enrollments, r.active_enrollments, r.completed_enrollments,
+                   r.unique_users, r.average_progress, r.average_test_score,
+                   r.materials_total, r.materials_completed, r.active_users, r.last_activity
+            FROM stations s
+            LEFT JOIN analytics_station_rollup r ON r.station_id = s.id
+            ORDER BY s.id
+            """
+        )
+        rows = cur.fetchall()
+    data = []
+    for (
+        station_id,
+        name,
+        short_name,
+        status,
+        course_programs,
+        total,
+        active,
+        completed,
+        unique_users,
+        avg_progress,
+        avg_score,
+        materials_total,
+        materials_completed,
+        active_users,
+        last_activity,
+    ) in rows:
+        totals = {t: 0 for t in STATION_MATERIAL_TYPES}
+        totals.update(_as_dict(materials_total))
+        done = {t: 0 for t in STATION_MATERIAL_TYPES}
+        done.update(_as_dict(materials_completed))
+        data.append(
+            {
+                "station_id": station_id,
+                "name": name,
+                "short_name": short_name,
+                "status": status,
+                "course_programs": course_programs or 0,
+                "total_enrollments": total or 0,
+                "active_enrollments": active or 0,
+                "completed_enrollments": completed or 0,
+                "unique_users": unique_users or 0,
+                "average_progress": round(float(avg_progress or 0), 2),
+                "average_test_score": round(float(avg_score or 0), 2),
+                "total_materials": sum(totals.values()),
+                "materials_by_type": totals,
+                "completed_materials_by_type": done,
+                "active_users": active_users or 0,
+                "last_activity": _iso(last_activity),
+            }
+        )
+    return data
+
+
+def user_stats() -> dict[str, dict] | None:
+    """{user_id: per-user aggregates for AdminAnalyticsUsersView}, or None."""
+    if not _fresh():
+        return None
+    with connection.cursor() as cur:
+        cur.execute(
+            """
+            SELECT user_id, total_enrollments, active_courses, completed_courses,
+                   total_hours_studied, average_progress, average_test_score,
+                   materials_completed, last_activity
+            FROM analytics_user_rollup
+            """
+        )
+        rows = cur.fetchall()
+    return {
+        str(user_id): {
+            "total_enrollments": total,
+            "active_courses": active,
+            "completed_courses": completed,
+            "total_hours_studied": float(hours or 0),
+            "average_progress": round(float(avg_progress or 0), 2),
+            "average_test_score": round(float(avg_score or 0), 2),
+            "materials_completed": _as_dict(materials),
+            "last_activity": _iso(last_activity),
+        }
+        for user_id, total, active, completed, hours, avg_progress, avg_score, materials, last_activity in rows
+    }
+
+
+def materials() -> dict | None:
+    """AdminAnalyticsMaterialsView payload from the rollups, or None."""
+    if not _fresh():
+        return None
+    with connection.cursor() as cur:
+        cur.execute(
+            "SELECT materials_total, materials_completed, most_viewed FROM analytics_overview_rollup WHERE id = 1"
+        )
+        overview_row = cur.fetchone()
+        if overview_row is None:
+            return None
+        cur.execute(
+            """
+            SELECT cp.id, cp.title, r.materials_total, r.materials_completed
+            FROM course_programs cp
+            LEFT JOIN analytics_program_rollup r ON r.course_program_id = cp.id
+            ORDER BY cp.id
+            """
+        )
+        program_rows = cur.fetchall()
+
+    totals = {t: 0 for t in PROGRAM_MATERIAL_TYPES}
+    totals.update(_as_dict(overview_row[0]))
+    completed = _as_dict(overview_row[1])
+    by_type = {}
+    for key, total in totals.items():
+        viewed = completed.get(key, 0)
+        by_type[key] = {
+            "total": total,
+            "viewed" if key != "test" else "completed": viewed,
+            "completion_rate": round((viewed / total) * 100, 2) if total else 0,
+        }
+
+    by_course = []
+    for program_id, title, program_totals, program_completed in program_rows:
+        t = {k: 0 for k in PROGRAM_MATERIAL_TYPES}
+        t.update(_as_dict(program_totals))
+        c = {k: 0 for k in PROGRAM_MATERIAL_TYPES}
+        c.update(_as_dict(program_completed))
+        by_course.append(
+            {
+                "course_program_id": program_id,
+                "course_title": title,
+                "materials": {
+                    "video": {"total": t["video"], "viewed": c["video"]},
+                    "pdf": {"total": t["pdf"], "viewed": c["pdf"]},
+                    "test": {"total": t["test"], "completed": c["test"]},
+                },
+            }
+        )
+
+    return {"by_type": by_type, "by_course": by_course, "most_viewed": _as_list(overview_row[2])}
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from apps.courses.analytics_overview import OVERVIEW_QUERY_BUDGET
+from apps.courses.views import AdminAnalyticsOverviewView
+
+
+class Command(BaseCommand):
+    help = (
+        "Query-count regression check for AdminAnalyticsOverviewView: fails if the endpoint "
+        f"needs more than OVERVIEW_QUERY_BUDGET ({OVERVIEW_QUERY_BUDGET}) database round-trips, "
+        "both live (rollups disabled) and as configured."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Requests per scenario for the timing.")
+
+    def handle(self, *args, **options):
+        repeat = max(1, options["repeat"])
+        failures = []
+        for label, overrides in (("live", {"ANALYTICS_ROLLUPS_ENABLED": False}), ("configured", {})):
+            with override_settings(**overrides):
+                with CaptureQueriesContext(connection) as queries:
+                    AdminAnalyticsOverviewView().get(None)
+                t0 = time.perf_counter()
+                for _ in range(repeat):
+                    AdminAnalyticsOverviewView().get(None)
+                elapsed_ms = (time.perf_counter() - t0) * 1000 / repeat
+
+            count = len(queries)
+            self.stdout.write(f"{label:<11} {count} queries, {elapsed_ms:.1f}ms per request")
+            if count > OVERVIEW_QUERY_BUDGET:
+                failures.append(f"{label}: {count} queries (budget {OVERVIEW_QUERY_BUDGET})")
+                for q in queries.captured_queries:
+                    self.stdout.write(f"  {q['sql'][:160]}")
+
+        if failures:
+            raise CommandError("Overview query budget exceeded: " + "; ".join(failures))
+        self.stdout.write(self.style.SUCCESS("Overview query budget OK."))
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.courses.progress_buffer import flush
+
+
+class Command(BaseCommand):
+    help = (
+        "Write buffered material positions (apps/courses/progress_buffer.py) to user_material_progress. "
+        "Runs once, or every --interval seconds with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep running.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=int(getattr(settings, "MATERIAL_PROGRESS_FLUSH_SEC", 10)),
+            help="Seconds between flushes with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            written = flush()
+            self.stdout.write(f"Flushed {written} material progress rows.")
+            if not options["loop"]:
+                return
+            time.sleep(max(1, options["interval"]))
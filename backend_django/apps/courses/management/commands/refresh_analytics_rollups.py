@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.courses.analytics_rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the admin analytics rollup tables (migrations/analytics_rollups.sql). "
+        "Runs once, or every --interval seconds with --loop."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep running.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=int(getattr(settings, "ANALYTICS_ROLLUP_REFRESH_SEC", 300)),
+            help="Seconds between refreshes with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            elapsed = refresh_rollups()
+            if elapsed is None:
+                self.stdout.write("Another refresh is running; skipped.")
+            else:
+                self.stdout.write(f"Analytics rollups refreshed in {elapsed:.2f}s.")
+            if not options["loop"]:
+                return
+            time.sleep(max(30, options["interval"]))
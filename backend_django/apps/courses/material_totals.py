@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from apps.core.redis_client import get_redis, report_redis_error
+from apps.courses.models import CourseProgram
+
+# Cached per-program material totals (the denominator of learner progress).
+#
+# Totals only change when an admin edits the program, so they are cached under
+# (course_program_id, content version). The content version is course_programs.updated_at:
+# StationCourseProgramUpdateView and the topic-file create/update/delete views bump it
+# with bump_content_version() in the same transaction as the edit, so a reader either
+# sees the old version with the old content or the new version with the new content.
+# Entries are never invalidated in place; an edit just makes readers ask for a new key.
+#   tier 1: per-process LRU,
+#   tier 2: optional Redis (REDIS_URL), shared by all gunicorn workers.
+# Callers that already loaded the program's updated_at (e.g. next to the enrollment row)
+# pass it as `version` and a cache hit costs no query at all.
+
+EMPTY_TOTALS = {"total_units": 0, "topics": 0, "files": 0, "tests": 0}
+
+_UNKNOWN = object()
+
+
+class _LocalLRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_local = _LocalLRU(int(getattr(settings, "PROGRAM_TOTALS_CACHE_SIZE", 2000)))
+
+
+def _cache_key(course_program_id: int, version) -> str:
+    stamp = version.isoformat() if hasattr(version, "isoformat") else str(version)
+    return f"program_totals:{int(course_program_id)}:{stamp}"
+
+
+def compute_material_totals(course_program_id: int) -> dict:
+    """Totals straight from the content tables (one query)."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT
+                (SELECT COUNT(*) FROM course_program_lessons WHERE course_program_id = %(id)s),
+                (
+                    SELECT COUNT(*)
+                    FROM course_program_topics t
+                    JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
+                    WHERE l.course_program_id = %(id)s AND t.is_active = true
+                ),
+                (
+                    SELECT COUNT(*)
+                    FROM course_program_topic_files f
+                    JOIN course_program_topics t ON t.id = f.course_program_topic_id
+                    JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
+                    WHERE l.course_program_id = %(id)s AND f.is_active = true
+                ),
+                (
+                    SELECT COUNT(*)
+                    FROM course_program_lesson_tests lt
+                    JOIN course_program_lessons l ON l.id = lt.course_program_lesson_id
+                    WHERE l.course_program_id = %(id)s AND lt.is_active = true
+                ),
+                (SELECT COUNT(*) FROM final_tests WHERE course_program_id = %(id)s AND is_active = true)
+            """,
+            {"id": course_program_id},
+        )
+        lessons_count, topics_count, files_count, lesson_tests_count, final_tests_count = cursor.fetchone()
+
+    if not lessons_count:
+        return dict(EMPTY_TOTALS)
+
+    tests_count = lesson_tests_count + final_tests_count
+    materials_count = files_count if files_count > 0 else topics_count
+    return {
+        "total_units": materials_count + tests_count,
+        "topics": topics_count,
+        "files": files_count,
+        "tests": tests_count,
+    }
+
+
+def material_totals(course_program_id: int, version=_UNKNOWN) -> dict:
+    """
+    Material totals of a course program: {"total_units", "topics", "files", "tests"}.
+    `version` is the program's updated_at when the caller already has it.
+    """
+    if version is _UNKNOWN:
+        version = (
+            CourseProgram.objects.filter(id=course_program_id).values_list("updated_at", flat=True).first()
+        )
+    if version is None:
+        # Unknown program (or no version): nothing to key the cache on.
+        return compute_material_totals(course_program_id)
+
+    key = _cache_key(course_program_id, version)
+    cached = _local.get(key)
+    if cached is not None:
+        return dict(cached)
+
+    redis = get_redis() if getattr(settings, "PROGRAM_TOTALS_CACHE_REDIS", True) else None
+    if redis is not None:
+        try:
+            raw = redis.get(key)
+        except Exception as e:
+            report_redis_error(e)
+            raw = None
+        if raw is not None:
+            totals = json.loads(raw)
+            _local.set(key, totals)
+            return dict(totals)
+
+    totals = compute_material_totals(course_program_id)
+    _local.set(key, totals)
+    if redis is not None:
+        try:
+            redis.set(key, json.dumps(totals), ex=int(getattr(settings, "PROGRAM_TOTALS_CACHE_TTL_SEC", 86400)))
+        except Exception as e:
+            report_redis_error(e)
+    return dict(totals)
+
+
+def bump_content_version(course_program_id: int) -> None:
+    """Mark a program's content as changed (call inside the editing transaction)."""
+    CourseProgram.objects.filter(id=course_program_id).update(updated_at=timezone.now())
+
+
+def bump_content_version_for_topic(topic_id: int) -> None:
+    """bump_content_version() for the program a topic belongs to."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE course_programs SET updated_at = %s
+            WHERE id = (
+                SELECT l.course_program_id
+                FROM course_program_topics t
+                JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
+                WHERE t.id = %s
+            )
+            """,
+            [timezone.now(), topic_id],
+        )
+
+
+def clear_local() -> None:
+    _local.clear()
@@ -237,6 +237,8 @@ class UserCourseProgram(models.Model):
     started_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     hours_studied = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Completed user_course_materials rows; maintained by apps/courses/progress.py
+    completed_units = models.IntegerField(default=0)
     last_activity = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.courses.models import UserCourseMaterial, UserCourseProgram
+
+# Learner progress bookkeeping.
+#
+# user_course_programs.completed_units counts the enrollment's completed
+# user_course_materials rows (migrations/user_course_program_completed_units.sql).
+# It is bumped with an F() expression exactly when a material row flips to completed,
+# so CourseProgramProgressView reads progress from the enrollment row plus the cached
+# totals (material_totals.py) instead of counting the user's materials on every poll.
+# Every write that completes a material must go through mark_material_completed().
+
+
+def count_completed_units(user_id, course_program_id: int) -> int:
+    """Completed materials straight from user_course_materials (seeds a new enrollment)."""
+    return UserCourseMaterial.objects.filter(
+        user_id=user_id, course_program_id=course_program_id, is_completed=True
+    ).count()
+
+
+def enrollment_defaults(user_id, course_program_id: int, now=None) -> dict:
+    """get_or_create() defaults for a new enrollment; the counter is only counted on create."""
+    return {
+        "progress_percent": 0,
+        "status": "in_progress",
+        "started_at": now or timezone.now(),
+        "completed_units": lambda: count_completed_units(user_id, course_program_id),
+    }
+
+
+def mark_material_completed(
+    user_id, course_program_id: int, material_type: str, material_key: str, restamp: bool = False
+) -> bool:
+    """
+    Mark a material completed; returns True when this call flipped it.
+    `restamp` refreshes viewed_at of an already completed material (test retakes).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        material, created = UserCourseMaterial.objects.get_or_create(
+            user_id=user_id,
+            course_program_id=course_program_id,
+            material_type=material_type,
+            material_key=material_key,
+            defaults={"is_completed": True, "viewed_at": now},
+        )
+        if created:
+            flipped = True
+        else:
+            # Conditional UPDATE: of two concurrent requests only one sees the flip.
+            flipped = bool(
+                UserCourseMaterial.objects.filter(id=material.id, is_completed=False).update(
+                    is_completed=True, viewed_at=now
+                )
+            )
+            if not flipped and restamp:
+                UserCourseMaterial.objects.filter(id=material.id).update(viewed_at=now)
+
+        if flipped:
+            UserCourseProgram.objects.filter(user_id=user_id, course_program_id=course_program_id).update(
+                completed_units=F("completed_units") + 1, last_activity=now
+            )
+    return flipped
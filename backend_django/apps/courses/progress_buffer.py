@@ -0,0 +1,435 @@
+from __future__ import annotations
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from apps.core.redis_client import get_redis, report_redis_error
+
+logger = logging.getLogger(__name__)
+
+# Write-behind buffer for user_material_progress (video/PDF auto-resume positions).
+#
+# The player saves its position every few seconds; instead of one transactional
+# update_or_create per call, positions are coalesced per (user, program, material)
+# and written in batches with a single multi-row INSERT ... ON CONFLICT DO UPDATE:
+#   - Redis (REDIS_URL): hash material_progress:pending:<user_id>, shared by all workers;
+#   - otherwise (or while Redis is down): a per-process dict.
+# A save that flips is_completed is written through immediately, so completion never
+# waits in the buffer. To spot the flip, the stored is_completed (and row id) of each
+# material is remembered next to the buffer; an unknown material costs one indexed read.
+#
+# Flushing:
+#   - per-process buffer: a daemon thread (started with the first buffered save) writes it
+#     out every MATERIAL_PROGRESS_FLUSH_SEC, so an idle worker never sits on positions that
+#     other workers cannot see; saves also flush early once MATERIAL_PROGRESS_FLUSH_BATCH
+#     entries are pending, and atexit drains what is left;
+#   - Redis: the first save after the interval flushes (one worker per interval, gated by
+#     SET NX), and the `flush_material_progress --loop` service drains idle periods.
+# The read endpoints overlay pending_progress() on the table, so a user always gets
+# back the position they just saved. Rows carry last_viewed_at and the upsert never
+# replaces a newer row with an older buffered one.
+
+_PENDING = "material_progress:pending:"  # + user_id -> hash {field: entry JSON}
+_STATE = "material_progress:state:"  # + user_id -> hash {field: {"id", "is_completed"}}
+_DIRTY = "material_progress:dirty"  # user_ids with pending entries
+_FLUSHING = "material_progress:flushing:"
+_FLUSH_GATE = "material_progress:flush"
+_STATE_TTL_SEC = 86400
+_LOCAL_STATE_ENTRIES = 50_000
+
+# Rows created from the buffer get a deterministic id, so a buffered save can report
+# the id the row will have before it exists.
+_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "atg:user_material_progress")
+
+_COLUMNS = (
+    "id",
+    "user_id",
+    "course_program_id",
+    "lesson_id",
+    "topic_id",
+    "material_key",
+    "material_type",
+    "position_seconds",
+    "duration_seconds",
+    "progress_percent",
+    "is_completed",
+    "last_viewed_at",
+)
+_UPDATED = [c for c in _COLUMNS if c not in ("id", "user_id", "course_program_id", "material_key")]
+
+
+def _enabled() -> bool:
+    return bool(getattr(settings, "MATERIAL_PROGRESS_BUFFER_ENABLED", True))
+
+
+def _flush_sec() -> float:
+    return float(getattr(settings, "MATERIAL_PROGRESS_FLUSH_SEC", 10))
+
+
+def _flush_batch() -> int:
+    return max(1, int(getattr(settings, "MATERIAL_PROGRESS_FLUSH_BATCH", 500)))
+
+
+def _redis():
+    return get_redis() if getattr(settings, "MATERIAL_PROGRESS_BUFFER_REDIS", True) else None
+
+
+def _field(course_program_id: int, material_key: str) -> str:
+    return f"{int(course_program_id)}|{material_key}"
+
+
+def _encode(entry: dict) -> str:
+    return json.dumps({**entry, "last_viewed_at": entry["last_viewed_at"].isoformat()})
+
+
+def _decode(raw) -> dict:
+    entry = json.loads(raw)
+    entry["last_viewed_at"] = datetime.fromisoformat(entry["last_viewed_at"])
+    return entry
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class _LocalStore:
+    """Per-process buffer (no Redis)."""
+
+    def __init__(self, max_states: int):
+        self.max_states = max_states
+        self._lock = threading.Lock()
+        self._pending: dict[str, dict[str, dict]] = {}
+        self._states: OrderedDict[tuple[str, str], dict] = OrderedDict()
+        self._last_flush = time.monotonic()
+
+    def state(self, user_id: str, field: str) -> dict | None:
+        with self._lock:
+            value = self._states.get((user_id, field))
+            if value is not None:
+                self._states.move_to_end((user_id, field))
+            return value
+
+    def remember(self, user_id: str, field: str, state: dict) -> None:
+        with self._lock:
+            self._states[(user_id, field)] = state
+            self._states.move_to_end((user_id, field))
+            while len(self._states) > self.max_states:
+                self._states.popitem(last=False)
+
+    def put(self, user_id: str, field: str, entry: dict) -> bool:
+        with self._lock:
+            self._pending.setdefault(user_id, {})[field] = entry
+        _start_flusher()
+        return True
+
+    def discard(self, user_id: str, field: str) -> None:
+        with self._lock:
+            entries = self._pending.get(user_id)
+            if entries:
+                entries.pop(field, None)
+
+    def pending(self, user_id: str) -> list[dict]:
+        with self._lock:
+            return list(self._pending.get(user_id, {}).values())
+
+    def due(self) -> bool:
+        with self._lock:
+            size = sum(len(entries) for entries in self._pending.values())
+        return size > 0 and (size >= _flush_batch() or time.monotonic() - self._last_flush >= _flush_sec())
+
+    def take(self) -> list[dict]:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        return [entry for entries in pending.values() for entry in entries.values()]
+
+    def restore(self, entries: list[dict]) -> None:
+        # Put back what a failed flush took, unless a newer position arrived meanwhile.
+        with self._lock:
+            for entry in entries:
+                user_entries = self._pending.setdefault(entry["user_id"], {})
+                user_entries.setdefault(_field(entry["course_program_id"], entry["material_key"]), entry)
+
+
+class _RedisStore:
+    """Buffer shared by all workers. Any Redis error degrades to writing through."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    def state(self, user_id: str, field: str) -> dict | None:
+        try:
+            raw = self.redis.hget(_STATE + user_id, field)
+        except Exception as e:
+            report_redis_error(e)
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def remember(self, user_id: str, field: str, state: dict) -> None:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(_STATE + user_id, field, json.dumps(state))
+            pipe.expire(_STATE + user_id, _STATE_TTL_SEC)
+            pipe.execute()
+        except Exception as e:
+            report_redis_error(e)
+
+    def put(self, user_id: str, field: str, entry: dict) -> bool:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            # HSET before SADD: a flush that pops the user in between still finds the entry.
+            pipe.hset(_PENDING + user_id, field, _encode(entry))
+            pipe.sadd(_DIRTY, user_id)
+            pipe.execute()
+        except Exception as e:
+            report_redis_error(e)
+            return False
+        return True
+
+    def discard(self, user_id: str, field: str) -> None:
+        try:
+            self.redis.hdel(_PENDING + user_id, field)
+        except Exception as e:
+            # A stale pending entry is harmless: the upsert keeps the newer row.
+            report_redis_error(e)
+
+    def pending(self, user_id: str) -> list[dict]:
+        try:
+            raw = self.redis.hvals(_PENDING + user_id)
+        except Exception as e:
+            report_redis_error(e)
+            return []
+        return [_decode(value) for value in raw]
+
+    def due(self) -> bool:
+        try:
+            return bool(self.redis.set(_FLUSH_GATE, "1", nx=True, ex=max(1, int(_flush_sec()))))
+        except Exception as e:
+            report_redis_error(e)
+            return False
+
+    def flush(self) -> int:
+        written = 0
+        # Bounded, so a busy cluster cannot keep one request flushing forever.
+        for _ in range(20):
+            users = [_text(u) for u in self.redis.spop(_DIRTY, _flush_batch()) or []]
+            if not users:
+                break
+            token = uuid.uuid4().hex
+            # Move each user's hash aside atomically; saves arriving now start a fresh one.
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in users:
+                pipe.rename(_PENDING + user_id, f"{_FLUSHING}{token}:{user_id}")
+            moved = [u for u, ok in zip(users, pipe.execute(raise_on_error=False)) if ok is True]
+            if not moved:
+                continue
+            pipe = self.redis.pipeline(transaction=False)
+            for user_id in moved:
+                pipe.hgetall(f"{_FLUSHING}{token}:{user_id}")
+            taken = pipe.execute()
+            entries = [_decode(raw) for values in taken for raw in values.values()]
+            try:
+                write_rows(entries)
+            except Exception:
+                pipe = self.redis.pipeline(transaction=False)
+                for user_id, values in zip(moved, taken):
+                    for field, raw in values.items():
+                        pipe.hsetnx(_PENDING + user_id, field, raw)
+                    pipe.sadd(_DIRTY, user_id)
+                    pipe.delete(f"{_FLUSHING}{token}:{user_id}")
+                pipe.execute()
+                raise
+            self.redis.delete(*[f"{_FLUSHING}{token}:{user_id}" for user_id in moved])
+            written += len(entries)
+        return written
+
+
+_local = _LocalStore(_LOCAL_STATE_ENTRIES)
+_flusher_lock = threading.Lock()
+_flusher_pid: int | None = None
+
+
+def _flusher_loop() -> None:
+    from django.db import close_old_connections
+
+    while True:
+        time.sleep(max(1.0, _flush_sec()))
+        try:
+            _flush_local()
+        except Exception as e:
+            # Entries were put back; the next tick retries.
+            logger.warning(f"[progress_buffer] background flush failed: {e}")
+        finally:
+            close_old_connections()
+
+
+def _start_flusher() -> None:
+    """Start the per-process flush thread (again after a fork: threads do not survive it)."""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    with _flusher_lock:
+        if _flusher_pid == os.getpid():
+            return
+        threading.Thread(target=_flusher_loop, name="material-progress-flush", daemon=True).start()
+        _flusher_pid = os.getpid()
+
+
+def _store():
+    redis = _redis()
+    return _RedisStore(redis) if redis is not None else _local
+
+
+def write_rows(entries: list[dict]) -> None:
+    """Upsert progress rows with one INSERT ... ON CONFLICT DO UPDATE per batch."""
+    newest: dict[tuple, dict] = {}
+    for entry in entries:
+        key = (str(entry["user_id"]), int(entry["course_program_id"]), entry["material_key"])
+        if key not in newest or newest[key]["last_viewed_at"] <= entry["last_viewed_at"]:
+            newest[key] = entry
+    rows = list(newest.values())
+    if not rows:
+        return
+
+    row_sql = "(" + ", ".join(["%s"] * (len(_COLUMNS) + 1)) + ")"
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in _UPDATED)
+    batch = _flush_batch()
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch):
+            chunk = rows[start : start + batch]
+            params = []
+            for entry in chunk:
+                params += [entry.get(c) for c in _COLUMNS] + [entry["last_viewed_at"]]
+            cursor.execute(
+                f"""
+                INSERT INTO user_material_progress ({", ".join(_COLUMNS)}, created_at)
+                VALUES {", ".join([row_sql] * len(chunk))}
+                ON CONFLICT (user_id, course_program_id, material_key) DO UPDATE SET {updates}
+                WHERE user_material_progress.last_viewed_at <= EXCLUDED.last_viewed_at
+                """,
+                params,
+            )
+
+
+def _load_state(user_id: str, course_program_id: int, material_key: str) -> dict:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT id, is_completed FROM user_material_progress
+            WHERE user_id = %s AND course_program_id = %s AND material_key = %s
+            """,
+            [user_id, course_program_id, material_key],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        row_id = uuid.uuid5(_ID_NAMESPACE, f"{user_id}|{_field(course_program_id, material_key)}")
+        return {"id": str(row_id), "is_completed": False}
+    return {"id": str(row[0]), "is_completed": bool(row[1])}
+
+
+def save_progress(user_id, course_program_id: int, material_key: str, **fields) -> dict:
+    """
+    Record a material position (fields: material_type, lesson_id, topic_id, position_seconds,
+    duration_seconds, progress_percent, is_completed); returns the row as it will be stored.
+    """
+    user_id = str(user_id)
+    course_program_id = int(course_program_id)
+    field = _field(course_program_id, material_key)
+    store = _store()
+
+    state = store.state(user_id, field)
+    if state is None:
+        state = _load_state(user_id, course_program_id, material_key)
+        store.remember(user_id, field, state)
+
+    entry = {
+        **fields,
+        "id": state["id"],
+        "user_id": user_id,
+        "course_program_id": course_program_id,
+        "material_key": material_key,
+        "is_completed": bool(fields.get("is_completed")),
+        "last_viewed_at": timezone.now(),
+    }
+
+    if not _enabled() or entry["is_completed"] != state["is_completed"]:
+        # Completion flips (and everything when buffering is off) go straight to the table.
+        store.discard(user_id, field)
+        write_rows([entry])
+        if entry["is_completed"] != state["is_completed"]:
+            store.remember(user_id, field, {"id": state["id"], "is_completed": entry["is_completed"]})
+        return entry
+
+    if not store.put(user_id, field, entry):
+        write_rows([entry])
+        return entry
+
+    maybe_flush(store)
+    return entry
+
+
+def pending_progress(user_id, course_program_id: int | None = None, material_keys=None) -> list[dict]:
+    """Buffered (not yet written) entries of a user, optionally filtered."""
+    user_id = str(user_id)
+    entries = _local.pending(user_id)
+    redis = _redis()
+    if redis is not None:
+        entries += _RedisStore(redis).pending(user_id)
+    if course_program_id is not None:
+        entries = [e for e in entries if e["course_program_id"] == int(course_program_id)]
+    if material_keys is not None:
+        keys = set(material_keys)
+        entries = [e for e in entries if e["material_key"] in keys]
+    return entries
+
+
+def _flush_local() -> int:
+    entries = _local.take()
+    try:
+        write_rows(entries)
+    except Exception:
+        _local.restore(entries)
+        raise
+    return len(entries)
+
+
+def maybe_flush(store=None) -> None:
+    """Flush when an interval has passed (called after each buffered save)."""
+    try:
+        if _local.due():
+            _flush_local()
+        if store is not None and store is not _local and store.due():
+            store.flush()
+    except Exception as e:
+        # Entries stay buffered for the next attempt.
+        logger.warning(f"[progress_buffer] flush failed: {e}")
+
+
+def flush() -> int:
+    """Write out everything buffered in this process and in Redis; returns rows written."""
+    written = _flush_local()
+    redis = _redis()
+    if redis is not None:
+        written += _RedisStore(redis).flush()
+    return written
+
+
+def _flush_at_exit() -> None:
+    try:
+        _flush_local()
+    except Exception as e:
+        logger.warning(f"[progress_buffer] flush at exit failed: {e}")
+
+
+atexit.register(_flush_at_exit)
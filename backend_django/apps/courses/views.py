@@ -18,7 +18,6 @@ from apps.courses.models import (
     CourseComment,
     CourseProgramLessonTest,
     CourseProgramLesson,
-    CourseProgramTopic,
     FinalTest,
     TestQuestion,
     TestQuestionOption,
@@ -26,9 +25,13 @@ from apps.courses.models import (
 )
 from django.db import connection
 from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
-from apps.accounts.models import User, UserProfile, UserSession
+from apps.accounts.models import User, UserProfile
 from apps.stations.models import Station
-from apps.files.minio_client import presign_get
+from apps.files.minio_client import presign_get, presign_many
+from apps.courses import analytics_rollups, progress_buffer
+from apps.courses.analytics_overview import overview_snapshot
+from apps.courses.material_totals import material_totals
+from apps.courses.progress import enrollment_defaults, mark_material_completed
 
 
 class IsAdmin(IsAuthenticated):
@@ -99,49 +102,6 @@ class EnrollCourseView(APIView):
         return JsonResponse({"success": True})
 
 
-def _get_course_program_material_totals(course_program_id: int) -> dict:
-    lesson_ids = list(
-        CourseProgramLesson.objects.filter(course_program_id=course_program_id).values_list("id", flat=True)
-    )
-    if not lesson_ids:
-        return {"total_units": 0, "topics": 0, "files": 0, "tests": 0}
-
-    topics_count = (
-        CourseProgramTopic.objects.filter(lesson_id__in=lesson_ids, is_active=True).count()
-    )
-
-    files_count = 0
-    with connection.cursor() as cursor:
-        cursor.execute(
-            """
-            SELECT COUNT(*)
-            FROM course_program_topic_files f
-            JOIN course_program_topics t ON t.id = f.course_program_topic_id
-            JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
-            WHERE l.course_program_id = %s AND f.is_active = true
-            """,
-            [course_program_id],
-        )
-        files_count = cursor.fetchone()[0]
-
-    lesson_tests_count = CourseProgramLessonTest.objects.filter(
-        lesson_id__in=lesson_ids, is_active=True
-    ).count()
-    final_tests_count = FinalTest.objects.filter(
-        course_program_id=course_program_id, is_active=True
-    ).count()
-    tests_count = lesson_tests_count + final_tests_count
-
-    materials_count = files_count if files_count > 0 else topics_count
-    total_units = materials_count + tests_count
-    return {
-        "total_units": total_units,
-        "topics": topics_count,
-        "files": files_count,
-        "tests": tests_count,
-    }
-
-
 def _resolve_avatar_url(avatar_url: str | None) -> str | None:
     if not avatar_url:
         return None
@@ -153,12 +113,17 @@ def _resolve_avatar_url(avatar_url: str | None) -> str | None:
     return avatar_url
 
 
-def _get_active_users_count(days: int = 30) -> int:
-    since = timezone.now() - timedelta(days=days)
-    session_users = UserSession.objects.filter(last_activity__gte=since).values("user_id").distinct().count()
-    if session_users > 0:
-        return session_users
-    return UserCourseProgram.objects.filter(last_activity__gte=since).values("user_id").distinct().count()
+def _resolve_avatar_urls(profiles: list[dict]) -> None:
+    """In-place batch version of _resolve_avatar_url for profile rows (one presign batch)."""
+    keys = [p["avatar_url"] for p in profiles if (p.get("avatar_url") or "").startswith("avatars/")]
+    try:
+        urls = presign_many(keys, expires_in=60 * 60 * 24 * 7) if keys else {}
+    except Exception:
+        urls = {}
+    for profile in profiles:
+        avatar_url = profile.get("avatar_url")
+        if avatar_url and avatar_url.startswith("avatars/"):
+            profile["avatar_url"] = urls.get(avatar_url)
 
 
 def _get_material_counts_by_type_for_course(course_program_id: int) -> dict:
@@ -297,11 +262,7 @@ class EnrollCourseProgramView(APIView):
             enrollment, created = UserCourseProgram.objects.get_or_create(
                 user_id=user_id,
                 course_program_id=courseProgramId,
-                defaults={
-                    "progress_percent": 0,
-                    "status": "in_progress",
-                    "started_at": now,
-                },
+                defaults=enrollment_defaults(user_id, courseProgramId, now),
             )
         return JsonResponse(
             {
@@ -323,16 +284,22 @@ class CourseProgramProgressView(APIView):
 
     def get(self, request, courseProgramId: int):
         user_id = request.user.id
-        enrollment = UserCourseProgram.objects.filter(
-            user_id=user_id, course_program_id=courseProgramId
-        ).first()
+        enrollment = (
+            UserCourseProgram.objects.filter(user_id=user_id, course_program_id=courseProgramId)
+            # content version for the totals cache (apps/courses/material_totals.py)
+            .annotate(
+                program_version=models.Subquery(
+                    CourseProgram.objects.filter(id=models.OuterRef("course_program_id")).values("updated_at")[:1]
+                )
+            )
+            .first()
+        )
         if not enrollment:
             return JsonResponse({"error": "Enrollment not found"}, status=404)
 
-        totals = _get_course_program_material_totals(courseProgramId)
-        completed_count = UserCourseMaterial.objects.filter(
-            user_id=user_id, course_program_id=courseProgramId, is_completed=True
-        ).count()
+        totals = material_totals(courseProgramId, enrollment.program_version)
+        # Counter maintained by mark_material_completed() (apps/courses/progress.py)
+        completed_count = enrollment.completed_units
 
         total_units = totals["total_units"]
         progress_percent = (
@@ -341,17 +308,26 @@ class CourseProgramProgressView(APIView):
             else enrollment.progress_percent
         )
 
+        now = timezone.now()
+        changed = []
         if progress_percent != enrollment.progress_percent:
             enrollment.progress_percent = progress_percent
+            changed.append("progress_percent")
         if progress_percent >= 100 and enrollment.status != "completed":
             enrollment.status = "completed"
-            enrollment.completed_at = timezone.now()
+            enrollment.completed_at = now
+            changed += ["status", "completed_at"]
         elif progress_percent > 0 and enrollment.status == "not_started":
             enrollment.status = "in_progress"
+            changed.append("status")
             if not enrollment.started_at:
-                enrollment.started_at = timezone.now()
-        enrollment.last_activity = timezone.now()
-        enrollment.save(update_fields=["progress_percent", "status", "completed_at", "started_at", "last_activity"])
+                enrollment.started_at = now
+                changed.append("started_at")
+        # A plain poll writes nothing: the row is only touched when progress actually moved
+        # (completing a material already bumps last_activity together with the counter).
+        if changed:
+            enrollment.last_activity = now
+            enrollment.save(update_fields=changed + ["last_activity"])
 
         return JsonResponse(
             {
@@ -379,21 +355,7 @@ class CourseProgramMaterialCompleteView(APIView):
         if not material_type or not material_key:
             return JsonResponse({"error": "material_type and material_key are required"}, status=400)
 
-        with transaction.atomic():
-            material, _created = UserCourseMaterial.objects.get_or_create(
-                user_id=user_id,
-                course_program_id=courseProgramId,
-                material_type=material_type,
-                material_key=material_key,
-                defaults={
-                    "is_completed": True,
-                    "viewed_at": timezone.now(),
-                },
-            )
-            if not material.is_completed:
-                material.is_completed = True
-                material.viewed_at = timezone.now()
-                material.save(update_fields=["is_completed", "viewed_at"])
+        mark_material_completed(user_id, courseProgramId, material_type, material_key)
 
         return CourseProgramProgressView().get(request, courseProgramId)
 
@@ -471,241 +433,212 @@ class AdminAnalyticsOverviewView(APIView):
     permission_classes = [IsAdmin]
 
     def get(self, request):
-        total_users = User.objects.count()
-        active_users = _get_active_users_count(30)
-        total_course_programs = CourseProgram.objects.count()
-        total_enrollments = UserCourseProgram.objects.count()
-        active_enrollments = UserCourseProgram.objects.filter(status="in_progress").count()
-        completed_enrollments = UserCourseProgram.objects.filter(status="completed").count()
-        total_materials_viewed = UserCourseMaterial.objects.filter(is_completed=True).count()
-
-        avg_progress = UserCourseProgram.objects.aggregate(avg=models.Avg("progress_percent")).get("avg") or 0
-        avg_test_score = TestResult.objects.aggregate(avg=models.Avg("score")).get("avg") or 0
+        data = analytics_rollups.overview()
+        if data is None:
+            data = overview_snapshot()
+        return JsonResponse({"data": data})
 
-        materials_by_type = {"video": 0, "pdf": 0, "test": 0}
-        for row in UserCourseMaterial.objects.filter(is_completed=True).values("material_type").annotate(count=models.Count("id")):
-            materials_by_type[row["material_type"]] = row["count"]
 
-        enrollments_by_status = {
-            "not_started": UserCourseProgram.objects.filter(status="not_started").count(),
-            "in_progress": active_enrollments,
-            "completed": completed_enrollments,
-        }
+def _live_station_analytics() -> list[dict]:
+    """Per-station analytics computed from the live tables (no fresh rollup)."""
+    stations = list(Station.objects.all().values("id", "name", "short_name", "status"))
 
-        activity_timeline = _build_activity_timeline(30)
+    program_counts = {
+        row["station_id"]: row["count"]
+        for row in CourseProgram.objects.values("station_id").annotate(count=models.Count("id"))
+    }
 
-        return JsonResponse(
-            {
-                "data": {
-                    "total_users": total_users,
-                    "active_users": active_users,
-                    "total_course_programs": total_course_programs,
-                    "total_enrollments": total_enrollments,
-                    "active_enrollments": active_enrollments,
-                    "completed_enrollments": completed_enrollments,
-                    "total_materials_viewed": total_materials_viewed,
-                    "average_progress": round(float(avg_progress), 2),
-                    "average_test_score": round(float(avg_test_score), 2),
-                    "materials_by_type": materials_by_type,
-                    "enrollments_by_status": enrollments_by_status,
-                    "activity_timeline": activity_timeline,
-                }
-            }
+    enrollment_stats = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT cp.station_id,
+                   COUNT(*) AS total,
+                   SUM(CASE WHEN ucp.status = 'in_progress' THEN 1 ELSE 0 END) AS active,
+                   SUM(CASE WHEN ucp.status = 'completed' THEN 1 ELSE 0 END) AS completed,
+                   AVG(ucp.progress_percent) AS avg_progress,
+                   SUM(ucp.hours_studied) AS total_hours,
+                   COUNT(DISTINCT ucp.user_id) AS unique_users,
+                   MAX(ucp.last_activity) AS last_activity
+            FROM user_course_programs ucp
+            JOIN course_programs cp ON cp.id = ucp.course_program_id
+            GROUP BY cp.station_id
+            """
         )
+        for row in cursor.fetchall():
+            (
+                station_id,
+                total,
+                active,
+                completed,
+                avg_progress,
+                total_hours,
+                unique_users,
+                last_activity,
+            ) = row
+            enrollment_stats[int(station_id)] = {
+                "total": int(total or 0),
+                "active": int(active or 0),
+                "completed": int(completed or 0),
+                "avg_progress": float(avg_progress or 0),
+                "total_hours": float(total_hours or 0),
+                "unique_users": int(unique_users or 0),
+                "last_activity": last_activity.isoformat() if last_activity else None,
+            }
 
+    active_users_map = {}
+    since = timezone.now() - timedelta(days=30)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT cp.station_id, COUNT(DISTINCT ucp.user_id)
+            FROM user_course_programs ucp
+            JOIN course_programs cp ON cp.id = ucp.course_program_id
+            WHERE ucp.last_activity >= %s
+            GROUP BY cp.station_id
+            """,
+            [since],
+        )
+        for station_id, count in cursor.fetchall():
+            active_users_map[int(station_id)] = int(count or 0)
 
-class AdminAnalyticsStationsView(APIView):
-    permission_classes = [IsAdmin]
-
-    def get(self, request):
-        stations = list(Station.objects.all().values("id", "name", "short_name", "status"))
-
-        program_counts = {
-            row["station_id"]: row["count"]
-            for row in CourseProgram.objects.values("station_id").annotate(count=models.Count("id"))
-        }
-
-        enrollment_stats = {}
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT cp.station_id,
-                       COUNT(*) AS total,
-                       SUM(CASE WHEN ucp.status = 'in_progress' THEN 1 ELSE 0 END) AS active,
-                       SUM(CASE WHEN ucp.status = 'completed' THEN 1 ELSE 0 END) AS completed,
-                       AVG(ucp.progress_percent) AS avg_progress,
-                       SUM(ucp.hours_studied) AS total_hours,
-                       COUNT(DISTINCT ucp.user_id) AS unique_users,
-                       MAX(ucp.last_activity) AS last_activity
-                FROM user_course_programs ucp
-                JOIN course_programs cp ON cp.id = ucp.course_program_id
-                GROUP BY cp.station_id
-                """
-            )
-            for row in cursor.fetchall():
-                (
-                    station_id,
-                    total,
-                    active,
-                    completed,
-                    avg_progress,
-                    total_hours,
-                    unique_users,
-                    last_activity,
-                ) = row
-                enrollment_stats[int(station_id)] = {
-                    "total": int(total or 0),
-                    "active": int(active or 0),
-                    "completed": int(completed or 0),
-                    "avg_progress": float(avg_progress or 0),
-                    "total_hours": float(total_hours or 0),
-                    "unique_users": int(unique_users or 0),
-                    "last_activity": last_activity.isoformat() if last_activity else None,
-                }
+    test_stats_map = {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT cp.station_id,
+                   AVG(r.score) AS avg_score,
+                   COUNT(*) AS total_attempts,
+                   SUM(CASE WHEN r.is_passed THEN 1 ELSE 0 END) AS passed_count
+            FROM test_results r
+            LEFT JOIN course_program_lesson_tests lt ON lt.id = r.test_id AND r.test_type = 'lesson'
+            LEFT JOIN course_program_lessons l ON l.id = lt.course_program_lesson_id
+            LEFT JOIN final_tests ft ON ft.id = r.test_id AND r.test_type = 'final'
+            LEFT JOIN course_programs cp ON cp.id = COALESCE(l.course_program_id, ft.course_program_id)
+            GROUP BY cp.station_id
+            """
+        )
+        for station_id, avg_score, total_attempts, passed_count in cursor.fetchall():
+            total_attempts = int(total_attempts or 0)
+            passed_count = int(passed_count or 0)
+            test_stats_map[int(station_id)] = {
+                "average_score": round(float(avg_score or 0), 2),
+                "total_attempts": total_attempts,
+                "pass_rate": round((passed_count / total_attempts) * 100, 2) if total_attempts else 0,
+            }
 
-        active_users_map = {}
-        since = timezone.now() - timedelta(days=30)
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT cp.station_id, COUNT(DISTINCT ucp.user_id)
-                FROM user_course_programs ucp
-                JOIN course_programs cp ON cp.id = ucp.course_program_id
-                WHERE ucp.last_activity >= %s
-                GROUP BY cp.station_id
-                """,
-                [since],
-            )
-            for station_id, count in cursor.fetchall():
-                active_users_map[int(station_id)] = int(count or 0)
+    totals_by_station = {s["id"]: {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0} for s in stations}
+    completed_by_station = {s["id"]: {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0} for s in stations}
 
-        test_stats_map = {}
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT cp.station_id,
-                       AVG(r.score) AS avg_score,
-                       COUNT(*) AS total_attempts,
-                       SUM(CASE WHEN r.is_passed THEN 1 ELSE 0 END) AS passed_count
-                FROM test_results r
-                LEFT JOIN course_program_lesson_tests lt ON lt.id = r.test_id AND r.test_type = 'lesson'
-                LEFT JOIN course_program_lessons l ON l.id = lt.course_program_lesson_id
-                LEFT JOIN final_tests ft ON ft.id = r.test_id AND r.test_type = 'final'
-                LEFT JOIN course_programs cp ON cp.id = COALESCE(l.course_program_id, ft.course_program_id)
-                GROUP BY cp.station_id
-                """
-            )
-            for station_id, avg_score, total_attempts, passed_count in cursor.fetchall():
-                total_attempts = int(total_attempts or 0)
-                passed_count = int(passed_count or 0)
-                test_stats_map[int(station_id)] = {
-                    "average_score": round(float(avg_score or 0), 2),
-                    "total_attempts": total_attempts,
-                    "pass_rate": round((passed_count / total_attempts) * 100, 2) if total_attempts else 0,
-                }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT cp.station_id, COUNT(*)
+            FROM course_program_topics t
+            JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
+            JOIN course_programs cp ON cp.id = l.course_program_id
+            WHERE t.is_active = true
+            GROUP BY cp.station_id
+            """
+        )
+        for station_id, count in cursor.fetchall():
+            totals_by_station[int(station_id)]["text"] = int(count or 0)
 
-        totals_by_station = {s["id"]: {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0} for s in stations}
-        completed_by_station = {s["id"]: {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0} for s in stations}
+        cursor.execute(
+            """
+            SELECT cp.station_id, f.file_type, COUNT(*)
+            FROM course_program_topic_files f
+            JOIN course_program_topics t ON t.id = f.course_program_topic_id
+            JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
+            JOIN course_programs cp ON cp.id = l.course_program_id
+            WHERE f.is_active = true
+            GROUP BY cp.station_id, f.file_type
+            """
+        )
+        for station_id, file_type, count in cursor.fetchall():
+            key = "presentation"
+            if file_type == "video":
+                key = "video"
+            elif file_type == "pdf":
+                key = "pdf"
+            totals_by_station[int(station_id)][key] = int(count or 0)
 
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT cp.station_id, COUNT(*)
-                FROM course_program_topics t
-                JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
-                JOIN course_programs cp ON cp.id = l.course_program_id
-                WHERE t.is_active = true
-                GROUP BY cp.station_id
-                """
-            )
-            for station_id, count in cursor.fetchall():
-                totals_by_station[int(station_id)]["text"] = int(count or 0)
+        cursor.execute(
+            """
+            SELECT cp.station_id, COUNT(*)
+            FROM course_program_lesson_tests lt
+            JOIN course_program_lessons l ON l.id = lt.course_program_lesson_id
+            JOIN course_programs cp ON cp.id = l.course_program_id
+            WHERE lt.is_active = true
+            GROUP BY cp.station_id
+            """
+        )
+        for station_id, count in cursor.fetchall():
+            totals_by_station[int(station_id)]["test"] += int(count or 0)
 
-            cursor.execute(
-                """
-                SELECT cp.station_id, f.file_type, COUNT(*)
-                FROM course_program_topic_files f
-                JOIN course_program_topics t ON t.id = f.course_program_topic_id
-                JOIN course_program_lessons l ON l.id = t.course_program_lesson_id
-                JOIN course_programs cp ON cp.id = l.course_program_id
-                WHERE f.is_active = true
-                GROUP BY cp.station_id, f.file_type
-                """
-            )
-            for station_id, file_type, count in cursor.fetchall():
-                key = "presentation"
-                if file_type == "video":
-                    key = "video"
-                elif file_type == "pdf":
-                    key = "pdf"
-                totals_by_station[int(station_id)][key] = int(count or 0)
+        cursor.execute(
+            """
+            SELECT cp.station_id, COUNT(*)
+            FROM final_tests ft
+            JOIN course_programs cp ON cp.id = ft.course_program_id
+            WHERE ft.is_active = true
+            GROUP BY cp.station_id
+            """
+        )
+        for station_id, count in cursor.fetchall():
+            totals_by_station[int(station_id)]["test"] += int(count or 0)
 
-            cursor.execute(
-                """
-                SELECT cp.station_id, COUNT(*)
-                FROM course_program_lesson_tests lt
-                JOIN course_program_lessons l ON l.id = lt.course_program_lesson_id
-                JOIN course_programs cp ON cp.id = l.course_program_id
-                WHERE lt.is_active = true
-                GROUP BY cp.station_id
-                """
-            )
-            for station_id, count in cursor.fetchall():
-                totals_by_station[int(station_id)]["test"] += int(count or 0)
+        cursor.execute(
+            """
+            SELECT cp.station_id, ucm.material_type, COUNT(*)
+            FROM user_course_materials ucm
+            JOIN course_programs cp ON cp.id = ucm.course_program_id
+            WHERE ucm.is_completed = true
+            GROUP BY cp.station_id, ucm.material_type
+            """
+        )
+        for station_id, material_type, count in cursor.fetchall():
+            completed_by_station[int(station_id)][material_type] = int(count or 0)
+
+    data = []
+    for station in stations:
+        station_id = station["id"]
+        enroll = enrollment_stats.get(station_id, {})
+        tests = test_stats_map.get(station_id, {})
+        totals = totals_by_station.get(station_id, {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0})
+        completed = completed_by_station.get(station_id, {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0})
+        total_materials = sum(totals.values())
+        data.append(
+            {
+                "station_id": station_id,
+                "name": station["name"],
+                "short_name": station["short_name"],
+                "status": station["status"],
+                "course_programs": program_counts.get(station_id, 0),
+                "total_enrollments": enroll.get("total", 0),
+                "active_enrollments": enroll.get("active", 0),
+                "completed_enrollments": enroll.get("completed", 0),
+                "unique_users": enroll.get("unique_users", 0),
+                "average_progress": round(float(enroll.get("avg_progress", 0)), 2),
+                "average_test_score": tests.get("average_score", 0),
+                "total_materials": total_materials,
+                "materials_by_type": totals,
+                "completed_materials_by_type": completed,
+                "active_users": active_users_map.get(station_id, 0),
+                "last_activity": enroll.get("last_activity"),
+            }
+        )
 
-            cursor.execute(
-                """
-                SELECT cp.station_id, COUNT(*)
-                FROM final_tests ft
-                JOIN course_programs cp ON cp.id = ft.course_program_id
-                WHERE ft.is_active = true
-                GROUP BY cp.station_id
-                """
-            )
-            for station_id, count in cursor.fetchall():
-                totals_by_station[int(station_id)]["test"] += int(count or 0)
+    return data
 
-            cursor.execute(
-                """
-                SELECT cp.station_id, ucm.material_type, COUNT(*)
-                FROM user_course_materials ucm
-                JOIN course_programs cp ON cp.id = ucm.course_program_id
-                WHERE ucm.is_completed = true
-                GROUP BY cp.station_id, ucm.material_type
-                """
-            )
-            for station_id, material_type, count in cursor.fetchall():
-                completed_by_station[int(station_id)][material_type] = int(count or 0)
 
-        data = []
-        for station in stations:
-            station_id = station["id"]
-            enroll = enrollment_stats.get(station_id, {})
-            tests = test_stats_map.get(station_id, {})
-            totals = totals_by_station.get(station_id, {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0})
-            completed = completed_by_station.get(station_id, {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0})
-            total_materials = sum(totals.values())
-            data.append(
-                {
-                    "station_id": station_id,
-                    "name": station["name"],
-                    "short_name": station["short_name"],
-                    "status": station["status"],
-                    "course_programs": program_counts.get(station_id, 0),
-                    "total_enrollments": enroll.get("total", 0),
-                    "active_enrollments": enroll.get("active", 0),
-                    "completed_enrollments": enroll.get("completed", 0),
-                    "unique_users": enroll.get("unique_users", 0),
-                    "average_progress": round(float(enroll.get("avg_progress", 0)), 2),
-                    "average_test_score": tests.get("average_score", 0),
-                    "total_materials": total_materials,
-                    "materials_by_type": totals,
-                    "completed_materials_by_type": completed,
-                    "active_users": active_users_map.get(station_id, 0),
-                    "last_activity": enroll.get("last_activity"),
-                }
-            )
+class AdminAnalyticsStationsView(APIView):
+    permission_classes = [IsAdmin]
 
+    def get(self, request):
+        data = analytics_rollups.station_stats()
+        if data is None:
+            data = _live_station_analytics()
         return JsonResponse({"data": data, "total": len(data)})
 
 
@@ -1017,12 +950,11 @@ class AdminAnalyticsStationParticipantsView(APIView):
             str(u["id"]): u
             for u in User.objects.filter(id__in=user_ids).values("id", "username", "full_name", "email")
         }
-        profiles = {}
-        for profile in UserProfile.objects.filter(id__in=user_ids).values(
-            "id", "avatar_url", "position", "company"
-        ):
-            profile["avatar_url"] = _resolve_avatar_url(profile.get("avatar_url"))
-            profiles[str(profile["id"])] = profile
+        profile_rows = list(
+            UserProfile.objects.filter(id__in=user_ids).values("id", "avatar_url", "position", "company")
+        )
+        _resolve_avatar_urls(profile_rows)
+        profiles = {str(profile["id"]): profile for profile in profile_rows}
 
         materials_map = {}
         for row in UserCourseMaterial.objects.filter(
@@ -1085,7 +1017,7 @@ class AdminAnalyticsCoursesView(APIView):
     def get(self, request):
         station_map = {s.id: s.name for s in Station.objects.all().values("id", "name")}
         programs = CourseProgram.objects.all().values(
-            "id", "title", "station_id", "lessons_count", "topics_count", "tests_count"
+            "id", "title", "station_id", "lessons_count", "topics_count", "tests_count", "updated_at"
         )
 
         data = []
@@ -1099,7 +1031,7 @@ class AdminAnalyticsCoursesView(APIView):
                 avg_progress=models.Avg("progress_percent"),
             )
             test_stats = _get_course_test_score_stats(course_program_id)
-            totals = _get_course_program_material_totals(course_program_id)
+            totals = material_totals(course_program_id, program["updated_at"])
             completed_materials = UserCourseMaterial.objects.filter(
                 course_program_id=course_program_id, is_completed=True
             ).count()
@@ -1248,12 +1180,11 @@ class AdminAnalyticsCourseParticipantsView(APIView):
             str(u["id"]): u
             for u in User.objects.filter(id__in=user_ids).values("id", "username", "full_name", "email")
         }
-        profiles = {}
-        for profile in UserProfile.objects.filter(id__in=user_ids).values(
-            "id", "avatar_url", "position", "company"
-        ):
-            profile["avatar_url"] = _resolve_avatar_url(profile.get("avatar_url"))
-            profiles[str(profile["id"])] = profile
+        profile_rows = list(
+            UserProfile.objects.filter(id__in=user_ids).values("id", "avatar_url", "position", "company")
+        )
+        _resolve_avatar_urls(profile_rows)
+        profiles = {str(profile["id"]): profile for profile in profile_rows}
 
         materials_map = {}
         for row in UserCourseMaterial.objects.filter(
@@ -1313,6 +1244,48 @@ class AdminAnalyticsCourseParticipantsView(APIView):
         return JsonResponse({"data": data, "total": len(data)})
 
 
+def _live_user_analytics() -> dict[str, dict]:
+    """Per-user aggregates computed from the live tables (no fresh rollup)."""
+    enrollment_stats = {
+        str(row["user_id"]): row
+        for row in UserCourseProgram.objects.values("user_id").annotate(
+            total=models.Count("id"),
+            active=models.Count("id", filter=models.Q(status="in_progress")),
+            completed=models.Count("id", filter=models.Q(status="completed")),
+            avg_progress=models.Avg("progress_percent"),
+            total_hours=models.Sum("hours_studied"),
+            last_activity=models.Max("last_activity"),
+        )
+    }
+
+    materials_map = {}
+    for row in UserCourseMaterial.objects.filter(is_completed=True).values("user_id", "material_type").annotate(count=models.Count("id")):
+        key = str(row["user_id"])
+        if key not in materials_map:
+            materials_map[key] = {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0}
+        materials_map[key][row["material_type"]] = row["count"]
+
+    test_scores = {
+        str(row["user_id"]): row["avg_score"]
+        for row in TestResult.objects.values("user_id").annotate(avg_score=models.Avg("score"))
+    }
+
+    stats = {}
+    for user_id in set(enrollment_stats) | set(materials_map) | set(test_scores):
+        enroll = enrollment_stats.get(user_id, {})
+        stats[user_id] = {
+            "total_enrollments": enroll.get("total", 0) or 0,
+            "active_courses": enroll.get("active", 0) or 0,
+            "completed_courses": enroll.get("completed", 0) or 0,
+            "total_hours_studied": float(enroll.get("total_hours") or 0),
+            "average_progress": round(float(enroll.get("avg_progress") or 0), 2),
+            "average_test_score": round(float(test_scores.get(user_id) or 0), 2),
+            "materials_completed": materials_map.get(user_id, {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0}),
+            "last_activity": enroll.get("last_activity").isoformat() if enroll.get("last_activity") else None,
+        }
+    return stats
+
+
 class AdminAnalyticsUsersView(APIView):
     permission_classes = [IsAdmin]
 
@@ -1320,42 +1293,21 @@ class AdminAnalyticsUsersView(APIView):
         users = list(User.objects.all().values("id", "username", "full_name", "email", "role", "is_active", "created_at"))
         user_ids = [u["id"] for u in users]
 
-        profiles = {}
-        for profile in UserProfile.objects.filter(id__in=user_ids).values(
-            "id", "avatar_url", "position", "company"
-        ):
-            profile["avatar_url"] = _resolve_avatar_url(profile.get("avatar_url"))
-            profiles[str(profile["id"])] = profile
-
-        enrollment_stats = {
-            str(row["user_id"]): row
-            for row in UserCourseProgram.objects.values("user_id").annotate(
-                total=models.Count("id"),
-                active=models.Count("id", filter=models.Q(status="in_progress")),
-                completed=models.Count("id", filter=models.Q(status="completed")),
-                avg_progress=models.Avg("progress_percent"),
-                total_hours=models.Sum("hours_studied"),
-                last_activity=models.Max("last_activity"),
-            )
-        }
-
-        materials_map = {}
-        for row in UserCourseMaterial.objects.filter(is_completed=True).values("user_id", "material_type").annotate(count=models.Count("id")):
-            key = str(row["user_id"])
-            if key not in materials_map:
-                materials_map[key] = {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0}
-            materials_map[key][row["material_type"]] = row["count"]
+        profile_rows = list(
+            UserProfile.objects.filter(id__in=user_ids).values("id", "avatar_url", "position", "company")
+        )
+        _resolve_avatar_urls(profile_rows)
+        profiles = {str(profile["id"]): profile for profile in profile_rows}
 
-        test_scores = {
-            str(row["user_id"]): row["avg_score"]
-            for row in TestResult.objects.values("user_id").annotate(avg_score=models.Avg("score"))
-        }
+        user_stats = analytics_rollups.user_stats()
+        if user_stats is None:
+            user_stats = _live_user_analytics()
 
         data = []
         for user in users:
             user_id = str(user["id"])
             profile = profiles.get(user_id, {})
-            enroll = enrollment_stats.get(user_id, {})
+            stats = user_stats.get(user_id, {})
             data.append(
                 {
                     "user_id": user_id,
@@ -1368,14 +1320,14 @@ class AdminAnalyticsUsersView(APIView):
                     "role": user.get("role"),
                     "is_active": user.get("is_active"),
                     "created_at": user.get("created_at").isoformat() if user.get("created_at") else None,
-                    "total_enrollments": enroll.get("total", 0) or 0,
-                    "active_courses": enroll.get("active", 0) or 0,
-                    "completed_courses": enroll.get("completed", 0) or 0,
-                    "total_hours_studied": float(enroll.get("total_hours") or 0),
-                    "average_progress": round(float(enroll.get("avg_progress") or 0), 2),
-                    "average_test_score": round(float(test_scores.get(user_id) or 0), 2),
-                    "materials_completed": materials_map.get(user_id, {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0}),
-                    "last_activity": enroll.get("last_activity").isoformat() if enroll.get("last_activity") else None,
+                    "total_enrollments": stats.get("total_enrollments", 0),
+                    "active_courses": stats.get("active_courses", 0),
+                    "completed_courses": stats.get("completed_courses", 0),
+                    "total_hours_studied": stats.get("total_hours_studied", 0.0),
+                    "average_progress": stats.get("average_progress", 0.0),
+                    "average_test_score": stats.get("average_test_score", 0.0),
+                    "materials_completed": stats.get("materials_completed", {"video": 0, "pdf": 0, "text": 0, "presentation": 0, "test": 0}),
+                    "last_activity": stats.get("last_activity"),
                 }
             )
 
@@ -1503,95 +1455,99 @@ class AdminAnalyticsUserDetailView(APIView):
         )
 
 
-class AdminAnalyticsMaterialsView(APIView):
-    permission_classes = [IsAdmin]
-
-    def get(self, request):
-        totals = {"video": 0, "pdf": 0, "test": 0}
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT f.file_type, COUNT(*)
-                FROM course_program_topic_files f
-                WHERE f.is_active = true
-                GROUP BY f.file_type
-                """
-            )
-            for file_type, count in cursor.fetchall():
-                if file_type == "video":
-                    totals["video"] += count
-                elif file_type == "pdf":
-                    totals["pdf"] += count
-
-        totals["test"] = CourseProgramLessonTest.objects.filter(is_active=True).count() + FinalTest.objects.filter(is_active=True).count()
-
-        completed = {"video": 0, "pdf": 0, "test": 0}
-        for row in UserCourseMaterial.objects.filter(is_completed=True).values("material_type").annotate(count=models.Count("id")):
-            completed[row["material_type"]] = row["count"]
+def _live_materials_analytics() -> dict:
+    """Material totals and completions computed from the live tables (no fresh rollup)."""
+    totals = {"video": 0, "pdf": 0, "test": 0}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT f.file_type, COUNT(*)
+            FROM course_program_topic_files f
+            WHERE f.is_active = true
+            GROUP BY f.file_type
+            """
+        )
+        for file_type, count in cursor.fetchall():
+            if file_type == "video":
+                totals["video"] += count
+            elif file_type == "pdf":
+                totals["pdf"] += count
+
+    totals["test"] = CourseProgramLessonTest.objects.filter(is_active=True).count() + FinalTest.objects.filter(is_active=True).count()
+
+    completed = {"video": 0, "pdf": 0, "test": 0}
+    for row in UserCourseMaterial.objects.filter(is_completed=True).values("material_type").annotate(count=models.Count("id")):
+        completed[row["material_type"]] = row["count"]
+
+    by_course = []
+    for program in CourseProgram.objects.all().values("id", "title"):
+        totals_by_type = _get_material_counts_by_type_for_course(program["id"])
+        completed_by_type = {"video": 0, "pdf": 0, "test": 0}
+        for row in UserCourseMaterial.objects.filter(
+            course_program_id=program["id"], is_completed=True
+        ).values("material_type").annotate(count=models.Count("id")):
+            completed_by_type[row["material_type"]] = row["count"]
+        by_course.append(
+            {
+                "course_program_id": program["id"],
+                "course_title": program["title"],
+                "materials": {
+                    "video": {"total": totals_by_type["video"], "viewed": completed_by_type["video"]},
+                    "pdf": {"total": totals_by_type["pdf"], "viewed": completed_by_type["pdf"]},
+                    "test": {"total": totals_by_type["test"], "completed": completed_by_type["test"]},
+                },
+            }
+        )
 
-        by_course = []
-        for program in CourseProgram.objects.all().values("id", "title"):
-            totals_by_type = _get_material_counts_by_type_for_course(program["id"])
-            completed_by_type = {"video": 0, "pdf": 0, "test": 0}
-            for row in UserCourseMaterial.objects.filter(
-                course_program_id=program["id"], is_completed=True
-            ).values("material_type").annotate(count=models.Count("id")):
-                completed_by_type[row["material_type"]] = row["count"]
-            by_course.append(
+    most_viewed = []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT ucm.material_key, ucm.material_type, cp.title, COUNT(*) AS view_count
+            FROM user_course_materials ucm
+            JOIN course_programs cp ON cp.id = ucm.course_program_id
+            WHERE ucm.is_completed = true
+            GROUP BY ucm.material_key, ucm.material_type, cp.title
+            ORDER BY view_count DESC
+            LIMIT 20
+            """
+        )
+        for material_key, material_type, title, view_count in cursor.fetchall():
+            most_viewed.append(
                 {
-                    "course_program_id": program["id"],
-                    "course_title": program["title"],
-                    "materials": {
-                        "video": {"total": totals_by_type["video"], "viewed": completed_by_type["video"]},
-                        "pdf": {"total": totals_by_type["pdf"], "viewed": completed_by_type["pdf"]},
-                        "test": {"total": totals_by_type["test"], "completed": completed_by_type["test"]},
-                    },
+                    "material_key": material_key,
+                    "material_type": material_type,
+                    "course_title": title,
+                    "view_count": int(view_count),
                 }
             )
 
-        most_viewed = []
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT ucm.material_key, ucm.material_type, cp.title, COUNT(*) AS view_count
-                FROM user_course_materials ucm
-                JOIN course_programs cp ON cp.id = ucm.course_program_id
-                WHERE ucm.is_completed = true
-                GROUP BY ucm.material_key, ucm.material_type, cp.title
-                ORDER BY view_count DESC
-                LIMIT 20
-                """
-            )
-            for material_key, material_type, title, view_count in cursor.fetchall():
-                most_viewed.append(
-                    {
-                        "material_key": material_key,
-                        "material_type": material_type,
-                        "course_title": title,
-                        "view_count": int(view_count),
-                    }
-                )
+    by_type = {}
+    for key in totals.keys():
+        total = totals[key]
+        viewed = completed.get(key, 0)
+        completion_rate = round((viewed / total) * 100, 2) if total else 0
+        by_type[key] = {
+            "total": total,
+            "viewed" if key != "test" else "completed": viewed,
+            "completion_rate": completion_rate,
+        }
 
-        by_type = {}
-        for key in totals.keys():
-            total = totals[key]
-            viewed = completed.get(key, 0)
-            completion_rate = round((viewed / total) * 100, 2) if total else 0
-            by_type[key] = {
-                "total": total,
-                "viewed" if key != "test" else "completed": viewed,
-                "completion_rate": completion_rate,
-            }
+    return {
+        "by_type": by_type,
+        "by_course": by_course,
+        "most_viewed": most_viewed,
+    }
 
-        return JsonResponse(
-            {
-                "data": {
-                    "by_type": by_type,
-                    "by_course": by_course,
-                    "most_viewed": most_viewed,
-                }
-            }
-        )
+
+class AdminAnalyticsMaterialsView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        data = analytics_rollups.materials()
+        if data is None:
+            data = _live_materials_analytics()
+        return JsonResponse({"data": data})
 
 
 class MyEnrollmentsView(APIView):
@@ -2337,21 +2293,10 @@ class TestResultCreateView(APIView):
                 UserCourseProgram.objects.get_or_create(
                     user_id=user_id,
                     course_program_id=course_program_id,
-                    defaults={
-                        "progress_percent": 0,
-                        "status": "in_progress",
-                        "started_at": timezone.now(),
-                    },
+                    defaults=enrollment_defaults(user_id, course_program_id),
                 )
-                UserCourseMaterial.objects.update_or_create(
-                    user_id=user_id,
-                    course_program_id=course_program_id,
-                    material_type="test",
-                    material_key=f"{test_type}:{test_id}",
-                    defaults={
-                        "is_completed": True,
-                        "viewed_at": timezone.now(),
-                    },
+                mark_material_completed(
+                    user_id, course_program_id, "test", f"{test_type}:{test_id}", restamp=True
                 )
             
             logger.info(f"[TestResultCreateView] Result created successfully: id={result.id}")
@@ -2442,36 +2387,48 @@ class SaveMaterialProgressView(APIView):
         lesson_id = data.get('lesson_id')
         topic_id = data.get('topic_id')
 
-        with transaction.atomic():
-            progress, created = UserMaterialProgress.objects.update_or_create(
-                user_id=user_id,
-                course_program_id=course_program_id,
-                material_key=material_key,
-                defaults={
-                    'material_type': material_type,
-                    'lesson_id': lesson_id,
-                    'topic_id': topic_id,
-                    'position_seconds': position_seconds,
-                    'duration_seconds': duration_seconds,
-                    'progress_percent': progress_percent,
-                    'is_completed': is_completed,
-                }
-            )
+        # Buffered write-behind; completion flips are written immediately (progress_buffer.py)
+        progress = progress_buffer.save_progress(
+            user_id,
+            course_program_id,
+            material_key,
+            material_type=material_type,
+            lesson_id=lesson_id,
+            topic_id=topic_id,
+            position_seconds=position_seconds,
+            duration_seconds=duration_seconds,
+            progress_percent=progress_percent,
+            is_completed=is_completed,
+        )
 
         return JsonResponse({
             'success': True,
             'data': {
-                'id': str(progress.id),
-                'material_key': progress.material_key,
-                'position_seconds': progress.position_seconds,
-                'duration_seconds': progress.duration_seconds,
-                'progress_percent': progress.progress_percent,
-                'is_completed': progress.is_completed,
-                'last_viewed_at': progress.last_viewed_at.isoformat(),
+                'id': progress['id'],
+                'material_key': progress['material_key'],
+                'position_seconds': progress['position_seconds'],
+                'duration_seconds': progress['duration_seconds'],
+                'progress_percent': progress['progress_percent'],
+                'is_completed': progress['is_completed'],
+                'last_viewed_at': progress['last_viewed_at'].isoformat(),
             }
         })
 
 
+_MATERIAL_PROGRESS_FIELDS = (
+    'id', 'course_program_id', 'material_key', 'material_type', 'lesson_id', 'topic_id',
+    'position_seconds', 'duration_seconds', 'progress_percent', 'is_completed', 'last_viewed_at',
+)
+
+
+def _material_progress_data(row: dict) -> dict:
+    """Response payload of a user_material_progress row or a buffered entry."""
+    data = {f: row.get(f) for f in _MATERIAL_PROGRESS_FIELDS}
+    data['id'] = str(data['id'])
+    data['last_viewed_at'] = row['last_viewed_at'].isoformat()
+    return data
+
+
 class GetMaterialProgressView(APIView):
     """GET /api/courses/progress/<material_key> - Get progress for a specific material"""
     permission_classes = [IsAuthenticated]
@@ -2487,7 +2444,18 @@ class GetMaterialProgressView(APIView):
         if course_program_id:
             filters['course_program_id'] = int(course_program_id)
 
-        progress = UserMaterialProgress.objects.filter(**filters).order_by('-last_viewed_at').first()
+        progress = (
+            UserMaterialProgress.objects.filter(**filters)
+            .order_by('-last_viewed_at')
+            .values(*_MATERIAL_PROGRESS_FIELDS)
+            .first()
+        )
+        # Positions still in the write-behind buffer are newer than the table
+        for entry in progress_buffer.pending_progress(
+            user_id, filters.get('course_program_id'), [material_key]
+        ):
+            if progress is None or entry['last_viewed_at'] >= progress['last_viewed_at']:
+                progress = entry
 
         if not progress:
             return JsonResponse({
@@ -2496,19 +2464,7 @@ class GetMaterialProgressView(APIView):
             })
 
         return JsonResponse({
-            'data': {
-                'id': str(progress.id),
-                'course_program_id': progress.course_program_id,
-                'material_key': progress.material_key,
-                'material_type': progress.material_type,
-                'lesson_id': progress.lesson_id,
-                'topic_id': progress.topic_id,
-                'position_seconds': progress.position_seconds,
-                'duration_seconds': progress.duration_seconds,
-                'progress_percent': progress.progress_percent,
-                'is_completed': progress.is_completed,
-                'last_viewed_at': progress.last_viewed_at.isoformat(),
-            },
+            'data': _material_progress_data(progress),
             'found': True
         })
 
@@ -2532,22 +2488,20 @@ class BatchMaterialProgressView(APIView):
         if course_program_id:
             filters['course_program_id'] = int(course_program_id)
 
-        progress_list = UserMaterialProgress.objects.filter(**filters)
+        latest = {}
+        rows = list(UserMaterialProgress.objects.filter(**filters).values(*_MATERIAL_PROGRESS_FIELDS))
+        # Buffered positions (progress_buffer.py) win over older table rows
+        rows += progress_buffer.pending_progress(user_id, filters.get('course_program_id'), material_keys)
+        for row in rows:
+            current = latest.get(row['material_key'])
+            if current is None or row['last_viewed_at'] >= current['last_viewed_at']:
+                latest[row['material_key']] = row
 
         result = {}
-        for progress in progress_list:
-            result[progress.material_key] = {
-                'id': str(progress.id),
-                'course_program_id': progress.course_program_id,
-                'material_type': progress.material_type,
-                'lesson_id': progress.lesson_id,
-                'topic_id': progress.topic_id,
-                'position_seconds': progress.position_seconds,
-                'duration_seconds': progress.duration_seconds,
-                'progress_percent': progress.progress_percent,
-                'is_completed': progress.is_completed,
-                'last_viewed_at': progress.last_viewed_at.isoformat(),
-            }
+        for material_key, row in latest.items():
+            data = _material_progress_data(row)
+            del data['material_key']
+            result[material_key] = data
 
         return JsonResponse({
             'data': result,
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import weakref
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import httpx
+from django.conf import settings
+from django.utils.http import parse_http_date_safe
+
+from apps.files.minio_client import get_presigner
+from apps.files.streaming import (
+    ObjectMeta,
+    RangeNotSatisfiable,
+    cached_object_meta,
+    parse_range,
+    remember_object_meta,
+)
+
+# Async counterpart of apps/files/streaming.py for the ASGI views (apps/files/async_views.py).
+#
+# Requests go to MinIO over httpx with a locally presigned SigV4 URL (apps/files/presign.py),
+# so no thread is blocked while a viewer downloads: one uvicorn process can keep hundreds
+# of video/HLS streams open. Like the sync core, every request is a single GET with the
+# client's Range forwarded; conditional headers are forwarded too, so MinIO answers 304
+# without a body when the cached metadata cannot decide.
+
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+_ERROR_CODE_RE = re.compile(rb"<Code>([^<]+)</Code>")
+_NOT_FOUND_CODES = ("NoSuchKey", "NoSuchBucket", "NotFound")
+# Short: the URL is used immediately by this process and never handed out.
+_PRESIGN_EXPIRES = 300
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+class ObjectError(Exception):
+    """Non-success MinIO response (the async analogue of botocore's ClientError)."""
+
+    def __init__(self, status: int, code: str | None):
+        super().__init__(f"MinIO error {status}: {code}")
+        self.status = status
+        self.code = code
+
+    @property
+    def not_found(self) -> bool:
+        return self.status == 404 or self.code in _NOT_FOUND_CODES
+
+
+@dataclass
+class AsyncOpenedObject:
+    response: httpx.Response | None
+    meta: ObjectMeta
+    status: int
+    content_length: int
+    content_range: str | None
+
+    async def iter_body(self, chunk_size: int | None = None):
+        """Body chunks; the MinIO response is closed when done or when the client disconnects."""
+        chunk_size = chunk_size or int(getattr(settings, "MINIO_STREAM_CHUNK_SIZE", 512 * 1024))
+        try:
+            async for chunk in self.response.aiter_raw(chunk_size):
+                yield chunk
+        finally:
+            await self.response.aclose()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Pooled httpx client for the running event loop (one per uvicorn process)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                float(getattr(settings, "MINIO_READ_TIMEOUT", 60)),
+                connect=float(getattr(settings, "MINIO_CONNECT_TIMEOUT", 10)),
+            ),
+            limits=httpx.Limits(
+                max_connections=int(getattr(settings, "MINIO_ASYNC_MAX_CONNECTIONS", 512)),
+                max_keepalive_connections=int(getattr(settings, "MINIO_MAX_POOL_CONNECTIONS", 32)),
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+def _meta_from_headers(headers: httpx.Headers, size: int) -> ObjectMeta:
+    ts = parse_http_date_safe(headers.get("Last-Modified") or "")
+    return ObjectMeta(
+        size=size,
+        etag=(headers.get("ETag") or "").strip('"'),
+        content_type=headers.get("Content-Type"),
+        last_modified=datetime.fromtimestamp(ts, tz=timezone.utc) if ts is not None else None,
+    )
+
+
+async def _error_from(response: httpx.Response) -> ObjectError:
+    body = await response.aread()
+    await response.aclose()
+    m = _ERROR_CODE_RE.search(body or b"")
+    return ObjectError(response.status_code, m.group(1).decode("utf-8", "replace") if m else None)
+
+
+async def _send(key: str, headers: dict[str, str]) -> httpx.Response:
+    url = get_presigner().presign_get(key, _PRESIGN_EXPIRES)
+    client = get_async_client()
+    return await client.send(client.build_request("GET", url, headers=headers), stream=True)
+
+
+async def _object_size(key: str) -> int:
+    """Total size via a 1-byte ranged GET (presigned URLs are GET-only)."""
+    response = await _send(key, {"Range": "bytes=0-0"})
+    try:
+        if response.status_code == 416:
+            return 0
+        if response.status_code >= 400:
+            raise await _error_from(response)
+        m = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range") or "")
+        if m and m.group(3) != "*":
+            return int(m.group(3))
+        return int(response.headers.get("Content-Length") or 0)
+    finally:
+        await response.aclose()
+
+
+async def aopen_object(
+    key: str,
+    range_header: str | None = None,
+    strict_range: bool = True,
+    if_range: str | None = None,
+    conditional_headers: dict[str, str] | None = None,
+) -> AsyncOpenedObject:
+    """
+    Open an object (or a byte range of it) with a single GET; see streaming.open_object.
+    conditional_headers (If-None-Match / If-Modified-Since) are forwarded, and a 304 from
+    MinIO comes back as status 304 with no body. If-Range is mapped onto If-Match /
+    If-Unmodified-Since, since S3 does not implement it: on 412 the whole object is sent.
+    Raises ObjectError / RangeNotSatisfiable.
+    """
+    requested = parse_range(range_header) if range_header else None
+    if range_header and requested is None and strict_range:
+        raise RangeNotSatisfiable(await _object_size(key))
+
+    if requested is not None:
+        cached = cached_object_meta(key)
+        if cached is not None and cached.size > 0 and requested[0] >= cached.size:
+            if strict_range:
+                raise RangeNotSatisfiable(cached.size)
+            requested = None
+
+    headers = dict(conditional_headers or {})
+    if requested is not None:
+        start, end = requested
+        headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        if if_range:
+            if if_range.startswith(('"', "W/")):
+                headers["If-Match"] = if_range
+            else:
+                headers["If-Unmodified-Since"] = if_range
+
+    response = await _send(key, headers)
+    if response.status_code == 412 and "Range" in headers:
+        # If-Range did not match: the client's copy is stale, send the full object.
+        await response.aclose()
+        headers = dict(conditional_headers or {})
+        response = await _send(key, headers)
+    if response.status_code == 416:
+        await response.aclose()
+        size = await _object_size(key)
+        # Empty objects cannot satisfy any range; serve them whole like the sync views.
+        if strict_range and size > 0:
+            raise RangeNotSatisfiable(size)
+        response = await _send(key, dict(conditional_headers or {}))
+
+    if response.status_code == 304:
+        await response.aclose()
+        cached = cached_object_meta(key)
+        meta = _meta_from_headers(response.headers, cached.size if cached else 0)
+        return AsyncOpenedObject(None, meta, 304, 0, None)
+    if response.status_code >= 400:
+        raise await _error_from(response)
+
+    length = int(response.headers.get("Content-Length") or 0)
+    m = _CONTENT_RANGE_RE.match(response.headers.get("Content-Range") or "")
+    if response.status_code == 206 and m and m.group(3) != "*":
+        total = int(m.group(3))
+        status = 206
+        content_range = f"bytes {m.group(1)}-{m.group(2)}/{total}"
+    else:
+        total = length
+        status = 200
+        content_range = None
+
+    meta = _meta_from_headers(response.headers, total)
+    remember_object_meta(key, meta)
+    return AsyncOpenedObject(response, meta, status, length, content_range)
+
+
+async def aget_object_meta(key: str) -> ObjectMeta:
+    """Cached metadata, or one ranged GET of the first byte."""
+    cached = cached_object_meta(key)
+    if cached is not None:
+        return cached
+    opened = await aopen_object(key, "bytes=0-0", strict_range=False)
+    await opened.response.aclose()
+    return opened.meta
@@ -0,0 +1,296 @@
+from __future__ import annotations
+
+import logging
+import mimetypes
+import urllib.parse
+
+from asgiref.sync import sync_to_async
+from botocore.exceptions import ClientError
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from apps.files import segment_cache
+from apps.files.async_streaming import ObjectError, aget_object_meta, aopen_object
+from apps.files.hls_playlist import signed_playlist, signed_segments_enabled
+from apps.files.jobs import is_final_output_key
+from apps.files.streaming import (
+    RangeNotSatisfiable,
+    accel_redirect_enabled,
+    accel_redirect_response,
+    cached_object_meta,
+    conditional_response,
+)
+from apps.files.views import (
+    _VIDEO_CACHE_CONTROL,
+    _accel_content_type,
+    _get_content_type,
+    _hls_cache_control,
+    _segment_cache_response,
+    _signed_playlist_response,
+    _stream_cache_control,
+)
+
+logger = logging.getLogger(__name__)
+
+# ASGI versions of StreamObjectView / VideoStreamView / HlsObjectView (same URLs, same
+# headers). Used when FILES_ASYNC_STREAMING=true, i.e. in the uvicorn `backend-stream`
+# service that nginx routes /api/files/{stream,video,hls}/ to. The body is relayed with
+# httpx (apps/files/async_streaming.py), so an open stream costs no thread.
+
+_CONDITIONAL_HEADERS = ("If-None-Match", "If-Modified-Since")
+_EXPOSE_HEADERS = "Content-Length, Content-Range, Accept-Ranges"
+
+
+def _authenticate(request):
+    """Run the DRF authenticators; returns (user, error response)."""
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        if IsAuthenticated().has_permission(drf_request, None):
+            return drf_request.user, None
+        return None, JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+    except APIException as e:
+        return None, JsonResponse({"detail": str(e.detail)}, status=403)
+
+
+async def _aiter_file_range(f, start: int, length: int, chunk_size: int = 512 * 1024):
+    """Async body for a disk-cache hit: file reads run in threads, the event loop never blocks."""
+    read = sync_to_async(f.read, thread_sensitive=False)
+    try:
+        await sync_to_async(f.seek, thread_sensitive=False)(start)
+        while length > 0:
+            chunk = await read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await sync_to_async(f.close, thread_sensitive=False)()
+
+
+def _decode_key(key: str) -> str:
+    return urllib.parse.unquote(key).lstrip("/")
+
+
+class _AsyncObjectProxy(View):
+    """Shared GET/HEAD/OPTIONS flow; subclasses set the per-endpoint headers and errors."""
+
+    log_tag = "AsyncObjectProxy"
+    allow_headers = "Range, Content-Type"
+    strict_range = True
+    requires_auth = False
+
+    def cors_origin(self, request) -> str:
+        return "*"
+
+    def decode_key(self, key: str) -> str:
+        return _decode_key(key)
+
+    def content_type_for(self, key: str, meta) -> str:
+        return _get_content_type(key, meta.content_type)
+
+    async def cache_control_for(self, key: str, content_type: str) -> str:
+        return _VIDEO_CACHE_CONTROL
+
+    def error_response(self, exc: ObjectError) -> JsonResponse:
+        if exc.not_found:
+            return JsonResponse({"error": "File not found"}, status=404)
+        return JsonResponse({"error": "Failed to retrieve file"}, status=500)
+
+    def range_error_response(self, size: int) -> JsonResponse:
+        response = JsonResponse({"error": "Range Not Satisfiable"}, status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        response["Accept-Ranges"] = "bytes"
+        response["Access-Control-Allow-Origin"] = "*"
+        return response
+
+    def accel_content_type(self, key: str) -> str | None:
+        return _accel_content_type(key)
+
+    def _cors(self, request, response) -> None:
+        response["Access-Control-Allow-Origin"] = self.cors_origin(request)
+        response["Access-Control-Allow-Methods"] = "GET, HEAD, OPTIONS"
+        response["Access-Control-Allow-Headers"] = self.allow_headers
+        response["Access-Control-Expose-Headers"] = _EXPOSE_HEADERS
+
+    async def _prepare(self, request, key: str):
+        if self.requires_auth:
+            _user, denied = await sync_to_async(_authenticate)(request)
+            if denied is not None:
+                return None, denied
+        try:
+            key = self.decode_key(key)
+        except Exception as e:
+            logger.error(f"[{self.log_tag}] Error decoding key: {e}")
+            return None, JsonResponse({"error": "Invalid key format"}, status=400)
+        if not key:
+            return None, JsonResponse({"error": "Missing key"}, status=400)
+        return key, None
+
+    async def options(self, request, key: str):
+        response = JsonResponse({})
+        response["Access-Control-Allow-Origin"] = self.cors_origin(request)
+        response["Access-Control-Allow-Methods"] = "GET, HEAD, OPTIONS"
+        response["Access-Control-Allow-Headers"] = self.allow_headers
+        response["Access-Control-Max-Age"] = "86400"
+        return response
+
+    async def head(self, request, key: str):
+        key, error = await self._prepare(request, key)
+        if error is not None:
+            return error
+        try:
+            meta = await aget_object_meta(key)
+        except ObjectError as e:
+            return self.error_response(e)
+
+        content_type = self.content_type_for(key, meta)
+        cache_control = await self.cache_control_for(key, content_type)
+        not_modified = conditional_response(request, meta, {"Cache-Control": cache_control})
+        if not_modified is not None:
+            return not_modified
+
+        response = JsonResponse({}, status=200)
+        response["Content-Type"] = content_type
+        response["Content-Length"] = str(meta.size)
+        response["Accept-Ranges"] = "bytes"
+        self._cors(request, response)
+        response["Cache-Control"] = cache_control
+        for name, value in meta.validator_headers().items():
+            response[name] = value
+        return response
+
+    async def get(self, request, key: str):
+        key, error = await self._prepare(request, key)
+        if error is not None:
+            return error
+
+        cached = cached_object_meta(key)
+        if cached is not None:
+            content_type = self.content_type_for(key, cached)
+            not_modified = conditional_response(
+                request, cached, {"Cache-Control": await self.cache_control_for(key, content_type)}
+            )
+            if not_modified is not None:
+                return not_modified
+
+        if accel_redirect_enabled():
+            content_type = self.accel_content_type(key)
+            cache_control = await self.cache_control_for(key, content_type or "")
+            return await sync_to_async(accel_redirect_response)(key, content_type, {"Cache-Control": cache_control})
+
+        try:
+            opened = await aopen_object(
+                key,
+                request.headers.get("Range"),
+                strict_range=self.strict_range,
+                if_range=request.headers.get("If-Range"),
+                conditional_headers={h: request.headers[h] for h in _CONDITIONAL_HEADERS if h in request.headers},
+            )
+        except RangeNotSatisfiable as e:
+            return self.range_error_response(e.size)
+        except ObjectError as e:
+            logger.error(f"[{self.log_tag}] MinIO error for key {key}: {e.code or e.status}")
+            return self.error_response(e)
+
+        content_type = self.content_type_for(key, opened.meta)
+        cache_control = await self.cache_control_for(key, content_type)
+        if opened.status == 304:
+            # MinIO evaluated the validators: no body was opened.
+            not_modified = HttpResponseNotModified()
+            not_modified["Cache-Control"] = cache_control
+            for name, value in opened.meta.validator_headers().items():
+                not_modified[name] = value
+            return not_modified
+
+        resp = StreamingHttpResponse(opened.iter_body(), status=opened.status, content_type=content_type)
+        resp["Accept-Ranges"] = "bytes"
+        resp["Content-Length"] = str(opened.content_length)
+        if opened.content_range:
+            resp["Content-Range"] = opened.content_range
+        self._cors(request, resp)
+        resp["Cache-Control"] = cache_control
+        if content_type == "application/pdf":
+            resp["Pragma"] = "no-cache"
+            resp["Expires"] = "0"
+        for name, value in opened.meta.validator_headers().items():
+            resp[name] = value
+        return resp
+
+
+class AsyncStreamObjectView(_AsyncObjectProxy):
+    """Async StreamObjectView: authenticated PDF/video/file streaming."""
+
+    log_tag = "AsyncStreamObjectView"
+    allow_headers = "Range, Authorization, Content-Type"
+    requires_auth = True
+
+    def cors_origin(self, request) -> str:
+        return request.headers.get("Origin", "*")
+
+    async def cache_control_for(self, key: str, content_type: str) -> str:
+        return _stream_cache_control(content_type, key)
+
+    def range_error_response(self, size: int) -> JsonResponse:
+        response = super().range_error_response(size)
+        del response["Access-Control-Allow-Origin"]
+        return response
+
+
+class AsyncVideoStreamView(_AsyncObjectProxy):
+    """Async VideoStreamView: public video streaming."""
+
+    log_tag = "AsyncVideoStreamView"
+
+
+class AsyncHlsObjectView(_AsyncObjectProxy):
+    """Async HlsObjectView: public HLS playlists and segments."""
+
+    log_tag = "AsyncHlsObjectView"
+    strict_range = False
+
+    def decode_key(self, key: str) -> str:
+        return key.lstrip("/")
+
+    def content_type_for(self, key: str, meta) -> str:
+        return meta.content_type or mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+    async def cache_control_for(self, key: str, content_type: str) -> str:
+        return await sync_to_async(_hls_cache_control)(key)
+
+    def accel_content_type(self, key: str) -> str | None:
+        return None
+
+    def error_response(self, exc: ObjectError) -> JsonResponse:
+        return JsonResponse({"error": "Not found"}, status=404)
+
+    async def get(self, request, key: str):
+        key = key.lstrip("/")
+        if key.endswith(".m3u8") and signed_segments_enabled():
+            # Playlists are small: rewrite them with the sync helper in a thread.
+            try:
+                signed = await sync_to_async(signed_playlist, thread_sensitive=False)(key)
+            except ClientError:
+                return JsonResponse({"error": "Not found"}, status=404)
+            except UnicodeDecodeError:
+                signed = None
+            if signed is not None:
+                return _signed_playlist_response(*signed)
+        if segment_cache.segment_cache_enabled() and await sync_to_async(is_final_output_key)(key):
+            try:
+                cached = await sync_to_async(segment_cache.get, thread_sensitive=False)(key)
+            except ClientError:
+                return JsonResponse({"error": "Not found"}, status=404)
+            if cached is not None:
+                cache_control = await self.cache_control_for(key, "")
+                # Streamed from an async generator: a sync FileResponse would be read
+                # into memory by Django's ASGI handler.
+                return _segment_cache_response(request, key, cached, cache_control, _aiter_file_range)
+        return await super().get(request, key)
+
+    async def head(self, request, key: str):
+        # The sync HlsObjectView has no HEAD handler of its own (Django maps it to GET).
+        return await self.get(request, key)
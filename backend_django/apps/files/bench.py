@@ -0,0 +1,120 @@
+"""
+Helpers for the files app micro-benchmarks (management commands bench_*).
+Not used by request handling.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d+)?")
+
+
+def _parse_range(header: str, total: int) -> tuple[int | None, int | None]:
+    m = _RANGE_RE.match(header or "")
+    if not m or int(m.group(1)) >= total:
+        return None, None
+    start = int(m.group(1))
+    end = min(int(m.group(2)), total - 1) if m.group(2) else total - 1
+    return start, end
+
+
+class _StubS3Handler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive, like MinIO does.
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002 - signature from BaseHTTPRequestHandler
+        return
+
+    def _object_headers(self, length: int) -> None:
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(length))
+        self.send_header("ETag", f'"{self.server.etag}"')
+        self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.send_header("Accept-Ranges", "bytes")
+
+    def do_HEAD(self):
+        self._delay()
+        self.send_response(200)
+        self._object_headers(len(self.server.payload))
+        self.end_headers()
+
+    def _delay(self) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def do_GET(self):
+        self._delay()
+        payload = self.server.payload
+        total = len(payload)
+        range_header = self.headers.get("Range") or ""
+        start, end = _parse_range(range_header, total)
+        if range_header and start is None:
+            error = b"<Error><Code>InvalidRange</Code><Message>Range not satisfiable</Message></Error>"
+            self.send_response(416)
+            self.send_header("Content-Type", "application/xml")
+            self.send_header("Content-Length", str(len(error)))
+            self.end_headers()
+            self.wfile.write(error)
+            return
+        if start is None:
+            self.send_response(200)
+            self._object_headers(total)
+            self.end_headers()
+            body = memoryview(payload)
+        else:
+            self.send_response(206)
+            self._object_headers(end - start + 1)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{total}")
+            self.end_headers()
+            body = memoryview(payload)[start : end + 1]
+        self.wfile.write(body)
+
+
+class StubS3Server:
+    """
+    Minimal in-process stand-in for MinIO: every key resolves to the same object.
+    Answers HEAD and (Range) GET, which is all the streaming/presign paths need.
+    `latency` (seconds) is added to every request to model the network round-trip.
+    """
+
+    def __init__(self, payload_size: int = 1024 * 1024, latency: float = 0.0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StubS3Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.payload = bytes(payload_size)
+        self.httpd.etag = hashlib.md5(self.httpd.payload).hexdigest()
+        self.httpd.latency = latency
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubS3Server":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def summarize_ms(samples: list[float]) -> dict:
+    """Latency summary (seconds in, milliseconds out)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"n": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0.0}
+    p95_index = min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))
+    return {
+        "n": len(ordered),
+        "mean": statistics.fmean(ordered) * 1000,
+        "p50": statistics.median(ordered) * 1000,
+        "p95": ordered[p95_index] * 1000,
+        "max": ordered[-1] * 1000,
+    }
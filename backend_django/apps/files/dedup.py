@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.utils import timezone
+
+from apps.files.minio_client import s3_client
+from apps.files.models import ContentBlob
+from apps.files.streaming import get_object_meta, invalidate_object_meta, is_not_found
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed deduplication of uploaded materials.
+#
+# Admins attach the same PDF/MP4 to several stations' topics. Uploads that opt in
+# (`dedup`) are hashed while they stream, and content_blobs maps the hash to the first
+# object stored with those bytes. A later upload with the same hash is deleted right
+# after it lands and the caller gets the existing key instead; a video attached under
+# that key then reuses the finished HLS output (jobs.finished_job_for) rather than
+# running ffmpeg again.
+#
+# Hashes:
+#   sha256:<hex>         computed by MinioUploadHandler while the body streams through Django;
+#   s3-multipart:<etag>  browser multipart uploads (parts go straight to MinIO): the multipart
+#                        ETag is MD5 over the part MD5s, which MinIO computes while storing.
+# A given file always takes the same upload path (MULTIPART_THRESHOLD), so the two kinds
+# never need to match each other.
+#
+# The table is optional: without it (schema not applied) uploads are simply not deduplicated.
+
+
+def dedup_enabled() -> bool:
+    return bool(getattr(settings, "CONTENT_DEDUP_ENABLED", True))
+
+
+def sha256_hash(hexdigest: str) -> str:
+    return f"sha256:{hexdigest}"
+
+
+def multipart_hash(etag: str | None) -> str | None:
+    etag = (etag or "").strip('"')
+    # Only "<md5>-<parts>" is content-derived; anything else (e.g. SSE) is not usable.
+    if "-" not in etag:
+        return None
+    return f"s3-multipart:{etag}"
+
+
+@dataclass
+class DedupResult:
+    key: str
+    content_hash: str
+    deduplicated: bool
+
+
+def _object_matches(key: str, size: int) -> bool:
+    try:
+        return get_object_meta(key, refresh=True).size == size
+    except ClientError as e:
+        if is_not_found(e):
+            return False
+        raise
+
+
+def _delete_duplicate(key: str) -> None:
+    try:
+        s3_client().delete_object(Bucket=settings.MINIO_BUCKET, Key=key)
+    except ClientError as e:
+        # Harmless leftover: the caller already points at the canonical object.
+        logger.warning(f"[dedup] Could not delete duplicate object {key}: {e}")
+    invalidate_object_meta(key)
+
+
+def register_upload(content_hash: str, size: int, key: str, content_type: str | None) -> DedupResult:
+    """
+    Record a freshly stored object under its content hash, or, if the same bytes are
+    already stored under another key, delete the new copy and return that key.
+    """
+    key = key.lstrip("/")
+    try:
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO content_blobs (content_hash, size, object_key, content_type, created_at, last_used_at)
+                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                ON CONFLICT (content_hash) DO NOTHING
+                RETURNING id
+                """,
+                [content_hash, size, key, content_type],
+            )
+            if cur.fetchone() is not None:
+                return DedupResult(key, content_hash, False)
+
+        blob = ContentBlob.objects.filter(content_hash=content_hash).values("object_key", "size").first()
+        if blob is None:
+            return DedupResult(key, content_hash, False)
+        existing = blob["object_key"]
+        if existing == key:
+            return DedupResult(key, content_hash, False)
+
+        if blob["size"] != size or not _object_matches(existing, size):
+            # The indexed object was deleted or replaced: the new upload becomes canonical.
+            ContentBlob.objects.filter(content_hash=content_hash, object_key=existing).update(
+                object_key=key, size=size, content_type=content_type, last_used_at=timezone.now()
+            )
+            return DedupResult(key, content_hash, False)
+
+        ContentBlob.objects.filter(content_hash=content_hash).update(
+            reuse_count=F("reuse_count") + 1, last_used_at=timezone.now()
+        )
+    except (DatabaseError, ClientError) as e:
+        logger.warning(f"[dedup] Index unavailable, keeping {key} as uploaded: {e}")
+        return DedupResult(key, content_hash, False)
+
+    _delete_duplicate(key)
+    logger.info(f"[dedup] {key} duplicates {existing} ({size} bytes), reusing it")
+    return DedupResult(existing, content_hash, True)
+
+
+def forget_object(key: str) -> None:
+    """Drop index entries pointing at an object that is being deleted."""
+    try:
+        ContentBlob.objects.filter(object_key=key.lstrip("/")).delete()
+    except DatabaseError as e:
+        logger.warning(f"[dedup] Could not drop index entries for {key}: {e}")
+
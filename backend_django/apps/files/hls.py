@@ -1,15 +1,22 @@
 from __future__ import annotations
 
 import os
+import random
 import shutil
 import subprocess
 import tempfile
+import threading
+import time
 import shutil as _shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 
+from botocore.exceptions import ClientError
 from django.conf import settings
 
-from apps.files.minio_client import s3_client
+from apps.files.hls_ladder import ThumbnailPlan, TranscodePlan, build_plan, probe_source
+from apps.files.minio_client import presign_get, s3_client
 
 
 def _guess_content_type(key: str) -> str:
@@ -22,6 +29,12 @@ def _guess_content_type(key: str) -> str:
         return "video/iso.segment"
     if k.endswith(".mp4"):
         return "video/mp4"
+    if k.endswith(".jpg"):
+        return "image/jpeg"
+    if k.endswith(".webp"):
+        return "image/webp"
+    if k.endswith(".vtt"):
+        return "text/vtt"
     return "application/octet-stream"
 
 
@@ -38,25 +51,452 @@ def download_object_to_file(key: str, dst_path: Path) -> None:
             f.write(chunk)
 
 
-def upload_folder(prefix: str, folder: Path) -> None:
+class UploadStats:
+    """Thread-safe upload counters for one transcode job (stored on VideoTranscodeJob)."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.files = 0
+        self.retries = 0
+        self._first_start: float | None = None
+        self._last_end: float | None = None
+        self._lock = threading.Lock()
+
+    def record(self, size: int, started: float, ended: float) -> None:
+        with self._lock:
+            self.bytes += size
+            self.files += 1
+            if self._first_start is None or started < self._first_start:
+                self._first_start = started
+            if self._last_end is None or ended > self._last_end:
+                self._last_end = ended
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    @property
+    def seconds(self) -> float:
+        """Wall time from the first upload start to the last upload end."""
+        if self._first_start is None or self._last_end is None:
+            return 0.0
+        return self._last_end - self._first_start
+
+
+_SINGLE_PUT_MAX = 8 * 1024 * 1024  # below boto3's multipart threshold: one PUT, no transfer threads
+
+
+def _is_transient(exc: Exception) -> bool:
+    if isinstance(exc, ClientError):
+        code = (exc.response.get("Error") or {}).get("Code")
+        status = (exc.response.get("ResponseMetadata") or {}).get("HTTPStatusCode") or 0
+        return status >= 500 or code in ("SlowDown", "RequestTimeout", "RequestTimeTooSkewed", "InternalError")
+    # Connection resets, read timeouts, S3UploadFailedError wrappers, ...
+    return True
+
+
+def _upload_file(path: Path, key: str, stats: UploadStats | None = None) -> None:
+    """Upload one file with the shared client, retrying transient failures with backoff."""
+    attempts = int(getattr(settings, "HLS_UPLOAD_RETRIES", 4))
+    size = path.stat().st_size
+    content_type = _guess_content_type(key)
     client = s3_client()
+    for attempt in range(1, attempts + 1):
+        started = time.monotonic()
+        try:
+            if size <= _SINGLE_PUT_MAX:
+                with path.open("rb") as f:
+                    client.put_object(Bucket=settings.MINIO_BUCKET, Key=key, Body=f, ContentType=content_type)
+            else:
+                client.upload_file(str(path), settings.MINIO_BUCKET, key, ExtraArgs={"ContentType": content_type})
+        except Exception as e:
+            if attempt >= attempts or not _is_transient(e):
+                raise
+            if stats is not None:
+                stats.record_retry()
+            time.sleep(min(10.0, 0.5 * 2 ** (attempt - 1)) * (0.5 + random.random()))
+            continue
+        if stats is not None:
+            stats.record(size, started, time.monotonic())
+        return
+
+
+def _playlist_order(path: Path) -> int:
+    # Variant playlists before master.m3u8: master must never point at a missing playlist.
+    return 1 if path.name == "master.m3u8" else 0
+
+
+def upload_folder(prefix: str, folder: Path, stats: UploadStats | None = None) -> None:
+    """
+    Upload an HLS output folder to MinIO under prefix.
+    Segments go first, in parallel (HLS_UPLOAD_CONCURRENCY); playlists are uploaded only
+    after every segment succeeded, so a partially uploaded rendition is never playable.
+    """
+    prefix = prefix.rstrip("/")
+    segments: list[Path] = []
+    playlists: list[Path] = []
     for root, _dirs, files in os.walk(folder):
         for name in files:
             full_path = Path(root) / name
-            rel = full_path.relative_to(folder).as_posix()
-            key = f"{prefix.rstrip('/')}/{rel}"
-            client.upload_file(
-                str(full_path),
-                settings.MINIO_BUCKET,
-                key,
-                ExtraArgs={"ContentType": _guess_content_type(key)},
+            (playlists if name.endswith(".m3u8") else segments).append(full_path)
+
+    def _key(path: Path) -> str:
+        return f"{prefix}/{path.relative_to(folder).as_posix()}"
+
+    if segments:
+        workers = max(1, int(getattr(settings, "HLS_UPLOAD_CONCURRENCY", 8)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hls-upload") as pool:
+            futures = [pool.submit(_upload_file, path, _key(path), stats) for path in segments]
+            errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            raise RuntimeError(f"Failed to upload {len(errors)} of {len(segments)} HLS files: {errors[0]}")
+
+    for path in sorted(playlists, key=_playlist_order):
+        _upload_file(path, _key(path), stats)
+
+
+@dataclass
+class HlsOutput:
+    """Object keys written by a transcode; poster/thumbnails are None when not produced."""
+
+    master_key: str
+    poster_key: str | None = None
+    thumbnails_key: str | None = None
+
+
+POSTER_NAME = "poster"
+THUMBNAILS_DIR = "thumbnails"
+THUMBNAILS_VTT = "thumbnails.vtt"
+
+
+def _thumbnail_filters(thumbs: ThumbnailPlan) -> list[tuple[str, str]]:
+    """(label, filter chain) of the extra video outputs: poster frame and sprite sheets."""
+    chains = [
+        (
+            "poster",
+            f"select=gte(t\\,{thumbs.poster_at}),scale=w=min(iw\\,{thumbs.poster_width}):h=-2",
+        )
+    ]
+    if thumbs.interval:
+        chains.append(
+            (
+                "sprite",
+                f"fps=1/{thumbs.interval:g},scale={thumbs.tile_width}:{thumbs.tile_height},"
+                f"tile={thumbs.columns}x{thumbs.rows}",
             )
+        )
+    return chains
 
 
-def transcode_mp4_to_hls(source_key: str, output_prefix: str) -> str:
+def _thumbnail_output_args(out_dir: Path, thumbs: ThumbnailPlan) -> list[str]:
+    if thumbs.poster_format == "webp":
+        poster_codec = ["-c:v", "libwebp", "-quality", "80"]
+    else:
+        poster_codec = ["-q:v", "3"]
+    args = ["-map", "[posterout]", "-frames:v", "1", *poster_codec, str(out_dir / f"{POSTER_NAME}.{thumbs.poster_format}")]
+    if thumbs.interval:
+        (out_dir / THUMBNAILS_DIR).mkdir(parents=True, exist_ok=True)
+        args += [
+            "-map",
+            "[spriteout]",
+            "-q:v",
+            "5",
+            "-start_number",
+            "0",
+            "-f",
+            "image2",
+            str(out_dir / THUMBNAILS_DIR / "sprite_%03d.jpg"),
+        ]
+    return args
+
+
+def _vtt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}"
+
+
+def write_thumbnails_vtt(out_dir: Path, thumbs: ThumbnailPlan) -> bool:
+    """
+    WebVTT for seek previews: one cue per thumbnail pointing at its tile
+    (sprite_NNN.jpg#xywh=x,y,w,h, relative to the .vtt). False if no sheet was rendered.
+    """
+    sheets = sorted((out_dir / THUMBNAILS_DIR).glob("sprite_*.jpg")) if thumbs.interval else []
+    if not sheets:
+        return False
+    per_sheet = thumbs.columns * thumbs.rows
+    count = min(int(-(-thumbs.duration // thumbs.interval)), len(sheets) * per_sheet)
+    lines = ["WEBVTT", ""]
+    for i in range(count):
+        start = i * thumbs.interval
+        end = min(start + thumbs.interval, thumbs.duration)
+        tile = i % per_sheet
+        x = tile % thumbs.columns * thumbs.tile_width
+        y = tile // thumbs.columns * thumbs.tile_height
+        lines += [
+            f"{_vtt_time(start)} --> {_vtt_time(end)}",
+            f"{THUMBNAILS_DIR}/sprite_{i // per_sheet:03d}.jpg#xywh={x},{y},{thumbs.tile_width},{thumbs.tile_height}",
+            "",
+        ]
+    (out_dir / THUMBNAILS_VTT).write_text("\n".join(lines), encoding="utf-8")
+    return True
+
+
+def _ffmpeg_hls_args(out_dir: Path, plan: TranscodePlan) -> list[str]:
+    n = len(plan.renditions)
+    labels = [f"v{i}" for i in range(n)]
+    extra = _thumbnail_filters(plan.thumbnails) if plan.thumbnails else []
+    branches = labels + [label for label, _chain in extra]
+    split = len(branches) > 1
+    filters = [f"[0:v]split={len(branches)}" + "".join(f"[{b}]" for b in branches)] if split else []
+    for i, r in enumerate(plan.renditions):
+        src = f"[{labels[i]}]" if split else "[0:v]"
+        # -2: keep aspect ratio with an even width (required by yuv420p encoders).
+        filters.append(f"{src}scale=w=-2:h={r.height}[{labels[i]}out]")
+    for label, chain in extra:
+        filters.append(f"[{label}]{chain}[{label}out]")
+
+    args = ["-filter_complex", ";".join(filters)]
+    for i in range(n):
+        args += ["-map", f"[{labels[i]}out]"]
+        if plan.has_audio:
+            args += ["-map", "a:0"]
+    for i, r in enumerate(plan.renditions):
+        args += [
+            f"-c:v:{i}",
+            plan.codec,
+            f"-b:v:{i}",
+            f"{r.video_kbps}k",
+            f"-maxrate:v:{i}",
+            f"{r.maxrate_kbps}k",
+            f"-bufsize:v:{i}",
+            f"{r.bufsize_kbps}k",
+        ]
+    if plan.has_audio:
+        args += ["-c:a", "aac", "-b:a", f"{plan.audio_kbps}k", "-ac", "2", "-ar", "48000"]
+    stream_map = " ".join(f"v:{i},a:{i}" if plan.has_audio else f"v:{i}" for i in range(n))
+    args += [
+        "-preset",
+        plan.preset,
+        "-threads",
+        str(plan.threads),
+        "-g",
+        str(plan.gop),
+        "-keyint_min",
+        str(plan.gop),
+        "-sc_threshold",
+        "0",
+        *plan.extra_args,
+        "-hls_time",
+        str(plan.segment_seconds),
+        "-hls_playlist_type",
+        "vod",
+        # temp_file: segments are written as *.tmp and renamed when complete, so the
+        # pipelined uploader can treat every visible segment file as finished.
+        "-hls_flags",
+        "independent_segments+temp_file",
+        "-hls_segment_filename",
+        str(out_dir / "v%v" / "seg_%06d.ts"),
+        "-master_pl_name",
+        "master.m3u8",
+        "-var_stream_map",
+        stream_map,
+        str(out_dir / "v%v" / "prog_index.m3u8"),
+    ]
+    if plan.thumbnails:
+        # Further outputs of the same pass: the source is decoded only once.
+        args += _thumbnail_output_args(out_dir, plan.thumbnails)
+    return args
+
+
+def plan_transcode(input_arg: str, without_audio: bool = False) -> TranscodePlan:
+    """Probe the source (path or URL) and pick renditions/encoder settings for it."""
+    plan = build_plan(probe_source(input_arg))
+    if without_audio:
+        plan.has_audio = False
+    return plan
+
+
+class MissingAudioError(RuntimeError):
+    """ffmpeg found no audio stream for an audio map that was assumed, not probed."""
+
+
+# ffmpeg's error for a -map / -var_stream_map entry without a matching stream
+_MISSING_AUDIO_MARKERS = ("Stream map 'a:0' matches no streams", "Unable to map stream at a:0")
+
+
+def _raise_ffmpeg_failure(plan: TranscodePlan, stderr_tail: str) -> None:
+    if plan.has_audio and not plan.audio_probed and any(m in stderr_tail for m in _MISSING_AUDIO_MARKERS):
+        raise MissingAudioError(f"ffprobe failed and the source has no audio stream: {stderr_tail}")
+    raise RuntimeError(f"ffmpeg failed: {stderr_tail}")
+
+
+# ffmpeg HTTP input options: seekable range reads (moov atom at the end of the file)
+# and reconnects on dropped connections during long encodes.
+_HTTP_INPUT_ARGS = [
+    "-seekable",
+    "1",
+    "-reconnect",
+    "1",
+    "-reconnect_on_network_error",
+    "1",
+    "-reconnect_delay_max",
+    "10",
+]
+
+
+class _SegmentUploader:
+    """
+    Uploads finished HLS segments while ffmpeg is still encoding and deletes each
+    local file once it is in MinIO. Playlists are left for the final upload_folder().
+    """
+
+    def __init__(self, prefix: str, folder: Path, stats: UploadStats | None = None, poll_interval: float = 0.5):
+        self.prefix = prefix
+        self.folder = folder
+        self.stats = stats
+        self.poll_interval = poll_interval
+        self.error: BaseException | None = None
+        self._seen: set[Path] = set()
+        self._stop = threading.Event()
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(getattr(settings, "HLS_UPLOAD_CONCURRENCY", 8)),
+            thread_name_prefix="hls-upload",
+        )
+        self._futures = []
+        self._thread = threading.Thread(target=self._watch, name="hls-segment-watcher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _upload_one(self, path: Path) -> None:
+        rel = path.relative_to(self.folder).as_posix()
+        _upload_file(path, f"{self.prefix.rstrip('/')}/{rel}", self.stats)
+        path.unlink(missing_ok=True)
+
+    def _scan(self) -> None:
+        for path in sorted(self.folder.rglob("*.ts")):
+            if path in self._seen:
+                continue
+            self._seen.add(path)
+            self._futures.append(self._pool.submit(self._upload_one, path))
+        # Surface the first upload error early so the encode can be aborted.
+        for future in [f for f in self._futures if f.done()]:
+            self._futures.remove(future)
+            if future.exception() is not None and self.error is None:
+                self.error = future.exception()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            self._scan()
+
+    def finish(self) -> None:
+        """Stop watching, upload the remaining segments and wait for all uploads."""
+        self._stop.set()
+        self._thread.join()
+        self._scan()
+        for future in self._futures:
+            exc = future.exception()
+            if exc is not None and self.error is None:
+                self.error = exc
+        self._futures = []
+        self._pool.shutdown(wait=True)
+        if self.error is not None:
+            raise RuntimeError(f"Segment upload failed: {self.error}") from self.error
+
+    def abort(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _finish_thumbnails(out_dir: Path, output_prefix: str, plan: TranscodePlan) -> HlsOutput:
+    """Write the sprite WebVTT; keys of the poster/thumbnails that were actually rendered."""
+    output = HlsOutput(master_key=f"{output_prefix}/master.m3u8")
+    thumbs = plan.thumbnails
+    if thumbs is None:
+        return output
+    poster = out_dir / f"{POSTER_NAME}.{thumbs.poster_format}"
+    if poster.exists() and poster.stat().st_size:
+        output.poster_key = f"{output_prefix}/{poster.name}"
+    if write_thumbnails_vtt(out_dir, thumbs):
+        output.thumbnails_key = f"{output_prefix}/{THUMBNAILS_VTT}"
+    return output
+
+
+def _transcode_pipelined(
+    source_key: str, output_prefix: str, tmpdir: Path, stats: UploadStats | None, without_audio: bool = False
+) -> HlsOutput:
+    """
+    ffmpeg reads the source straight from MinIO (presigned URL, Range reads) and each
+    finished segment is uploaded concurrently while encoding continues.
+    """
+    out_dir = tmpdir / "out"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    source_url = presign_get(source_key, expires_in=60 * 60 * 24)
+    plan = plan_transcode(source_url, without_audio)
+    cmd = ["ffmpeg", "-y", "-nostdin", *_HTTP_INPUT_ARGS, "-i", source_url, *_ffmpeg_hls_args(out_dir, plan)]
+
+    uploader = _SegmentUploader(output_prefix, out_dir, stats)
+    uploader.start()
+    stderr_path = tmpdir / "ffmpeg.log"
+    try:
+        with stderr_path.open("wb") as stderr_file:
+            proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr_file)
+            while proc.poll() is None:
+                if uploader.error is not None:
+                    proc.kill()
+                    proc.wait()
+                    break
+                time.sleep(1)
+        if uploader.error is not None:
+            raise RuntimeError(f"Segment upload failed: {uploader.error}")
+        if proc.returncode != 0:
+            tail = stderr_path.read_bytes()[-2000:].decode("utf-8", errors="replace")
+            _raise_ffmpeg_failure(plan, tail)
+    except BaseException:
+        uploader.abort()
+        raise
+    uploader.finish()
+
+    output = _finish_thumbnails(out_dir, output_prefix, plan)
+    # Only playlists (and the poster/thumbnails) remain locally; playlists go last so a
+    # rendition is never playable before all of its segments exist.
+    upload_folder(output_prefix, out_dir, stats)
+    return output
+
+
+def _transcode_downloaded(
+    source_key: str, output_prefix: str, tmpdir: Path, stats: UploadStats | None, without_audio: bool = False
+) -> HlsOutput:
+    """Legacy mode: download the whole source, encode, then upload everything."""
+    input_path = tmpdir / "input.mp4"
+    download_object_to_file(source_key, input_path)
+
+    out_dir = tmpdir / "out"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # NOTE: This requires ffmpeg installed on the backend host.
+    plan = plan_transcode(str(input_path), without_audio)
+    cmd = ["ffmpeg", "-y", "-i", str(input_path), *_ffmpeg_hls_args(out_dir, plan)]
+
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        _raise_ffmpeg_failure(plan, proc.stderr[-2000:])
+
+    output = _finish_thumbnails(out_dir, output_prefix, plan)
+    upload_folder(output_prefix, out_dir, stats)
+    return output
+
+
+def transcode_mp4_to_hls(source_key: str, output_prefix: str, stats: UploadStats | None = None) -> HlsOutput:
     """
     Transcode MP4 in MinIO to multi-bitrate HLS and upload to MinIO.
-    Returns master playlist object key.
+    Returns the master playlist object key, plus the poster frame and the thumbnail
+    sprite WebVTT rendered in the same ffmpeg pass (HLS_THUMBNAILS).
+
+    With HLS_PIPELINED (default) ffmpeg streams the source from MinIO and segments are
+    uploaded while encoding; otherwise the source is downloaded to a temp dir first.
     """
     source_key = source_key.lstrip("/")
     output_prefix = output_prefix.lstrip("/").rstrip("/")
@@ -67,100 +507,16 @@ def transcode_mp4_to_hls(source_key: str, output_prefix: str) -> str:
             "Install ffmpeg and restart the backend."
         )
 
+    transcode = _transcode_pipelined if getattr(settings, "HLS_PIPELINED", True) else _transcode_downloaded
     tmpdir = Path(tempfile.mkdtemp(prefix="atg_hls_"))
     try:
-        input_path = tmpdir / "input.mp4"
-        download_object_to_file(source_key, input_path)
-
-        out_dir = tmpdir / "out"
-        out_dir.mkdir(parents=True, exist_ok=True)
-
-        # 3 renditions: 360p, 480p, 720p (fast + good enough for most)
-        # NOTE: This requires ffmpeg installed on the backend host.
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-i",
-            str(input_path),
-            "-filter_complex",
-            (
-                "[0:v]split=3[v360][v480][v720];"
-                "[v360]scale=w=640:h=360:force_original_aspect_ratio=decrease[v360out];"
-                "[v480]scale=w=854:h=480:force_original_aspect_ratio=decrease[v480out];"
-                "[v720]scale=w=1280:h=720:force_original_aspect_ratio=decrease[v720out]"
-            ),
-            "-map",
-            "[v360out]",
-            "-map",
-            "a:0?",
-            "-map",
-            "[v480out]",
-            "-map",
-            "a:0?",
-            "-map",
-            "[v720out]",
-            "-map",
-            "a:0?",
-            "-c:v:0",
-            "libx264",
-            "-b:v:0",
-            "800k",
-            "-maxrate:v:0",
-            "856k",
-            "-bufsize:v:0",
-            "1200k",
-            "-c:v:1",
-            "libx264",
-            "-b:v:1",
-            "1400k",
-            "-maxrate:v:1",
-            "1498k",
-            "-bufsize:v:1",
-            "2100k",
-            "-c:v:2",
-            "libx264",
-            "-b:v:2",
-            "2800k",
-            "-maxrate:v:2",
-            "2996k",
-            "-bufsize:v:2",
-            "4200k",
-            "-c:a",
-            "aac",
-            "-b:a",
-            "128k",
-            "-ac",
-            "2",
-            "-ar",
-            "48000",
-            "-preset",
-            "veryfast",
-            "-g",
-            "48",
-            "-sc_threshold",
-            "0",
-            "-hls_time",
-            "4",
-            "-hls_playlist_type",
-            "vod",
-            "-hls_flags",
-            "independent_segments",
-            "-hls_segment_filename",
-            str(out_dir / "v%v" / "seg_%06d.ts"),
-            "-master_pl_name",
-            "master.m3u8",
-            "-var_stream_map",
-            "v:0,a:0 v:1,a:1 v:2,a:2",
-            str(out_dir / "v%v" / "prog_index.m3u8"),
-        ]
-
-        proc = subprocess.run(cmd, capture_output=True, text=True)
-        if proc.returncode != 0:
-            raise RuntimeError(f"ffmpeg failed: {proc.stderr[-2000:]}")
-
-        upload_folder(output_prefix, out_dir)
-        return f"{output_prefix}/master.m3u8"
+        try:
+            return transcode(source_key, output_prefix, tmpdir, stats)
+        except MissingAudioError:
+            # ffprobe could not read the source, so audio was assumed; it is a silent video.
+            # ffmpeg stops at the stream mapping, before any segment is written.
+            shutil.rmtree(tmpdir, ignore_errors=True)
+            tmpdir.mkdir()
+            return transcode(source_key, output_prefix, tmpdir, stats, without_audio=True)
     finally:
         shutil.rmtree(tmpdir, ignore_errors=True)
-
-
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import shutil
+import subprocess
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from django.conf import settings
+
+# Adaptive HLS rendition ladder.
+# ffprobe the source once, then pick renditions (never above the source height),
+# bitrates, GOP and segment length from its resolution/frame rate/duration, and the
+# encoder from the configured profile (HLS_ENCODER_PROFILE in settings).
+# The same pass also renders a poster frame and thumbnail sprite sheets (HLS_THUMBNAILS).
+
+DEFAULT_RENDITIONS = [
+    {"height": 360, "video_kbps": 800},
+    {"height": 480, "video_kbps": 1400},
+    {"height": 720, "video_kbps": 2800},
+]
+
+DEFAULT_PROFILES = {
+    # Current behaviour: fastest x264 preset.
+    "fast": {"codec": "libx264", "preset": "veryfast", "bitrate_factor": 1.0},
+    "balanced": {"codec": "libx264", "preset": "faster", "bitrate_factor": 0.9},
+    "quality": {"codec": "libx264", "preset": "medium", "bitrate_factor": 0.85},
+    # Hardware encoders; fall back to "fast" when ffmpeg was built without them.
+    "nvenc": {"codec": "h264_nvenc", "preset": "p4", "bitrate_factor": 1.1, "fallback": "fast"},
+    "qsv": {"codec": "h264_qsv", "preset": "faster", "bitrate_factor": 1.1, "fallback": "fast"},
+}
+
+
+@dataclass
+class SourceInfo:
+    width: int = 0
+    height: int = 0
+    fps: float = 0.0
+    duration: float = 0.0
+    has_audio: bool = True
+    # False when ffprobe is missing or failed: has_audio is then a guess.
+    probed: bool = False
+
+
+@dataclass
+class Rendition:
+    height: int
+    video_kbps: int
+
+    @property
+    def maxrate_kbps(self) -> int:
+        return int(self.video_kbps * 1.07)
+
+    @property
+    def bufsize_kbps(self) -> int:
+        return int(self.video_kbps * 1.5)
+
+
+@dataclass
+class ThumbnailPlan:
+    """Poster frame and seek-preview sprite sheets, produced in the same ffmpeg pass."""
+
+    poster_at: float
+    poster_format: str  # "jpg" | "webp"
+    poster_width: int
+    # Sprite: one tile_width x tile_height thumbnail every `interval` seconds,
+    # columns x rows per sheet; interval 0 = no sprite (unknown geometry/duration).
+    interval: float = 0.0
+    tile_width: int = 0
+    tile_height: int = 0
+    columns: int = 10
+    rows: int = 10
+    duration: float = 0.0
+
+
+@dataclass
+class TranscodePlan:
+    renditions: list[Rendition]
+    has_audio: bool
+    codec: str
+    preset: str
+    gop: int
+    segment_seconds: int
+    threads: int
+    audio_kbps: int = 128
+    extra_args: list[str] = field(default_factory=list)
+    thumbnails: ThumbnailPlan | None = None
+    # has_audio came from ffprobe (False: assumed, see transcode_mp4_to_hls)
+    audio_probed: bool = True
+
+
+def is_ffprobe_available() -> bool:
+    return shutil.which("ffprobe") is not None
+
+
+def _parse_rate(rate: str | None) -> float:
+    if not rate or rate in ("0/0", "0"):
+        return 0.0
+    if "/" in rate:
+        num, den = rate.split("/", 1)
+        try:
+            return float(num) / float(den) if float(den) else 0.0
+        except ValueError:
+            return 0.0
+    try:
+        return float(rate)
+    except ValueError:
+        return 0.0
+
+
+def probe_source(input_arg: str) -> SourceInfo:
+    """ffprobe a local path or (presigned) URL. Returns an empty SourceInfo if probing fails."""
+    if not is_ffprobe_available():
+        return SourceInfo()
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-print_format",
+        "json",
+        "-show_streams",
+        "-show_format",
+        input_arg,
+    ]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+        data = json.loads(proc.stdout or "{}") if proc.returncode == 0 else {}
+    except (subprocess.TimeoutExpired, ValueError, OSError):
+        data = {}
+
+    info = SourceInfo(has_audio=False)
+    for stream in data.get("streams") or []:
+        if stream.get("codec_type") == "video" and not info.height:
+            info.width = int(stream.get("width") or 0)
+            info.height = int(stream.get("height") or 0)
+            info.fps = _parse_rate(stream.get("avg_frame_rate")) or _parse_rate(stream.get("r_frame_rate"))
+            # Portrait videos: the ladder is keyed on the short side.
+            rotation = str((stream.get("tags") or {}).get("rotate") or "")
+            if rotation in ("90", "270", "-90"):
+                info.width, info.height = info.height, info.width
+        elif stream.get("codec_type") == "audio":
+            info.has_audio = True
+    try:
+        info.duration = float((data.get("format") or {}).get("duration") or 0)
+    except ValueError:
+        info.duration = 0.0
+    if not data:
+        # Unknown source: keep the historical defaults (all renditions, audio mapped). The audio
+        # map is mandatory, so transcode_mp4_to_hls re-encodes without audio if there is none.
+        info.has_audio = True
+    info.probed = bool(data)
+    return info
+
+
+@lru_cache(maxsize=1)
+def _available_encoders() -> frozenset[str]:
+    try:
+        proc = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return frozenset()
+    names = set()
+    for line in proc.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].startswith("V"):
+            names.add(parts[1])
+    return frozenset(names)
+
+
+def resolve_profile(name: str | None = None) -> dict:
+    profiles = getattr(settings, "HLS_ENCODER_PROFILES", None) or DEFAULT_PROFILES
+    name = name or getattr(settings, "HLS_ENCODER_PROFILE", "fast")
+    seen = set()
+    while name in profiles and name not in seen:
+        seen.add(name)
+        profile = profiles[name]
+        codec = profile.get("codec", "libx264")
+        if codec == "libx264" or codec in _available_encoders() or not profile.get("fallback"):
+            return profile
+        name = profile["fallback"]
+    return DEFAULT_PROFILES["fast"]
+
+
+def _encoder_threads() -> int:
+    configured = int(getattr(settings, "HLS_FFMPEG_THREADS", 0) or 0)
+    if configured > 0:
+        return configured
+    # Share the host between the jobs this worker runs in parallel.
+    parallel_jobs = max(1, int(getattr(settings, "TRANSCODE_WORKER_CONCURRENCY", 1)))
+    return max(1, (os.cpu_count() or 1) // parallel_jobs)
+
+
+def build_thumbnail_plan(info: SourceInfo) -> ThumbnailPlan | None:
+    if not getattr(settings, "HLS_THUMBNAILS", True):
+        return None
+    poster_format = str(getattr(settings, "HLS_POSTER_FORMAT", "jpg")).lower()
+    if poster_format not in ("jpg", "webp"):
+        poster_format = "jpg"
+    # A few seconds in: the very first frame is often black or a fade-in.
+    poster_at = min(3.0, info.duration / 3) if info.duration else 0.0
+    plan = ThumbnailPlan(
+        poster_at=round(poster_at, 3),
+        poster_format=poster_format,
+        poster_width=int(getattr(settings, "HLS_POSTER_WIDTH", 1280)),
+    )
+    if not (info.width and info.height and info.duration):
+        return plan
+
+    # Long videos: widen the interval so the sprite stays at HLS_THUMBNAIL_MAX_TILES.
+    max_tiles = max(1, int(getattr(settings, "HLS_THUMBNAIL_MAX_TILES", 300)))
+    interval = max(float(getattr(settings, "HLS_THUMBNAIL_INTERVAL_SEC", 10)), info.duration / max_tiles)
+    tile_width = int(getattr(settings, "HLS_THUMBNAIL_WIDTH", 160))
+    tile_height = int(round(tile_width * info.height / info.width))
+    plan.interval = float(math.ceil(interval))
+    plan.tile_width = tile_width
+    plan.tile_height = max(2, tile_height - tile_height % 2)
+    plan.duration = info.duration
+    return plan
+
+
+def build_plan(info: SourceInfo, profile_name: str | None = None) -> TranscodePlan:
+    profile = resolve_profile(profile_name)
+    ladder = [
+        Rendition(int(r["height"]), int(r["video_kbps"]))
+        for r in (getattr(settings, "HLS_RENDITIONS", None) or DEFAULT_RENDITIONS)
+    ]
+    ladder.sort(key=lambda r: r.height)
+
+    if info.height:
+        renditions = [r for r in ladder if r.height <= info.height]
+        if not renditions:
+            # Source below the smallest rung: one rendition at source height, bitrate scaled by area.
+            smallest = ladder[0]
+            scale = (info.height / smallest.height) ** 2
+            even_height = max(2, info.height - info.height % 2)
+            renditions = [Rendition(even_height, max(200, int(smallest.video_kbps * scale)))]
+    else:
+        renditions = ladder
+
+    # High frame rate sources need more bits for the same quality.
+    fps = info.fps if 0 < info.fps <= 120 else 0.0
+    fps_factor = 1.5 if fps > 40 else 1.0
+    factor = float(profile.get("bitrate_factor", 1.0)) * fps_factor
+    renditions = [Rendition(r.height, int(r.video_kbps * factor)) for r in renditions]
+
+    # Long recordings: longer segments = fewer objects/requests, same playback.
+    segment_seconds = 6 if info.duration >= 30 * 60 else 4
+    # 2-second GOP divides both segment lengths, so every segment starts on a keyframe.
+    gop = int(round((fps or 24) * 2))
+
+    return TranscodePlan(
+        renditions=renditions,
+        has_audio=info.has_audio,
+        audio_probed=info.probed,
+        codec=profile.get("codec", "libx264"),
+        preset=profile.get("preset", "veryfast"),
+        gop=gop,
+        segment_seconds=segment_seconds,
+        threads=_encoder_threads(),
+        audio_kbps=int(profile.get("audio_kbps", 128)),
+        extra_args=list(profile.get("extra_args", [])),
+        thumbnails=build_thumbnail_plan(info),
+    )
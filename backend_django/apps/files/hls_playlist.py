@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import logging
+import posixpath
+import re
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from apps.files import presign_cache, segment_cache
+from apps.files.minio_client import presign_many
+from apps.files.streaming import get_object_meta, open_object
+
+logger = logging.getLogger(__name__)
+
+# Signed-segment HLS playlists.
+#
+# Segments referenced by a media playlist (v0/prog_index.m3u8, ...) are rewritten from
+# relative names to presigned MinIO URLs under HLS_SEGMENT_URL_PREFIX (default
+# /api/minio, the nginx/vite proxy that keeps Host = MinIO's signed host). The player
+# then fetches segments without going through Django; only playlists do.
+# Master playlists are left relative, so variant playlists still come through here.
+#
+# The rewritten text is cached (presign_cache tiers) per playlist ETag and signing
+# window: every request in a window gets identical bytes with identical segment URLs,
+# which keeps browser/CDN caches of the segments warm.
+#
+# Signed segments and the disk cache (HLS_DISK_CACHE_DIR, segment_cache.py) exclude each
+# other: with presigned URLs segments never reach Django, so the cache would only ever
+# hold playlists. When the disk cache is enabled it wins, playlists are served unchanged
+# and segments go through HlsObjectView and the cache.
+
+_URI_ATTR_RE = re.compile(r'URI="([^"]+)"')
+
+
+_conflict_logged = False
+
+
+def signed_segments_enabled() -> bool:
+    global _conflict_logged
+    if not getattr(settings, "HLS_SIGNED_SEGMENTS", True):
+        return False
+    if segment_cache.segment_cache_enabled():
+        if not _conflict_logged:
+            logger.warning(
+                "[hls] HLS_SIGNED_SEGMENTS is ignored while HLS_DISK_CACHE_DIR is set: segments are "
+                "served through the disk cache. Set HLS_SIGNED_SEGMENTS=false to silence this."
+            )
+            _conflict_logged = True
+        return False
+    return True
+
+
+def _is_relative(uri: str) -> bool:
+    return bool(uri) and "://" not in uri and not uri.startswith("/")
+
+
+def _resolve(playlist_key: str, uri: str) -> str:
+    return posixpath.normpath(posixpath.join(posixpath.dirname(playlist_key), uri.split("?", 1)[0]))
+
+
+def is_media_playlist(text: str) -> bool:
+    return "#EXTINF" in text
+
+
+def _browser_url(presigned: str) -> str:
+    prefix = str(getattr(settings, "HLS_SEGMENT_URL_PREFIX", "/api/minio")).rstrip("/")
+    if not prefix:
+        return presigned
+    url = urlsplit(presigned)
+    return f"{prefix}{url.path}?{url.query}"
+
+
+def rewrite_media_playlist(text: str, playlist_key: str, expires_in: int) -> str:
+    """Replace relative segment (and EXT-X-MAP) URIs with presigned URLs, signed in one batch."""
+    lines = text.splitlines()
+    keys: dict[str, str] = {}
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("#EXT-X-MAP"):
+            for uri in _URI_ATTR_RE.findall(stripped):
+                if _is_relative(uri):
+                    keys[uri] = _resolve(playlist_key, uri)
+        elif stripped and not stripped.startswith("#") and _is_relative(stripped):
+            keys[stripped] = _resolve(playlist_key, stripped)
+    if not keys:
+        return text
+
+    signed = presign_many(set(keys.values()), expires_in=expires_in)
+    urls = {uri: _browser_url(signed[key]) for uri, key in keys.items() if key in signed}
+
+    out = []
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith("#EXT-X-MAP"):
+            out.append(_URI_ATTR_RE.sub(lambda m: f'URI="{urls.get(m.group(1), m.group(1))}"', line))
+        elif stripped in urls:
+            out.append(urls[stripped])
+        else:
+            out.append(line)
+    return "\n".join(out) + "\n"
+
+
+def signed_playlist(key: str) -> tuple[str, int] | None:
+    """
+    (rewritten playlist text, seconds it may be cached) for a media playlist, or None
+    for master playlists and anything that should be proxied unchanged.
+    Raises botocore ClientError like the other streaming helpers.
+    """
+    expires_in = int(getattr(settings, "HLS_SEGMENT_URL_EXPIRES", 6 * 60 * 60))
+    window = presign_cache.window_for(expires_in)
+    meta = get_object_meta(key)
+
+    now = time.time()
+    if window:
+        signed_at = presign_cache.signing_time(window, now)
+        evict_at = signed_at + window
+        cache_key = presign_cache.cache_key(f"hls-playlist|{meta.etag}", key, None, expires_in, signed_at)
+        cached = presign_cache.get_many([cache_key], now, evict_at).get(cache_key)
+        if cached is not None:
+            return (cached, int(evict_at - now)) if cached else None
+
+    opened = open_object(key)
+    body = b"".join(opened.iter_body())
+    text = body.decode("utf-8")
+    rewritten = rewrite_media_playlist(text, key, expires_in) if is_media_playlist(text) else ""
+    if not window:
+        return (rewritten, 0) if rewritten else None
+    # "" marks a master playlist, so the next request skips the download as well.
+    presign_cache.set_many({cache_key: rewritten}, evict_at, now)
+    return (rewritten, int(evict_at - now)) if rewritten else None
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import socket
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.files.hls import UploadStats, transcode_mp4_to_hls
+from apps.files.models import VideoTranscodeJob
+
+logger = logging.getLogger(__name__)
+
+# Persistent transcode job queue on top of video_transcode_jobs.
+#
+#   queued --claim--> processing --ok--> done
+#                         |  \--error--> queued again after a backoff (retry_after), or
+#                         |              failed once max_attempts is reached
+#                         \--no heartbeat for TRANSCODE_STALE_AFTER_SEC--> queued (or failed
+#                            once max_attempts is reached)
+#
+# Jobs are created by TranscodeHlsView and executed by `manage.py run_transcode_worker`,
+# never inside gunicorn. Any number of worker processes can run: claiming uses
+# SELECT ... FOR UPDATE SKIP LOCKED, so each queued row is taken by exactly one worker.
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def output_prefix_for(job: VideoTranscodeJob) -> str:
+    # Stable per job; HLS playlists reference segments relatively.
+    return f"videos/hls/{job.target_type}/{job.target_id}/{job.id}"
+
+
+_OUTPUT_KEY_RE = re.compile(r"^videos/hls/[^/]+/[^/]+/(\d+)/")
+# Job ids whose output is final. "done" is terminal (a re-transcode creates a new job and
+# a new prefix), so ids are only ever added.
+_done_job_ids: set[int] = set()
+
+
+def is_final_output_key(key: str) -> bool:
+    """True for playlists/segments under the prefix of a finished job (immutable content)."""
+    m = _OUTPUT_KEY_RE.match(key)
+    if not m:
+        return False
+    job_id = int(m.group(1))
+    if job_id in _done_job_ids:
+        return True
+    try:
+        done = VideoTranscodeJob.objects.filter(id=job_id, status="done").exists()
+    except DatabaseError:
+        return False
+    if done:
+        _done_job_ids.add(job_id)
+    return done
+
+
+def finished_job_for(source_key: str) -> VideoTranscodeJob | None:
+    """Latest finished transcode of a source object (its HLS output is immutable)."""
+    try:
+        return (
+            VideoTranscodeJob.objects.filter(source_object_key=source_key.lstrip("/"), status="done")
+            .exclude(master_object_key__isnull=True)
+            .order_by("-id")
+            .first()
+        )
+    except DatabaseError as e:
+        logger.warning(f"[transcode] Lookup of finished jobs for {source_key} failed: {e}")
+        return None
+
+
+def enqueue_transcode(
+    target_type: str, target_id: int, station_id: int | None, source_key: str
+) -> VideoTranscodeJob:
+    source_key = str(source_key).lstrip("/")
+    # The same source (e.g. a deduplicated upload, apps/files/dedup.py) was already
+    # transcoded: reuse its immutable HLS output instead of running ffmpeg again.
+    previous = finished_job_for(source_key)
+    if previous is not None:
+        now = timezone.now()
+        job = VideoTranscodeJob.objects.create(
+            target_type=str(target_type),
+            target_id=target_id,
+            station_id=station_id,
+            source_object_key=source_key,
+            master_object_key=previous.master_object_key,
+            poster_object_key=previous.poster_object_key,
+            thumbnails_object_key=previous.thumbnails_object_key,
+            status="done",
+            max_attempts=0,
+            started_at=now,
+            finished_at=now,
+        )
+        _apply_result(job, previous.master_object_key)
+        logger.info(f"[transcode] Job {job.id} reuses the output of job {previous.id} for {source_key}")
+        return job
+    return VideoTranscodeJob.objects.create(
+        target_type=str(target_type),
+        target_id=target_id,
+        station_id=station_id,
+        source_object_key=source_key,
+        status="queued",
+        max_attempts=int(getattr(settings, "TRANSCODE_MAX_ATTEMPTS", 3)),
+    )
+
+
+def claim_next_job(worker_id: str) -> VideoTranscodeJob | None:
+    """Atomically move the oldest queued job to processing and return it (or None)."""
+    with transaction.atomic():
+        job = (
+            VideoTranscodeJob.objects.select_for_update(skip_locked=True)
+            .filter(status="queued")
+            .filter(Q(retry_after__isnull=True) | Q(retry_after__lte=timezone.now()))
+            .order_by("id")
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        job.status = "processing"
+        job.worker_id = worker_id
+        job.attempts = (job.attempts or 0) + 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.error = None
+        job.retry_after = None
+        job.save(
+            update_fields=[
+                "status", "worker_id", "attempts", "started_at", "heartbeat_at", "error", "retry_after", "updated_at"
+            ]
+        )
+        return job
+
+
+def heartbeat(job_id: int, worker_id: str) -> bool:
+    """Refresh the job's heartbeat; False if the job is no longer owned by this worker."""
+    now = timezone.now()
+    updated = VideoTranscodeJob.objects.filter(id=job_id, worker_id=worker_id, status="processing").update(
+        heartbeat_at=now, updated_at=now
+    )
+    return updated == 1
+
+
+def requeue_stalled(stale_after_sec: int | None = None) -> int:
+    """
+    Return processing jobs whose worker stopped sending heartbeats (crash, restart, OOM)
+    to the queue, or fail them once max_attempts is used up. Returns affected row count.
+    """
+    if stale_after_sec is None:
+        stale_after_sec = int(getattr(settings, "TRANSCODE_STALE_AFTER_SEC", 120))
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=stale_after_sec)
+    stalled = VideoTranscodeJob.objects.filter(status="processing").filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, updated_at__lt=cutoff)
+    )
+    with transaction.atomic():
+        jobs = list(stalled.select_for_update(skip_locked=True).values("id", "attempts", "max_attempts", "worker_id"))
+        affected = 0
+        for job in jobs:
+            if job["attempts"] >= job["max_attempts"]:
+                affected += VideoTranscodeJob.objects.filter(id=job["id"], status="processing").update(
+                    status="failed",
+                    error=f"Worker {job['worker_id']} stopped responding; gave up after {job['attempts']} attempts",
+                    worker_id=None,
+                    finished_at=now,
+                    updated_at=now,
+                )
+            else:
+                affected += VideoTranscodeJob.objects.filter(id=job["id"], status="processing").update(
+                    status="queued", worker_id=None, heartbeat_at=None, updated_at=now
+                )
+                logger.warning(f"[transcode] Re-queued stalled job {job['id']} (worker {job['worker_id']})")
+    return affected
+
+
+def _apply_result(job: VideoTranscodeJob, master_key: str) -> None:
+    """Point the target DB record at the HLS master playlist."""
+    if job.target_type == "promo_video" and job.station_id:
+        from apps.stations.models import StationPromoVideo
+
+        StationPromoVideo.objects.filter(station_id=job.station_id, is_active=True).update(object_key=master_key)
+    elif job.target_type == "topic_file":
+        # course_program_topic_files has no ORM model (see apps/stations/views.py)
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                update course_program_topic_files
+                set object_key = %s, mime_type = 'application/vnd.apple.mpegurl', updated_at = CURRENT_TIMESTAMP
+                where id = %s
+                """,
+                [master_key, job.target_id],
+            )
+
+
+def _upload_stats_fields(stats: UploadStats) -> dict:
+    return {
+        "upload_bytes": stats.bytes,
+        "upload_files": stats.files,
+        "upload_seconds": round(stats.seconds, 3),
+        "upload_retries": stats.retries,
+    }
+
+
+def run_job(job: VideoTranscodeJob, worker_id: str) -> None:
+    """Execute a claimed job, sending heartbeats from a side thread while ffmpeg runs."""
+    interval = float(getattr(settings, "TRANSCODE_HEARTBEAT_SEC", 15))
+    stop = threading.Event()
+
+    def _beat():
+        try:
+            while not stop.wait(interval):
+                if not heartbeat(job.id, worker_id):
+                    logger.warning(f"[transcode] Lost ownership of job {job.id}")
+                    return
+        finally:
+            # Thread-local DB connection of this helper thread.
+            connection.close()
+
+    beater = threading.Thread(target=_beat, name=f"transcode-heartbeat-{job.id}", daemon=True)
+    beater.start()
+    stats = UploadStats()
+    try:
+        output = transcode_mp4_to_hls(job.source_object_key, output_prefix_for(job), stats)
+        _apply_result(job, output.master_key)
+        now = timezone.now()
+        VideoTranscodeJob.objects.filter(id=job.id, worker_id=worker_id).update(
+            status="done",
+            master_object_key=output.master_key,
+            poster_object_key=output.poster_key,
+            thumbnails_object_key=output.thumbnails_key,
+            error=None,
+            finished_at=now,
+            updated_at=now,
+            **_upload_stats_fields(stats),
+        )
+        logger.info(
+            f"[transcode] Job {job.id} uploaded {stats.files} files, {stats.bytes / 1e6:.1f} MB "
+            f"in {stats.seconds:.1f}s ({stats.retries} retries)"
+        )
+    except Exception as e:
+        now = timezone.now()
+        jobs = VideoTranscodeJob.objects.filter(id=job.id, worker_id=worker_id)
+        if job.attempts < job.max_attempts:
+            # Transient MinIO/network errors are common during long uploads: try again later.
+            # The output prefix is per job, so a retry simply overwrites partial output.
+            backoff = int(getattr(settings, "TRANSCODE_RETRY_BACKOFF_SEC", 30)) * 2 ** max(0, job.attempts - 1)
+            jobs.update(
+                status="queued",
+                error=str(e)[:4000],
+                worker_id=None,
+                heartbeat_at=None,
+                retry_after=now + timedelta(seconds=backoff),
+                updated_at=now,
+                **_upload_stats_fields(stats),
+            )
+            logger.exception(
+                f"[transcode] Job {job.id} attempt {job.attempts}/{job.max_attempts} failed; retrying in {backoff}s"
+            )
+        else:
+            jobs.update(
+                status="failed",
+                error=str(e)[:4000],
+                finished_at=now,
+                updated_at=now,
+                **_upload_stats_fields(stats),
+            )
+            logger.exception(f"[transcode] Job {job.id} failed after {job.attempts} attempts")
+    finally:
+        stop.set()
+        beater.join(timeout=5)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from apps.files.bench import StubS3Server, summarize_ms
+from apps.files.minio_client import new_s3_client, reset_s3_client, s3_client
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark: per-request head_object latency with a client built per call "
+        "(old behaviour) vs. the pooled process-wide client."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=4, help="Concurrent request threads.")
+        parser.add_argument("--key", default="bench/object.bin")
+        parser.add_argument(
+            "--real",
+            action="store_true",
+            help="Use the configured MINIO_ENDPOINT instead of the local in-process MinIO stand-in.",
+        )
+
+    def handle(self, *args, **options):
+        if options["real"]:
+            self._run(options)
+            return
+        with StubS3Server() as stub:
+            self.stdout.write(f"Using local MinIO stand-in at {stub.endpoint}")
+            with override_settings(MINIO_ENDPOINT=stub.endpoint):
+                reset_s3_client()
+                try:
+                    self._run(options)
+                finally:
+                    reset_s3_client()
+
+    def _run(self, options):
+        iterations = options["iterations"]
+        threads = options["threads"]
+        key = options["key"]
+
+        def per_call() -> float:
+            t0 = time.perf_counter()
+            new_s3_client().head_object(Bucket=settings.MINIO_BUCKET, Key=key)
+            return time.perf_counter() - t0
+
+        def pooled() -> float:
+            t0 = time.perf_counter()
+            s3_client().head_object(Bucket=settings.MINIO_BUCKET, Key=key)
+            return time.perf_counter() - t0
+
+        # Warm up imports / endpoint data so the first sample is not an outlier.
+        pooled()
+
+        for label, fn in (("per-call client", per_call), ("pooled client", pooled)):
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                started = time.perf_counter()
+                samples = list(pool.map(lambda _i: fn(), range(iterations)))
+                wall = time.perf_counter() - started
+            stats = summarize_ms(samples)
+            self.stdout.write(
+                f"{label:16s} n={stats['n']} mean={stats['mean']:.2f}ms p50={stats['p50']:.2f}ms "
+                f"p95={stats['p95']:.2f}ms max={stats['max']:.2f}ms throughput={iterations / wall:.0f} req/s"
+            )
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from apps.files.bench import StubS3Server, summarize_ms
+from apps.files.minio_client import reset_s3_client, s3_client
+from apps.files.streaming import clear_object_meta_cache, open_object
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark: latency of a proxied Range request (HLS segment / video chunk) "
+        "with head_object + get_object (old behaviour) vs. the single get_object streaming core."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=400)
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent players.")
+        parser.add_argument("--chunk-kb", type=int, default=256, help="Bytes requested per Range request (KB).")
+        parser.add_argument("--latency-ms", type=float, default=5.0, help="Simulated MinIO round-trip (stub only).")
+        parser.add_argument("--key", default="bench/object.bin")
+        parser.add_argument(
+            "--real",
+            action="store_true",
+            help="Use the configured MINIO_ENDPOINT instead of the local in-process MinIO stand-in.",
+        )
+
+    def handle(self, *args, **options):
+        if options["real"]:
+            self._run(options)
+            return
+        with StubS3Server(payload_size=16 * 1024 * 1024, latency=options["latency_ms"] / 1000) as stub:
+            self.stdout.write(f"Using local MinIO stand-in at {stub.endpoint} (+{options['latency_ms']}ms per request)")
+            with override_settings(MINIO_ENDPOINT=stub.endpoint):
+                reset_s3_client()
+                try:
+                    self._run(options)
+                finally:
+                    reset_s3_client()
+
+    def _run(self, options):
+        iterations = options["iterations"]
+        key = options["key"]
+        chunk = options["chunk_kb"] * 1024
+        size = s3_client().head_object(Bucket=settings.MINIO_BUCKET, Key=key)["ContentLength"]
+
+        def range_for(i: int) -> str:
+            start = (i * chunk) % max(1, size - chunk)
+            return f"bytes={start}-{start + chunk - 1}"
+
+        def head_then_get(i: int) -> float:
+            t0 = time.perf_counter()
+            client = s3_client()
+            client.head_object(Bucket=settings.MINIO_BUCKET, Key=key)
+            obj = client.get_object(Bucket=settings.MINIO_BUCKET, Key=key, Range=range_for(i))
+            obj["Body"].read()
+            return time.perf_counter() - t0
+
+        def single_get(i: int) -> float:
+            t0 = time.perf_counter()
+            open_object(key, range_for(i)).body.read()
+            return time.perf_counter() - t0
+
+        clear_object_meta_cache()
+        for label, fn in (("head + get", head_then_get), ("single get", single_get)):
+            with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+                started = time.perf_counter()
+                samples = list(pool.map(fn, range(iterations)))
+                wall = time.perf_counter() - started
+            stats = summarize_ms(samples)
+            self.stdout.write(
+                f"{label:12s} n={stats['n']} mean={stats['mean']:.2f}ms p50={stats['p50']:.2f}ms "
+                f"p95={stats['p95']:.2f}ms max={stats['max']:.2f}ms throughput={iterations / wall:.0f} req/s"
+            )
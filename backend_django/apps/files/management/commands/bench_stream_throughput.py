@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.http import StreamingHttpResponse
+from django.test.utils import override_settings
+
+from apps.files.bench import StubS3Server
+from apps.files.minio_client import reset_s3_client, s3_client
+from apps.files.streaming import ObjectBodyIterator
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark: single-worker proxy throughput (MB/s) for full-file and Range downloads, "
+        "iterating the botocore StreamingBody directly (old behaviour) vs. ObjectBodyIterator."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=int, default=64, help="Object size (stub only).")
+        parser.add_argument("--range-mb", type=int, default=4, help="Bytes per Range request.")
+        parser.add_argument("--rounds", type=int, default=5)
+        parser.add_argument("--chunk-kb", type=int, default=0, help="Iterator chunk size; 0 = MINIO_STREAM_CHUNK_SIZE.")
+        parser.add_argument("--key", default="bench/object.bin")
+        parser.add_argument(
+            "--real",
+            action="store_true",
+            help="Use the configured MINIO_ENDPOINT instead of the local in-process MinIO stand-in.",
+        )
+
+    def handle(self, *args, **options):
+        if options["real"]:
+            self._run(options)
+            return
+        with StubS3Server(payload_size=options["size_mb"] * 1024 * 1024) as stub:
+            self.stdout.write(f"Using local MinIO stand-in at {stub.endpoint}")
+            with override_settings(MINIO_ENDPOINT=stub.endpoint):
+                reset_s3_client()
+                try:
+                    self._run(options)
+                finally:
+                    reset_s3_client()
+
+    def _run(self, options):
+        key = options["key"]
+        client = s3_client()
+        size = client.head_object(Bucket=settings.MINIO_BUCKET, Key=key)["ContentLength"]
+        range_bytes = min(size, options["range_mb"] * 1024 * 1024)
+        chunk_size = options["chunk_kb"] * 1024 or None
+
+        def drain(response: StreamingHttpResponse) -> int:
+            # What the WSGI server does: iterate streaming_content, then close().
+            total = 0
+            for chunk in response:
+                total += len(chunk)
+            response.close()
+            return total
+
+        def plain(obj) -> StreamingHttpResponse:
+            return StreamingHttpResponse(obj["Body"])
+
+        def tuned(obj) -> StreamingHttpResponse:
+            return StreamingHttpResponse(ObjectBodyIterator(obj["Body"], obj["ContentLength"], chunk_size))
+
+        for mode, extra, expected in (
+            ("full file", {}, size),
+            (f"range {range_bytes // (1024 * 1024)}MB", {"Range": f"bytes=0-{range_bytes - 1}"}, range_bytes),
+        ):
+            for label, wrap in (("StreamingBody", plain), ("ObjectBodyIterator", tuned)):
+                total = 0
+                started = time.perf_counter()
+                for _ in range(options["rounds"]):
+                    obj = client.get_object(Bucket=settings.MINIO_BUCKET, Key=key, **extra)
+                    received = drain(wrap(obj))
+                    if received != expected:
+                        raise SystemExit(f"{label}: received {received} bytes, expected {expected}")
+                    total += received
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{mode:12s} {label:18s} {total / elapsed / 1e6:8.1f} MB/s")
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+
+import httpx
+from django.core.management.base import BaseCommand
+
+from apps.files.bench import summarize_ms
+from apps.files.minio_client import presign_get
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test: N concurrent viewers issuing sequential Range requests (like a video player) "
+        "against the video/HLS proxy, e.g. the uvicorn backend-stream service in front of a local MinIO. "
+        "Reports requests/s, MB/s, time to first byte and errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("key", help="Object key to read (must exist in MINIO_BUCKET).")
+        parser.add_argument("--base-url", default="http://127.0.0.1:8000/files/video/")
+        parser.add_argument(
+            "--direct",
+            action="store_true",
+            help="Read straight from MinIO with a presigned URL (baseline without Django).",
+        )
+        parser.add_argument("--concurrency", type=int, default=200, help="Concurrent readers.")
+        parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run.")
+        parser.add_argument("--chunk-kb", type=int, default=1024, help="Bytes per Range request (KB).")
+        parser.add_argument("--header", action="append", default=[], help="Extra request header 'Name: value'.")
+
+    def handle(self, *args, **options):
+        asyncio.run(self._run(options))
+
+    async def _run(self, options):
+        key = options["key"].lstrip("/")
+        url = presign_get(key, expires_in=3600) if options["direct"] else options["base_url"] + key
+        headers = dict(h.split(":", 1) for h in options["header"])
+        headers = {k.strip(): v.strip() for k, v in headers.items()}
+        chunk = options["chunk_kb"] * 1024
+        concurrency = options["concurrency"]
+
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            probe = await client.get(url, headers={**headers, "Range": "bytes=0-0"})
+            if probe.status_code not in (200, 206):
+                raise SystemExit(f"Probe failed: HTTP {probe.status_code} {probe.text[:200]}")
+            content_range = probe.headers.get("Content-Range") or ""
+            size = int(content_range.rsplit("/", 1)[-1]) if "/" in content_range else len(probe.content)
+            self.stdout.write(f"Target {url[:120]} ({size / 1e6:.1f} MB), {concurrency} readers, {options['duration']}s")
+
+            ttfb: list[float] = []
+            totals = {"requests": 0, "bytes": 0, "errors": 0}
+            deadline = time.monotonic() + options["duration"]
+
+            async def reader():
+                # Each viewer starts at a random position and plays forward, wrapping around.
+                pos = random.randrange(0, max(1, size - chunk)) if size > chunk else 0
+                while time.monotonic() < deadline:
+                    end = min(pos + chunk, size) - 1
+                    started = time.perf_counter()
+                    try:
+                        async with client.stream("GET", url, headers={**headers, "Range": f"bytes={pos}-{end}"}) as r:
+                            first = True
+                            received = 0
+                            async for data in r.aiter_raw():
+                                if first:
+                                    ttfb.append(time.perf_counter() - started)
+                                    first = False
+                                received += len(data)
+                            if r.status_code != 206 or received != end - pos + 1:
+                                totals["errors"] += 1
+                            totals["requests"] += 1
+                            totals["bytes"] += received
+                    except httpx.HTTPError:
+                        totals["errors"] += 1
+                    pos = end + 1 if end + 1 < size else 0
+
+            started = time.monotonic()
+            await asyncio.gather(*(reader() for _ in range(concurrency)))
+            wall = time.monotonic() - started
+
+        stats = summarize_ms(ttfb)
+        self.stdout.write(
+            f"requests={totals['requests']} ({totals['requests'] / wall:.0f}/s) "
+            f"throughput={totals['bytes'] / wall / 1e6:.1f} MB/s errors={totals['errors']}"
+        )
+        self.stdout.write(
+            f"TTFB mean={stats['mean']:.1f}ms p50={stats['p50']:.1f}ms p95={stats['p95']:.1f}ms max={stats['max']:.1f}ms"
+        )
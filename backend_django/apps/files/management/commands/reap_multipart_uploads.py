@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.files.upload_sessions import reap_stale_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Abort stale multipart uploads: active sessions past their expiry and uploads MinIO "
+        "still holds without a session. Runs once, or every --interval seconds with --loop. "
+        "The transcode worker also runs this sweep every MULTIPART_REAP_INTERVAL_SEC."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep running.")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=int(getattr(settings, "MULTIPART_REAP_INTERVAL_SEC", 3600)),
+            help="Seconds between sweeps with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            sessions, orphans = reap_stale_uploads()
+            self.stdout.write(f"Aborted {sessions} expired session(s) and {orphans} orphaned upload(s).")
+            if not options["loop"]:
+                return
+            time.sleep(max(60, options["interval"]))
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from apps.files.hls import is_ffmpeg_available
+from apps.files.jobs import claim_next_job, default_worker_id, requeue_stalled, run_job
+from apps.files.upload_sessions import reap_stale_uploads
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the HLS transcode worker: claims queued video_transcode_jobs rows "
+        "(FOR UPDATE SKIP LOCKED) and transcodes them with a bounded number of ffmpeg processes. "
+        "Scale throughput by running more workers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=int(getattr(settings, "TRANSCODE_WORKER_CONCURRENCY", 1)),
+            help="Max jobs (ffmpeg processes) run in parallel by this worker.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=float(getattr(settings, "TRANSCODE_POLL_INTERVAL_SEC", 5)),
+            help="Seconds to sleep when the queue is empty.",
+        )
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=int(getattr(settings, "TRANSCODE_STALE_AFTER_SEC", 120)),
+            help="Re-queue processing jobs without a heartbeat for this many seconds.",
+        )
+        parser.add_argument("--once", action="store_true", help="Drain the queue and exit.")
+
+    def handle(self, *args, **options):
+        if not is_ffmpeg_available():
+            raise SystemExit("ffmpeg is not installed or not in PATH; cannot run the transcode worker.")
+
+        concurrency = max(1, options["concurrency"])
+        poll_interval = options["poll_interval"]
+        stale_after = options["stale_after"]
+        once = options["once"]
+        base_id = default_worker_id()
+        stop = threading.Event()
+
+        def _request_stop(signum, _frame):
+            self.stdout.write(f"Signal {signum} received: finishing running jobs, not claiming new ones.")
+            stop.set()
+
+        signal.signal(signal.SIGTERM, _request_stop)
+        signal.signal(signal.SIGINT, _request_stop)
+
+        def _slot(slot: int):
+            worker_id = f"{base_id}:{slot}"
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    try:
+                        job = claim_next_job(worker_id)
+                    except Exception as e:
+                        # DB restart etc.: back off and retry.
+                        self.stderr.write(f"[{worker_id}] claim failed: {e}")
+                        connection.close()
+                        stop.wait(poll_interval)
+                        continue
+                    if job is None:
+                        if once:
+                            return
+                        stop.wait(poll_interval)
+                        continue
+                    self.stdout.write(f"[{worker_id}] job {job.id}: {job.source_object_key} (attempt {job.attempts})")
+                    started = time.monotonic()
+                    run_job(job, worker_id)
+                    self.stdout.write(f"[{worker_id}] job {job.id} finished in {time.monotonic() - started:.1f}s")
+            finally:
+                connection.close()
+
+        def _sweep():
+            try:
+                requeued = requeue_stalled(stale_after)
+                if requeued:
+                    self.stdout.write(f"Recovered {requeued} stalled job(s).")
+            except Exception as e:
+                self.stderr.write(f"Stalled-job sweep failed: {e}")
+                connection.close()
+
+        def _reap_uploads():
+            # Housekeeping that needs a long-running process: stale multipart uploads.
+            try:
+                sessions, orphans = reap_stale_uploads()
+                if sessions or orphans:
+                    self.stdout.write(f"Aborted {sessions} expired upload session(s), {orphans} orphaned upload(s).")
+            except Exception as e:
+                self.stderr.write(f"Multipart upload sweep failed: {e}")
+                connection.close()
+
+        self.stdout.write(f"Transcode worker {base_id} started (concurrency={concurrency}).")
+        _sweep()
+        threads = [
+            threading.Thread(target=_slot, args=(i,), name=f"transcode-slot-{i}", daemon=True)
+            for i in range(concurrency)
+        ]
+        for t in threads:
+            t.start()
+
+        # Main thread: periodically reclaim jobs orphaned by crashed workers (on any host).
+        # After SIGTERM it keeps waiting until the running jobs are finished.
+        sweep_every = max(poll_interval, stale_after / 4)
+        reap_every = int(getattr(settings, "MULTIPART_REAP_INTERVAL_SEC", 3600))
+        last_sweep = time.monotonic()
+        last_reap = time.monotonic() - reap_every
+        while any(t.is_alive() for t in threads):
+            if not stop.is_set() and time.monotonic() - last_sweep >= sweep_every:
+                _sweep()
+                last_sweep = time.monotonic()
+            if not stop.is_set() and reap_every > 0 and time.monotonic() - last_reap >= reap_every:
+                _reap_uploads()
+                last_reap = time.monotonic()
+            time.sleep(1)
+
+        connection.close()
+        self.stdout.write("Transcode worker stopped.")
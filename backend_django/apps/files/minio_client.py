@@ -1,14 +1,20 @@
 from __future__ import annotations
 
 import os
+import threading
 import time
 import uuid
+from typing import Iterable, Mapping
 from urllib.parse import urlparse
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from django.conf import settings
 
+from apps.files import presign_cache
+from apps.files.presign import SigV4Presigner
+
 
 def env(key: str, default: str = None) -> str | None:
     """Get environment variable with default"""
@@ -24,89 +30,241 @@ def _is_ssl(endpoint: str) -> bool:
     return urlparse(endpoint).scheme == "https"
 
 
-def s3_client():
+def _client_config() -> Config:
+    return Config(
+        s3={"addressing_style": "path"},
+        max_pool_connections=int(getattr(settings, "MINIO_MAX_POOL_CONNECTIONS", 32)),
+        tcp_keepalive=bool(getattr(settings, "MINIO_TCP_KEEPALIVE", True)),
+        connect_timeout=float(getattr(settings, "MINIO_CONNECT_TIMEOUT", 10)),
+        read_timeout=float(getattr(settings, "MINIO_READ_TIMEOUT", 60)),
+        retries={"max_attempts": int(getattr(settings, "MINIO_MAX_ATTEMPTS", 3)), "mode": "standard"},
+    )
+
+
+def new_s3_client():
+    """
+    Build a fresh S3 client for MinIO.
+    Prefer s3_client(): this is only for callers that really need an isolated client.
+    """
     endpoint = _endpoint_url()
-    return boto3.client(
+    # boto3.client() goes through the default session, which is not thread-safe to create;
+    # a dedicated Session per client avoids that race.
+    session = boto3.session.Session()
+    return session.client(
         "s3",
         endpoint_url=endpoint,
         aws_access_key_id=settings.MINIO_ACCESS_KEY,
         aws_secret_access_key=settings.MINIO_SECRET_KEY,
         region_name="us-east-1",
         use_ssl=_is_ssl(endpoint),
-        config=Config(s3={"addressing_style": "path"}),
+        config=_client_config(),
     )
 
 
+# Process-wide client registry.
+# botocore clients are thread-safe once created, so one client (and its HTTP connection pool)
+# is shared by all request threads and background transcode threads of a worker process.
+# Sockets must never be shared across fork(), so the client is rebuilt in the child.
+_client_lock = threading.Lock()
+_client = None
+_client_pid: int | None = None
+
+
+def s3_client():
+    global _client, _client_pid
+    client = _client
+    if client is not None and _client_pid == os.getpid():
+        return client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = new_s3_client()
+            _client_pid = os.getpid()
+        return _client
+
+
+def reset_s3_client() -> None:
+    """Drop the pooled client (e.g. after credentials change or in a forked child)."""
+    global _client, _client_pid
+    _client = None
+    _client_pid = None
+
+
+def _reset_after_fork() -> None:
+    # The lock may have been held by another thread at fork time; replace it.
+    global _client_lock
+    _client_lock = threading.Lock()
+    reset_s3_client()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def transfer_config() -> TransferConfig:
+    """Managed-transfer settings for upload_fileobj / streaming uploads (parallel multipart parts)."""
+    return TransferConfig(
+        multipart_threshold=int(getattr(settings, "MULTIPART_CHUNK_SIZE", 10 * 1024 * 1024)),
+        multipart_chunksize=int(getattr(settings, "MULTIPART_CHUNK_SIZE", 10 * 1024 * 1024)),
+        max_concurrency=int(getattr(settings, "MINIO_UPLOAD_CONCURRENCY", 4)),
+        use_threads=True,
+    )
+
+
+PRESIGN_MAX_EXPIRES = 60 * 60 * 24 * 7  # SigV4 limit: 7 days
+
+_presigner_lock = threading.Lock()
+_presigner: SigV4Presigner | None = None
+
+
+def _clamp_expires(expires_in: int) -> int:
+    if expires_in <= 0 or expires_in > PRESIGN_MAX_EXPIRES:
+        return PRESIGN_MAX_EXPIRES
+    return expires_in
+
+
+def get_presigner() -> SigV4Presigner:
+    """Process-wide local presigner (rebuilt if MinIO settings change)."""
+    global _presigner
+    endpoint = _endpoint_url()
+    presigner = _presigner
+    if (
+        presigner is None
+        or presigner.endpoint != endpoint
+        or presigner.access_key != settings.MINIO_ACCESS_KEY
+        or presigner.secret_key != settings.MINIO_SECRET_KEY
+        or presigner.bucket != settings.MINIO_BUCKET
+    ):
+        with _presigner_lock:
+            presigner = SigV4Presigner(
+                endpoint,
+                settings.MINIO_ACCESS_KEY,
+                settings.MINIO_SECRET_KEY,
+                settings.MINIO_BUCKET,
+                region="us-east-1",
+            )
+            _presigner = presigner
+    return presigner
+
+
 def presign_get(key: str, expires_in: int = 60 * 60 * 24 * 7, response_content_type: str | None = None) -> str:
     """
     Generate presigned URL for downloading object from MinIO.
-    
+
+    Signed locally with SigV4 (apps/files/presign.py); the signing time is rounded to
+    MINIO_PRESIGN_CACHE_WINDOW so repeated calls return the same, cacheable URL.
+    Set MINIO_LOCAL_PRESIGN=false to fall back to botocore's generate_presigned_url.
+
     Args:
         key: Object key in MinIO bucket
-        expires_in: URL expiration time in seconds (default: 7 days)
+        expires_in: URL expiration time in seconds (default and max: 7 days)
         response_content_type: Optional content type override
-        
+
     Returns:
-        Presigned URL string (with public endpoint if configured)
-        
+        Presigned URL string signed for MINIO_ENDPOINT.
+        Do NOT replace the hostname: the signature covers it. The frontend getFrontendUrl()
+        maps it onto the /api/minio/ nginx proxy, which keeps Host stable.
+
     Raises:
-        ClientError: If MinIO operation fails
         ValueError: If key is empty or invalid
     """
-    import logging
-    logger = logging.getLogger(__name__)
-    
     if not key or not key.strip():
         raise ValueError("Key cannot be empty")
-    
+
     # Normalize key: remove leading slashes
     key = key.lstrip("/")
-    
-    try:
+    expires_in = _clamp_expires(expires_in)
+
+    if not getattr(settings, "MINIO_LOCAL_PRESIGN", True):
         params: dict = {"Bucket": settings.MINIO_BUCKET, "Key": key}
         if response_content_type:
             params["ResponseContentType"] = response_content_type
-        
-        # Validate expires_in
-        if expires_in <= 0:
-            expires_in = 60 * 60 * 24 * 7  # Default to 7 days
-        if expires_in > 60 * 60 * 24 * 7:  # Max 7 days
-            expires_in = 60 * 60 * 24 * 7
-        
+        return s3_client().generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+
+    return _presign_local({key: response_content_type}, expires_in)[key]
+
+
+def presign_many(
+    keys: Iterable[str],
+    expires_in: int = 60 * 60 * 24 * 7,
+    response_content_types: Mapping[str, str | None] | None = None,
+) -> dict[str, str]:
+    """
+    Batch version of presign_get for listings: returns {key: url} for the given keys
+    (normalized, empty keys skipped), all signed with one timestamp.
+    """
+    expires_in = _clamp_expires(expires_in)
+    content_types = response_content_types or {}
+    normalized: dict[str, str] = {}
+    for key in keys:
+        clean = (key or "").lstrip("/")
+        if clean.strip():
+            normalized[key] = clean
+
+    if not getattr(settings, "MINIO_LOCAL_PRESIGN", True):
+        return {
+            key: presign_get(clean, expires_in, content_types.get(key))
+            for key, clean in normalized.items()
+        }
+
+    signed = _presign_local({clean: content_types.get(key) for key, clean in normalized.items()}, expires_in)
+    return {key: signed[clean] for key, clean in normalized.items()}
+
+
+def _presign_local(content_types: dict[str, str | None], expires_in: int) -> dict[str, str]:
+    """
+    Sign {key: response content type} locally, through the time-bucketed URL cache
+    (apps/files/presign_cache.py) when the expiry is long enough to bucket.
+    """
+    presigner = get_presigner()
+    window = presign_cache.window_for(expires_in)
+    if not window:
+        return presigner.presign_many(content_types.keys(), expires_in, content_types)
+
+    now = time.time()
+    signed_at = presign_cache.signing_time(window, now)
+    evict_at = signed_at + window
+    namespace = f"{presigner.endpoint}|{presigner.access_key}|{presigner.bucket}"
+    cache_keys = {
+        key: presign_cache.cache_key(namespace, key, content_type, expires_in, signed_at)
+        for key, content_type in content_types.items()
+    }
+    cached = presign_cache.get_many(list(cache_keys.values()), now, evict_at)
+
+    urls: dict[str, str] = {}
+    missing: dict[str, str | None] = {}
+    for key, content_type in content_types.items():
+        url = cached.get(cache_keys[key])
+        if url is None:
+            missing[key] = content_type
+        else:
+            urls[key] = url
+    if missing:
+        signed = presigner.presign_many(missing.keys(), expires_in, missing, now=signed_at)
+        presign_cache.set_many({cache_keys[k]: url for k, url in signed.items()}, evict_at, now)
+        urls.update(signed)
+    return urls
+
+
+def presign_upload_parts(
+    key: str, upload_id: str, part_numbers: Iterable[int], expires_in: int = 60 * 60
+) -> dict[int, str]:
+    """
+    Presigned PUT URLs for parts of a multipart upload, {part number: url}, so the browser
+    can send parts straight to MinIO (through the /api/minio/ proxy, see getFrontendUrl()).
+    """
+    key = key.lstrip("/")
+    expires_in = _clamp_expires(expires_in)
+    if not getattr(settings, "MINIO_LOCAL_PRESIGN", True):
         client = s3_client()
-        
-        # Log before generation - check settings
-        minio_public_endpoint_check = getattr(settings, 'MINIO_PUBLIC_ENDPOINT', 'NOT_SET')
-        logger.info(f"[presign_get] ========== START presign_get ==========")
-        logger.info(f"[presign_get] Generating presigned URL for key: {key}")
-        logger.info(f"[presign_get] MINIO_ENDPOINT: {settings.MINIO_ENDPOINT}")
-        logger.info(f"[presign_get] MINIO_PUBLIC_ENDPOINT from settings: {minio_public_endpoint_check}")
-        logger.info(f"[presign_get] Type of MINIO_PUBLIC_ENDPOINT: {type(minio_public_endpoint_check)}")
-        
-        url = client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
-        
-        # Log after generation
-        logger.info(f"[presign_get] Generated presigned URL (before replacement): {url[:200] if url else 'None'}...")
-        
-        # IMPORTANT: Do NOT replace hostname in presigned URLs!
-        # Presigned URLs are signed with the hostname, so changing it invalidates the signature.
-        # Instead, return URL with original hostname - frontend will use /api/minio/ proxy
-        # which preserves the Host header (proxy_set_header Host minio:9000 in nginx.conf)
-        # 
-        # The frontend getFrontendUrl() function will convert http://minio:9000/... to /api/minio/...
-        # and nginx will proxy it to MinIO with correct Host header, preserving the signature.
-        
-        logger.info(f"[presign_get] Returning presigned URL with original hostname (frontend will use /api/minio/ proxy)")
-        logger.info(f"[presign_get] URL will be converted by frontend getFrontendUrl() to use /api/minio/ proxy")
-        
-        if not url:
-            logger.error(f"[presign_get] Failed to generate URL for key: {key}")
-            raise ValueError("Failed to generate presigned URL")
-        
-        return url
-    except Exception as e:
-        logger.error(f"[presign_get] Error generating presigned URL for key {key}: {e}")
-        raise
+        return {
+            int(n): client.generate_presigned_url(
+                "upload_part",
+                Params={"Bucket": settings.MINIO_BUCKET, "Key": key, "UploadId": upload_id, "PartNumber": int(n)},
+                ExpiresIn=expires_in,
+            )
+            for n in part_numbers
+        }
+    return get_presigner().presign_upload_parts(key, upload_id, part_numbers, expires_in)
 
 
 def presign_put(key: str, content_type: str | None = None, expires_in: int = 900) -> str:
@@ -12,6 +12,22 @@ class VideoTranscodeJob(models.Model):
     master_object_key = models.CharField(max_length=1000, null=True, blank=True)
     status = models.CharField(max_length=20, default="queued")
     error = models.TextField(null=True, blank=True)
+    # Job runner bookkeeping (see apps/files/jobs.py)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    worker_id = models.CharField(max_length=255, null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    retry_after = models.DateTimeField(null=True, blank=True)
+    # HLS output upload statistics
+    upload_bytes = models.BigIntegerField(null=True, blank=True)
+    upload_files = models.IntegerField(null=True, blank=True)
+    upload_seconds = models.FloatField(null=True, blank=True)
+    upload_retries = models.IntegerField(null=True, blank=True)
+    # Poster frame and seek-preview sprite WebVTT, next to master.m3u8
+    poster_object_key = models.CharField(max_length=1000, null=True, blank=True)
+    thumbnails_object_key = models.CharField(max_length=1000, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -20,3 +36,58 @@ class VideoTranscodeJob(models.Model):
         managed = False
 
 
+
+
+class MultipartUploadSession(models.Model):
+    """Browser multipart upload in progress (see apps/files/upload_sessions.py)."""
+
+    id = models.AutoField(primary_key=True)
+    upload_id = models.CharField(max_length=1024, unique=True)
+    object_key = models.CharField(max_length=1000)
+    content_type = models.CharField(max_length=255, null=True, blank=True)
+    user_id = models.UUIDField(null=True, blank=True)
+    file_size = models.BigIntegerField(null=True, blank=True)
+    part_size = models.IntegerField(null=True, blank=True)
+    # active -> completed | aborted
+    status = models.CharField(max_length=20, default="active")
+    expires_at = models.DateTimeField()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "multipart_upload_sessions"
+        managed = False
+
+
+class MultipartUploadPart(models.Model):
+    id = models.AutoField(primary_key=True)
+    session = models.ForeignKey(
+        MultipartUploadSession, on_delete=models.CASCADE, db_column="session_id", related_name="parts"
+    )
+    part_number = models.IntegerField()
+    etag = models.CharField(max_length=255)
+    size = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "multipart_upload_parts"
+        managed = False
+        unique_together = (("session", "part_number"),)
+
+
+class ContentBlob(models.Model):
+    """Content hash -> the MinIO object holding those bytes (see apps/files/dedup.py)."""
+
+    id = models.AutoField(primary_key=True)
+    content_hash = models.CharField(max_length=200, unique=True)
+    size = models.BigIntegerField()
+    object_key = models.CharField(max_length=1000)
+    content_type = models.CharField(max_length=255, null=True, blank=True)
+    reuse_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "content_blobs"
+        managed = False
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import threading
+import time
+from typing import Iterable, Mapping
+from urllib.parse import quote, urlsplit
+
+# AWS Signature Version 4, query-string ("presigned URL") form, for GET object and
+# PUT upload_part. Produces the same URL as botocore's generate_presigned_url
+# ("get_object" / "upload_part") with signature_version="s3v4" and path-style
+# addressing, without building a request object per call (see `manage.py bench_presign --verify`).
+
+_ALGORITHM = "AWS4-HMAC-SHA256"
+_UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def _quote_query(value: str) -> str:
+    return quote(value, safe="-_.~")
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+class SigV4Presigner:
+    """
+    Local SigV4 presigner for MinIO/S3 GET URLs.
+    The derived signing key depends only on (date, region, service), so it is cached
+    and each URL costs one SHA-256 of the canonical request plus two HMACs.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        access_key: str,
+        secret_key: str,
+        bucket: str,
+        region: str = "us-east-1",
+        service: str = "s3",
+    ):
+        self.endpoint = endpoint
+        parts = urlsplit(endpoint)
+        host = parts.hostname or ""
+        if parts.port and parts.port != _DEFAULT_PORTS.get(parts.scheme):
+            host = f"{host}:{parts.port}"
+        self.host = host
+        self.base_url = f"{parts.scheme}://{parts.netloc}"
+        self.bucket = bucket
+        self.bucket_path = f"{parts.path.rstrip('/')}/{quote(bucket, safe='/~')}"
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.service = service
+        self._keys: dict[tuple[str, str, str], bytes] = {}
+        self._lock = threading.Lock()
+
+    def signing_key(self, datestamp: str) -> bytes:
+        cache_key = (datestamp, self.region, self.service)
+        key = self._keys.get(cache_key)
+        if key is None:
+            k_date = _hmac(f"AWS4{self.secret_key}".encode("utf-8"), datestamp)
+            k_region = _hmac(k_date, self.region)
+            k_service = _hmac(k_region, self.service)
+            key = _hmac(k_service, "aws4_request")
+            with self._lock:
+                # Keep only the current day (and possibly the previous one around midnight).
+                if len(self._keys) > 4:
+                    self._keys.clear()
+                self._keys[cache_key] = key
+        return key
+
+    def presign_get(
+        self,
+        key: str,
+        expires_in: int,
+        response_content_type: str | None = None,
+        now: float | None = None,
+    ) -> str:
+        content_types = {key: response_content_type} if response_content_type else None
+        return self.presign_many([key], expires_in, content_types, now)[key]
+
+    def presign_many(
+        self,
+        keys: Iterable[str],
+        expires_in: int,
+        response_content_types: Mapping[str, str | None] | None = None,
+        now: float | None = None,
+    ) -> dict[str, str]:
+        """
+        Presign many keys with one timestamp; returns {key: url}.
+        All per-batch work (timestamp, credential scope, signing key) is done once.
+        """
+        batch = self._batch(expires_in, now)
+        content_types = response_content_types or {}
+
+        urls: dict[str, str] = {}
+        for key in keys:
+            params = []
+            content_type = content_types.get(key)
+            if content_type:
+                params.append(("response-content-type", content_type))
+            urls[key] = self._sign(batch, "GET", key, params)
+        return urls
+
+    def presign_upload_parts(
+        self,
+        key: str,
+        upload_id: str,
+        part_numbers: Iterable[int],
+        expires_in: int,
+        now: float | None = None,
+    ) -> dict[int, str]:
+        """PUT URLs for parts of a multipart upload, one timestamp; returns {part number: url}."""
+        batch = self._batch(expires_in, now)
+        return {
+            int(n): self._sign(batch, "PUT", key, [("uploadId", upload_id), ("partNumber", str(int(n)))])
+            for n in part_numbers
+        }
+
+    def _batch(self, expires_in: int, now: float | None) -> tuple:
+        """Per-batch work: timestamp, credential scope and signing key."""
+        tm = time.gmtime(time.time() if now is None else now)
+        amz_date = time.strftime("%Y%m%dT%H%M%SZ", tm)
+        datestamp = amz_date[:8]
+        scope = f"{datestamp}/{self.region}/{self.service}/aws4_request"
+        auth_params = [
+            ("X-Amz-Algorithm", _ALGORITHM),
+            ("X-Amz-Credential", f"{self.access_key}/{scope}"),
+            ("X-Amz-Date", amz_date),
+            ("X-Amz-Expires", str(int(expires_in))),
+            ("X-Amz-SignedHeaders", "host"),
+        ]
+        string_to_sign_prefix = f"{_ALGORITHM}\n{amz_date}\n{scope}\n"
+        return auth_params, string_to_sign_prefix, self.signing_key(datestamp)
+
+    def _sign(self, batch: tuple, method: str, key: str, params: list[tuple[str, str]]) -> str:
+        auth_params, string_to_sign_prefix, signing_key = batch
+        path = f"{self.bucket_path}/{quote(key, safe='/~')}"
+        # botocore puts operation parameters first, then the X-Amz-* auth parameters.
+        encoded = [(_quote_query(k), _quote_query(v)) for k, v in params + auth_params]
+        canonical_query = "&".join(f"{k}={v}" for k, v in sorted(encoded))
+        headers_block = f"host:{self.host}\n\nhost\n{_UNSIGNED_PAYLOAD}"
+        canonical_request = f"{method}\n{path}\n{canonical_query}\n{headers_block}"
+        string_to_sign = string_to_sign_prefix + hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()
+        signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+        query = "&".join(f"{k}={v}" for k, v in encoded)
+        return f"{self.base_url}{path}?{query}&X-Amz-Signature={signature}"
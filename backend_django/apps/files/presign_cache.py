@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from apps.core.redis_client import get_redis, report_redis_error
+
+# Presigned URL cache.
+#
+# The signing timestamp is rounded down to a window, so every request for the same
+# (key, content type, expiry) inside one window gets the *same* URL. That lets browsers
+# and nginx cache the object, and lets us cache the URL itself:
+#   tier 1: per-process LRU,
+#   tier 2: optional Redis (REDIS_URL), shared by all gunicorn workers.
+# An entry lives only until its window ends. The window is at most a quarter of the
+# expiry, so a cached URL always has at least 3/4 of its lifetime left when served.
+
+_MIN_WINDOW = 60
+
+
+def window_for(expires_in: int) -> int:
+    """Signing window for an expiry, or 0 when the expiry is too short to bucket."""
+    window = min(int(getattr(settings, "MINIO_PRESIGN_CACHE_WINDOW", 3600)), expires_in // 4)
+    return window if window >= _MIN_WINDOW else 0
+
+
+def signing_time(window: int, now: float | None = None) -> int:
+    now = time.time() if now is None else now
+    return int(now) - int(now) % window
+
+
+def cache_key(namespace: str, key: str, content_type: str | None, expires_in: int, signed_at: int) -> str:
+    raw = f"{namespace}\0{signed_at}\0{expires_in}\0{content_type or ''}\0{key}"
+    return "presign:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class _LocalLRU:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: list[str], now: float) -> dict[str, str]:
+        found: dict[str, str] = {}
+        with self._lock:
+            for k in keys:
+                entry = self._data.get(k)
+                if entry is None:
+                    continue
+                url, evict_at = entry
+                if evict_at <= now:
+                    del self._data[k]
+                    continue
+                self._data.move_to_end(k)
+                found[k] = url
+        return found
+
+    def set_many(self, items: dict[str, str], evict_at: float) -> None:
+        with self._lock:
+            for k, url in items.items():
+                self._data[k] = (url, evict_at)
+                self._data.move_to_end(k)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_local = _LocalLRU(int(getattr(settings, "MINIO_PRESIGN_CACHE_SIZE", 10000)))
+
+
+def get_many(keys: list[str], now: float, evict_at: float) -> dict[str, str]:
+    found = _local.get_many(keys, now)
+    missing = [k for k in keys if k not in found]
+    if not missing:
+        return found
+    redis = get_redis() if getattr(settings, "MINIO_PRESIGN_CACHE_REDIS", True) else None
+    if redis is None:
+        return found
+    try:
+        values = redis.mget(missing)
+    except Exception as e:
+        report_redis_error(e)
+        return found
+    hits = {k: v.decode("utf-8") for k, v in zip(missing, values) if v is not None}
+    if hits:
+        # Same window as the Redis entry, so the local copy expires with it.
+        _local.set_many(hits, evict_at)
+        found.update(hits)
+    return found
+
+
+def set_many(items: dict[str, str], evict_at: float, now: float) -> None:
+    if not items:
+        return
+    _local.set_many(items, evict_at)
+    redis = get_redis() if getattr(settings, "MINIO_PRESIGN_CACHE_REDIS", True) else None
+    if redis is None:
+        return
+    ttl = int(evict_at - now)
+    if ttl <= 0:
+        return
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for k, url in items.items():
+            pipe.set(k, url, ex=ttl)
+        pipe.execute()
+    except Exception as e:
+        report_redis_error(e)
+
+
+def clear_local() -> None:
+    _local.clear()
@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO
+
+from django.conf import settings
+
+from apps.core.redis_client import get_redis, report_redis_error
+from apps.files.streaming import ObjectMeta, get_object_meta, open_object
+
+logger = logging.getLogger(__name__)
+
+# Local disk cache for immutable HLS output (apps/files/jobs.is_final_output_key).
+#
+# When a cohort watches the same video, every viewer requests the same segments; with
+# HLS_DISK_CACHE_DIR set, HlsObjectView keeps them in a size-bounded LRU on local disk
+# and serves hits with FileResponse (sendfile under gunicorn; the uvicorn service streams
+# them through an async generator instead). The directory may be
+# shared by all gunicorn/uvicorn processes (and containers, via a volume):
+#   - a miss takes an flock on the entry's lock file, so concurrent misses for one
+#     segment, in any process, result in a single MinIO fetch; the others wait and hit;
+#   - entries are written to a temp file and renamed, so readers never see partial data;
+#   - LRU order is the file mtime (bumped on every hit), and eviction runs in whichever
+#     process notices the budget is exceeded.
+#
+# Layout: <dir>/<hh>/<sha256(key)>.bin + .json (ObjectMeta) + .lock
+
+_STATS_REDIS_KEY = "hls-disk-cache:stats"
+_STATS_FLUSH_SEC = 5.0
+# Other processes add entries too: re-measure the directory at least this often.
+_RESCAN_SEC = 60.0
+# Eviction frees a little more than needed, so it does not run on every insert.
+_EVICT_TO = 0.9
+
+
+def segment_cache_enabled() -> bool:
+    return bool(getattr(settings, "HLS_DISK_CACHE_DIR", "")) and _max_bytes() > 0
+
+
+def _root() -> str:
+    return str(getattr(settings, "HLS_DISK_CACHE_DIR", ""))
+
+
+def _max_bytes() -> int:
+    return int(getattr(settings, "HLS_DISK_CACHE_BYTES", 0))
+
+
+def _max_object_bytes() -> int:
+    return int(getattr(settings, "HLS_DISK_CACHE_MAX_OBJECT_BYTES", 64 * 1024 * 1024))
+
+
+@dataclass
+class CachedObject:
+    file: BinaryIO
+    meta: ObjectMeta
+
+
+class _Stats:
+    """Per-process counters; deltas are also added to a Redis hash shared by all processes."""
+
+    FIELDS = ("hits", "misses", "coalesced", "bypassed", "bytes_saved", "bytes_fetched", "evicted_bytes")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = dict.fromkeys(self.FIELDS, 0)
+        self._pending = dict.fromkeys(self.FIELDS, 0)
+        self._flushed_at = time.monotonic()
+
+    def add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, value in deltas.items():
+                self._totals[name] += value
+                self._pending[name] += value
+            if time.monotonic() - self._flushed_at < _STATS_FLUSH_SEC:
+                return
+            pending = {k: v for k, v in self._pending.items() if v}
+            self._pending = dict.fromkeys(self.FIELDS, 0)
+            self._flushed_at = time.monotonic()
+        self._flush(pending)
+
+    def _flush(self, pending: dict[str, int]) -> None:
+        redis = get_redis()
+        if redis is None or not pending:
+            return
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for name, value in pending.items():
+                pipe.hincrby(_STATS_REDIS_KEY, name, value)
+            pipe.execute()
+        except Exception as e:
+            report_redis_error(e)
+
+    def process_totals(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._totals)
+
+    def shared_totals(self) -> dict[str, int] | None:
+        redis = get_redis()
+        if redis is None:
+            return None
+        try:
+            raw = redis.hgetall(_STATS_REDIS_KEY)
+        except Exception as e:
+            report_redis_error(e)
+            return None
+        return {k.decode() if isinstance(k, bytes) else k: int(v) for k, v in raw.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals = dict.fromkeys(self.FIELDS, 0)
+            self._pending = dict.fromkeys(self.FIELDS, 0)
+
+
+_stats = _Stats()
+
+_usage_lock = threading.Lock()
+_usage_bytes: int | None = None
+_usage_measured_at = 0.0
+
+
+def _paths(key: str) -> tuple[str, str, str]:
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    base = os.path.join(_root(), digest[:2], digest)
+    return base + ".bin", base + ".json", base + ".lock"
+
+
+def _meta_to_json(meta: ObjectMeta) -> str:
+    return json.dumps(
+        {
+            "size": meta.size,
+            "etag": meta.etag,
+            "content_type": meta.content_type,
+            "last_modified": meta.last_modified.isoformat() if meta.last_modified else None,
+        }
+    )
+
+
+def _meta_from_json(raw: str) -> ObjectMeta:
+    data = json.loads(raw)
+    return ObjectMeta(
+        size=int(data["size"]),
+        etag=data.get("etag") or "",
+        content_type=data.get("content_type"),
+        last_modified=datetime.fromisoformat(data["last_modified"]) if data.get("last_modified") else None,
+    )
+
+
+def _open_entry(key: str) -> CachedObject | None:
+    data_path, meta_path, _ = _paths(key)
+    try:
+        # Open before reading the sidecar: an open file survives a concurrent eviction.
+        f = open(data_path, "rb")
+    except FileNotFoundError:
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as m:
+            meta = _meta_from_json(m.read())
+        if os.fstat(f.fileno()).st_size != meta.size:
+            raise ValueError("size mismatch")
+        os.utime(data_path)
+    except (OSError, ValueError, KeyError) as e:
+        f.close()
+        logger.warning(f"[segment_cache] Dropping broken entry for {key}: {e}")
+        _remove(data_path, meta_path)
+        return None
+    return CachedObject(f, meta)
+
+
+def _remove(*paths: str) -> None:
+    for p in paths:
+        try:
+            os.unlink(p)
+        except FileNotFoundError:
+            pass
+
+
+@contextmanager
+def _entry_lock(lock_path: str):
+    """Exclusive flock on the entry's lock file (threads and processes alike)."""
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _store(key: str, data_path: str, meta_path: str) -> ObjectMeta:
+    opened = open_object(key)
+    tmp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    body = opened.iter_body()
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in body:
+                out.write(chunk)
+        with open(meta_path, "w", encoding="utf-8") as m:
+            m.write(_meta_to_json(opened.meta))
+        os.replace(tmp_path, data_path)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+    finally:
+        body.close()
+    return opened.meta
+
+
+def get(key: str) -> CachedObject | None:
+    """
+    Cached copy of `key` (an open file the caller must close), fetching it from MinIO on
+    a miss. None when the object is too large to cache or the cache directory is not
+    usable; the caller then streams from MinIO as usual. ClientError is propagated.
+    """
+    entry = _open_entry(key)
+    if entry is not None:
+        _stats.add(hits=1, bytes_saved=entry.meta.size)
+        return entry
+
+    data_path, meta_path, lock_path = _paths(key)
+    try:
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        with _entry_lock(lock_path):
+            # Another thread or process may have fetched it while we waited for the lock.
+            entry = _open_entry(key)
+            if entry is not None:
+                _stats.add(hits=1, coalesced=1, bytes_saved=entry.meta.size)
+                return entry
+            if get_object_meta(key).size > _max_object_bytes():
+                _stats.add(bypassed=1)
+                return None
+            meta = _store(key, data_path, meta_path)
+    except OSError as e:
+        logger.warning(f"[segment_cache] Cache directory unusable, bypassing: {e}")
+        _stats.add(bypassed=1)
+        return None
+
+    _stats.add(misses=1, bytes_fetched=meta.size)
+    _account(meta.size)
+    return _open_entry(key)
+
+
+def _scan() -> list[tuple[float, int, str]]:
+    """(mtime, size, data path) of every entry."""
+    entries = []
+    root = _root()
+    try:
+        shards = os.scandir(root)
+    except FileNotFoundError:
+        return entries
+    with shards:
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            with os.scandir(shard.path) as files:
+                for f in files:
+                    if not f.name.endswith(".bin"):
+                        continue
+                    try:
+                        st = f.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, f.path))
+    return entries
+
+
+def _account(added: int) -> None:
+    global _usage_bytes, _usage_measured_at
+    now = time.monotonic()
+    with _usage_lock:
+        if _usage_bytes is None or now - _usage_measured_at > _RESCAN_SEC:
+            _usage_bytes = sum(size for _, size, _ in _scan())
+            _usage_measured_at = now
+        else:
+            _usage_bytes += added
+        if _usage_bytes <= _max_bytes():
+            return
+        _usage_bytes = _evict()
+        _usage_measured_at = now
+
+
+def _evict() -> int:
+    """Delete least recently used entries down to _EVICT_TO of the budget; returns the usage."""
+    lock_path = os.path.join(_root(), ".evict.lock")
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another process is evicting right now.
+            return sum(size for _, size, _ in _scan())
+        entries = sorted(_scan())
+        usage = sum(size for _, size, _ in entries)
+        target = int(_max_bytes() * _EVICT_TO)
+        evicted = 0
+        for _mtime, size, data_path in entries:
+            if usage <= target:
+                break
+            base = data_path[: -len(".bin")]
+            _remove(data_path, base + ".json", base + ".lock")
+            usage -= size
+            evicted += size
+        if evicted:
+            _stats.add(evicted_bytes=evicted)
+            logger.info(f"[segment_cache] Evicted {evicted} bytes, {usage} bytes in use")
+        return usage
+    finally:
+        os.close(fd)
+
+
+def stats() -> dict:
+    """Counters for monitoring: this process, all processes (Redis) and current disk usage."""
+    process = _stats.process_totals()
+    shared = _stats.shared_totals()
+
+    def hit_rate(c: dict[str, int] | None) -> float | None:
+        if not c:
+            return None
+        lookups = c.get("hits", 0) + c.get("misses", 0)
+        return round(c.get("hits", 0) / lookups, 4) if lookups else None
+
+    return {
+        "enabled": segment_cache_enabled(),
+        "directory": _root(),
+        "maxBytes": _max_bytes(),
+        "diskBytes": sum(size for _, size, _ in _scan()) if segment_cache_enabled() else 0,
+        "process": {**process, "hit_rate": hit_rate(process)},
+        "shared": {**shared, "hit_rate": hit_rate(shared)} if shared is not None else None,
+    }
+
+
+def reset_stats() -> None:
+    _stats.reset()
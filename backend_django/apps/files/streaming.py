@@ -0,0 +1,369 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from apps.files.minio_client import presign_get, s3_client
+
+# Shared core of the file/video/HLS proxy views.
+#
+# A proxied request costs exactly one MinIO round-trip: the client's Range header is
+# forwarded to get_object and the total size is read back from ContentRange (or
+# ContentLength for full responses), instead of a head_object followed by get_object.
+# Object metadata seen on the way (size, ETag, content type, Last-Modified) is kept in
+# a short-TTL per-process LRU, which serves HEAD requests and validates Range headers
+# without touching MinIO. The same metadata answers conditional requests
+# (If-None-Match / If-Modified-Since) with 304 before any object body is opened.
+
+_RANGE_RE = re.compile(r"bytes=(\d+)-(\d+)?")
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+_NOT_FOUND_CODES = ("NoSuchKey", "404", "NotFound")
+
+
+@dataclass(frozen=True)
+class ObjectMeta:
+    size: int
+    etag: str
+    content_type: str | None
+    last_modified: datetime | None
+
+    @property
+    def etag_header(self) -> str | None:
+        return quote_etag(self.etag) if self.etag else None
+
+    @property
+    def last_modified_ts(self) -> int | None:
+        return int(self.last_modified.timestamp()) if self.last_modified else None
+
+    def validator_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["ETag"] = self.etag_header
+        if self.last_modified:
+            headers["Last-Modified"] = http_date(self.last_modified_ts)
+        return headers
+
+
+@dataclass
+class OpenedObject:
+    body: object
+    meta: ObjectMeta
+    status: int
+    content_length: int
+    content_range: str | None
+
+    def iter_body(self, chunk_size: int | None = None) -> "ObjectBodyIterator":
+        return ObjectBodyIterator(self.body, self.content_length, chunk_size)
+
+
+class RangeNotSatisfiable(Exception):
+    def __init__(self, size: int):
+        super().__init__(f"Range not satisfiable (size {size})")
+        self.size = size
+
+
+class ObjectBodyIterator:
+    """
+    Response body iterator for a get_object StreamingBody.
+
+    Iterating a StreamingBody directly yields 1 KB chunks (botocore's default), i.e.
+    ~1000 Python iterations and recv calls per MB. This reads MINIO_STREAM_CHUNK_SIZE
+    bytes at a time into one reusable bytearray, straight from the underlying
+    http.client response (readinto, no intermediate bytes objects), and yields
+    memoryview slices of it. Django turns each slice into the bytes the WSGI server
+    writes, before the next chunk is read, so reusing the buffer is safe.
+
+    close() is called by Django/the WSGI server when the response finishes or the
+    client disconnects; an unfinished body closes its MinIO connection right away
+    instead of leaving it open until garbage collection.
+    """
+
+    def __init__(self, body, expected_length: int | None = None, chunk_size: int | None = None):
+        self.body = body
+        self.expected_length = expected_length
+        self.chunk_size = chunk_size or int(getattr(settings, "MINIO_STREAM_CHUNK_SIZE", 512 * 1024))
+        self._finished = False
+
+    def _raw_readinto(self):
+        # botocore requests objects with decode_content=False, so the http.client
+        # response below urllib3 carries exactly the object bytes.
+        raw = getattr(self.body, "_raw_stream", None)
+        fp = getattr(raw, "_fp", None)
+        return getattr(fp, "readinto", None)
+
+    def __iter__(self):
+        buf = bytearray(self.chunk_size)
+        view = memoryview(buf)
+        readinto = self._raw_readinto()
+        if readinto is None:
+            # Unknown body type (e.g. a test double): plain large reads.
+            readinto = self.body.readinto if hasattr(self.body, "readinto") else None
+        sent = 0
+        while True:
+            if readinto is not None:
+                n = readinto(buf)
+                if not n:
+                    break
+                chunk = view[:n]
+            else:
+                chunk = self.body.read(self.chunk_size)
+                if not chunk:
+                    break
+                n = len(chunk)
+            sent += n
+            yield chunk
+        if self.expected_length is not None and sent != self.expected_length:
+            # Abort the client connection rather than end a truncated body "successfully".
+            raise IOError(f"MinIO body ended after {sent} of {self.expected_length} bytes")
+        self._finished = True
+
+    def close(self) -> None:
+        if self._finished:
+            # Fully read: hand the connection back to the pool for reuse.
+            raw = getattr(self.body, "_raw_stream", None)
+            release = getattr(raw, "release_conn", None)
+            if release is not None:
+                release()
+                return
+        self.body.close()
+
+
+def is_not_found(exc: ClientError) -> bool:
+    return (exc.response.get("Error") or {}).get("Code") in _NOT_FOUND_CODES
+
+
+def _meta_from_response(resp: dict, size: int) -> ObjectMeta:
+    return ObjectMeta(
+        size=size,
+        etag=str(resp.get("ETag") or "").strip('"'),
+        content_type=resp.get("ContentType"),
+        last_modified=resp.get("LastModified"),
+    )
+
+
+class _MetaCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[ObjectMeta, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> ObjectMeta | None:
+        if self.ttl <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            meta, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return meta
+
+    def set(self, key: str, meta: ObjectMeta) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (meta, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+_meta_cache = _MetaCache(
+    int(getattr(settings, "MINIO_META_CACHE_SIZE", 5000)),
+    float(getattr(settings, "MINIO_META_CACHE_TTL", 30)),
+)
+
+
+def invalidate_object_meta(key: str) -> None:
+    """Drop cached metadata after this process overwrote or deleted the object."""
+    _meta_cache.pop(key.lstrip("/"))
+
+
+def clear_object_meta_cache() -> None:
+    _meta_cache.clear()
+
+
+def cached_object_meta(key: str) -> ObjectMeta | None:
+    """Cached metadata only (no MinIO request); None when unknown or expired."""
+    return _meta_cache.get(key)
+
+
+def remember_object_meta(key: str, meta: ObjectMeta) -> None:
+    _meta_cache.set(key, meta)
+
+
+def get_object_meta(key: str, refresh: bool = False) -> ObjectMeta:
+    """Object metadata from the cache, or one head_object. Raises ClientError."""
+    if not refresh:
+        cached = _meta_cache.get(key)
+        if cached is not None:
+            return cached
+    head = s3_client().head_object(Bucket=settings.MINIO_BUCKET, Key=key)
+    meta = _meta_from_response(head, int(head.get("ContentLength") or 0))
+    _meta_cache.set(key, meta)
+    return meta
+
+
+def parse_range(range_header: str | None) -> tuple[int, int | None] | None:
+    """`bytes=start-[end]` -> (start, end or None); None when absent or malformed."""
+    m = _RANGE_RE.match(range_header or "")
+    if not m:
+        return None
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else None
+    if end is not None and end < start:
+        return None
+    return start, end
+
+
+def open_object(key: str, range_header: str | None = None, strict_range: bool = True) -> OpenedObject:
+    """
+    Open an object (or a byte range of it) with a single get_object call.
+
+    strict_range=True raises RangeNotSatisfiable for malformed or out-of-bounds ranges;
+    strict_range=False serves the whole object instead (the HLS proxy behaviour).
+    ClientError (e.g. NoSuchKey) is propagated to the caller.
+    """
+    requested = parse_range(range_header) if range_header else None
+    if range_header and requested is None and strict_range:
+        raise RangeNotSatisfiable(get_object_meta(key).size)
+
+    if requested is not None:
+        # Reject ranges beyond a known size without a MinIO round-trip.
+        cached = _meta_cache.get(key)
+        if cached is not None and cached.size > 0 and requested[0] >= cached.size:
+            if strict_range:
+                raise RangeNotSatisfiable(cached.size)
+            requested = None
+
+    client = s3_client()
+    extra = {}
+    if requested is not None:
+        start, end = requested
+        extra["Range"] = f"bytes={start}-{'' if end is None else end}"
+    try:
+        obj = client.get_object(Bucket=settings.MINIO_BUCKET, Key=key, **extra)
+    except ClientError as e:
+        if (e.response.get("Error") or {}).get("Code") != "InvalidRange":
+            raise
+        meta = get_object_meta(key, refresh=True)
+        # Empty objects cannot satisfy any range; serve them whole like the old code did.
+        if strict_range and meta.size > 0:
+            raise RangeNotSatisfiable(meta.size) from e
+        obj = client.get_object(Bucket=settings.MINIO_BUCKET, Key=key)
+
+    length = int(obj.get("ContentLength") or 0)
+    m = _CONTENT_RANGE_RE.match(obj.get("ContentRange") or "")
+    if m and m.group(3) != "*":
+        total = int(m.group(3))
+        status = 206
+        content_range = f"bytes {m.group(1)}-{m.group(2)}/{total}"
+    else:
+        total = length
+        status = 200
+        content_range = None
+
+    meta = _meta_from_response(obj, total)
+    _meta_cache.set(key, meta)
+    return OpenedObject(
+        body=obj["Body"],
+        meta=meta,
+        status=status,
+        content_length=length,
+        content_range=content_range,
+    )
+
+
+_CONDITIONAL_HEADERS = ("HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE", "HTTP_IF_MATCH", "HTTP_IF_UNMODIFIED_SINCE")
+
+
+def has_conditional_headers(request) -> bool:
+    return any(request.META.get(h) for h in _CONDITIONAL_HEADERS)
+
+
+def conditional_response(request, meta: ObjectMeta, headers: dict[str, str] | None = None) -> HttpResponse | None:
+    """
+    304 Not Modified (or 412) when the request's validators match `meta`, else None.
+    `headers` (e.g. Cache-Control) are carried over to the 304 as RFC 9110 requires.
+    """
+    base = HttpResponse()
+    for name, value in {**meta.validator_headers(), **(headers or {})}.items():
+        base[name] = value
+    result = get_conditional_response(
+        request, etag=meta.etag_header, last_modified=meta.last_modified_ts, response=base
+    )
+    return None if result is base else result
+
+
+def effective_range(request, key: str, meta: ObjectMeta | None = None) -> str | None:
+    """
+    The Range header to honour. With If-Range the range only applies while the
+    object is still the one the client has (matching ETag or Last-Modified);
+    otherwise the full object is sent. `meta` skips the metadata lookup when known.
+    """
+    range_header = request.headers.get("Range")
+    if_range = request.headers.get("If-Range")
+    if not range_header or not if_range:
+        return range_header
+    if meta is None:
+        try:
+            meta = get_object_meta(key)
+        except ClientError:
+            return range_header
+    if if_range.startswith(("\"", "W/")):
+        return range_header if meta.etag and if_range == meta.etag_header else None
+    since = parse_http_date_safe(if_range)
+    if since is not None and meta.last_modified_ts is not None and meta.last_modified_ts <= since:
+        return range_header
+    return None
+
+
+def accel_redirect_enabled() -> bool:
+    return bool(getattr(settings, "MINIO_ACCEL_REDIRECT", False))
+
+
+def accel_redirect_response(key: str, content_type: str | None, headers: dict[str, str]) -> HttpResponse:
+    """
+    Offload the body to nginx: an empty response whose X-Accel-Redirect points at the
+    internal nginx location (MINIO_ACCEL_REDIRECT_LOCATION) with a short-lived presigned
+    MinIO path. nginx then streams from MinIO itself, forwarding the client's Range and
+    conditional headers, and the worker is free as soon as this response is returned.
+    nginx keeps Content-Type, Cache-Control and Expires from this response.
+    """
+    expires_in = int(getattr(settings, "MINIO_ACCEL_REDIRECT_EXPIRES", 300))
+    url = urlsplit(presign_get(key, expires_in=expires_in, response_content_type=content_type))
+    location = str(getattr(settings, "MINIO_ACCEL_REDIRECT_LOCATION", "/_minio_internal/")).rstrip("/")
+    resp = HttpResponse()
+    if content_type:
+        resp["Content-Type"] = content_type
+    else:
+        # Let MinIO's stored content type through.
+        del resp["Content-Type"]
+    for name, value in headers.items():
+        resp[name] = value
+    resp["X-Accel-Redirect"] = f"{location}{url.path}?{url.query}"
+    return resp
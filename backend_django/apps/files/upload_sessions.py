@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from apps.files.minio_client import s3_client
+from apps.files.models import MultipartUploadPart, MultipartUploadSession
+
+logger = logging.getLogger(__name__)
+
+# Server-side state of browser multipart uploads (files/multipart/*).
+#
+#   initiate --> active --complete--> completed
+#                  |  \--abort------> aborted
+#                  \--no activity for MULTIPART_SESSION_TTL_HOURS--> aborted by the reaper
+#
+# Every part confirmed by MinIO is recorded, so a client whose tab died can ask
+# files/multipart/status for the parts already stored and continue from there.
+# `manage.py reap_multipart_uploads` (also run by the transcode worker) aborts expired
+# sessions and multipart uploads MinIO still holds without any session (older clients,
+# crashed requests), so orphaned parts do not pile up in the bucket.
+#
+# The table is optional at runtime for initiate/part/complete/abort: without it (schema
+# not applied) they keep working statelessly, as before. part-urls and status hand out
+# access to an upload by its id alone, so they require a session owned by the caller
+# (admins excepted, e.g. to inspect uploads left by older clients).
+
+
+def session_ttl() -> timedelta:
+    return timedelta(hours=float(getattr(settings, "MULTIPART_SESSION_TTL_HOURS", 24)))
+
+
+def start_session(
+    upload_id: str,
+    key: str,
+    content_type: str | None,
+    user_id,
+    file_size: int | None = None,
+    part_size: int | None = None,
+) -> MultipartUploadSession | None:
+    try:
+        return MultipartUploadSession.objects.create(
+            upload_id=upload_id,
+            object_key=key,
+            content_type=content_type,
+            user_id=user_id,
+            file_size=file_size,
+            part_size=part_size,
+            status="active",
+            expires_at=timezone.now() + session_ttl(),
+        )
+    except DatabaseError as e:
+        logger.warning(f"[upload_sessions] Could not record session for {key}: {e}")
+        return None
+
+
+def get_session(upload_id: str) -> MultipartUploadSession | None:
+    try:
+        return MultipartUploadSession.objects.filter(upload_id=upload_id).first()
+    except DatabaseError as e:
+        logger.warning(f"[upload_sessions] Session lookup failed for {upload_id}: {e}")
+        return None
+
+
+def is_admin(user) -> bool:
+    return getattr(user, "role", None) == "admin"
+
+
+def owned_by(session: MultipartUploadSession, user) -> bool:
+    if is_admin(user):
+        return True
+    return session.user_id is not None and str(session.user_id) == str(getattr(user, "id", ""))
+
+
+def record_part(upload_id: str, part_number: int, etag: str, size: int | None) -> None:
+    """Store a confirmed part and extend the session's expiry, in one statement."""
+    now = timezone.now()
+    try:
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                WITH s AS (
+                    UPDATE multipart_upload_sessions
+                    SET expires_at = %s, updated_at = %s
+                    WHERE upload_id = %s AND status = 'active'
+                    RETURNING id
+                )
+                INSERT INTO multipart_upload_parts (session_id, part_number, etag, size, created_at)
+                SELECT id, %s, %s, %s, %s FROM s
+                ON CONFLICT (session_id, part_number)
+                DO UPDATE SET etag = EXCLUDED.etag, size = EXCLUDED.size, created_at = EXCLUDED.created_at
+                """,
+                [now + session_ttl(), now, upload_id, part_number, etag, size, now],
+            )
+    except DatabaseError as e:
+        logger.warning(f"[upload_sessions] Could not record part {part_number} of {upload_id}: {e}")
+
+
+def touch_session(upload_id: str) -> None:
+    """Extend an active session's expiry (parts sent straight to MinIO are not recorded)."""
+    now = timezone.now()
+    try:
+        MultipartUploadSession.objects.filter(upload_id=upload_id, status="active").update(
+            expires_at=now + session_ttl(), updated_at=now
+        )
+    except DatabaseError as e:
+        logger.warning(f"[upload_sessions] Could not touch session {upload_id}: {e}")
+
+
+def session_parts(session: MultipartUploadSession) -> list[dict]:
+    return [
+        {"partNumber": p["part_number"], "etag": p["etag"], "size": p["size"]}
+        for p in MultipartUploadPart.objects.filter(session_id=session.id)
+        .order_by("part_number")
+        .values("part_number", "etag", "size")
+    ]
+
+
+def minio_parts(key: str, upload_id: str) -> list[dict]:
+    """Parts MinIO holds for an upload (authoritative). Raises ClientError (NoSuchUpload)."""
+    client = s3_client()
+    parts: list[dict] = []
+    marker = 0
+    while True:
+        page = client.list_parts(
+            Bucket=settings.MINIO_BUCKET, Key=key, UploadId=upload_id, PartNumberMarker=marker
+        )
+        for p in page.get("Parts", []) or []:
+            parts.append({"partNumber": p["PartNumber"], "etag": p["ETag"], "size": p.get("Size")})
+        if not page.get("IsTruncated"):
+            return parts
+        marker = int(page.get("NextPartNumberMarker") or 0)
+
+
+def finish_session(upload_id: str, status: str) -> None:
+    now = timezone.now()
+    try:
+        MultipartUploadSession.objects.filter(upload_id=upload_id, status="active").update(
+            status=status, completed_at=now, updated_at=now
+        )
+    except DatabaseError as e:
+        logger.warning(f"[upload_sessions] Could not mark {upload_id} {status}: {e}")
+
+
+def _abort(key: str, upload_id: str) -> bool:
+    try:
+        s3_client().abort_multipart_upload(Bucket=settings.MINIO_BUCKET, Key=key, UploadId=upload_id)
+        return True
+    except ClientError as e:
+        code = (e.response.get("Error") or {}).get("Code")
+        if code == "NoSuchUpload":
+            # Already completed/aborted on the MinIO side.
+            return True
+        logger.warning(f"[upload_sessions] Abort of {upload_id} ({key}) failed: {code}")
+        return False
+
+
+def reap_expired_sessions(batch_size: int = 200) -> int:
+    """Abort active sessions past expires_at; returns the number aborted."""
+    now = timezone.now()
+    reaped = 0
+    while True:
+        with transaction.atomic():
+            expired = list(
+                MultipartUploadSession.objects.filter(status="active", expires_at__lt=now)
+                .select_for_update(skip_locked=True)
+                .values("id", "upload_id", "object_key")[:batch_size]
+            )
+            if not expired:
+                return reaped
+            done = [s["id"] for s in expired if _abort(s["object_key"], s["upload_id"])]
+            MultipartUploadSession.objects.filter(id__in=done).update(
+                status="aborted", completed_at=now, updated_at=now
+            )
+            reaped += len(done)
+            if len(done) < len(expired):
+                # MinIO refused some aborts; retry them on the next run.
+                return reaped
+
+
+def reap_orphaned_uploads(older_than: timedelta | None = None) -> int:
+    """Abort multipart uploads in MinIO that are older than the TTL and have no active session."""
+    cutoff = timezone.now() - (older_than or session_ttl())
+    client = s3_client()
+    kwargs: dict = {"Bucket": settings.MINIO_BUCKET}
+    reaped = 0
+    while True:
+        page = client.list_multipart_uploads(**kwargs)
+        stale = [u for u in page.get("Uploads", []) or [] if u.get("Initiated") and u["Initiated"] < cutoff]
+        if stale:
+            try:
+                active = set(
+                    MultipartUploadSession.objects.filter(
+                        upload_id__in=[u["UploadId"] for u in stale], status="active"
+                    ).values_list("upload_id", flat=True)
+                )
+            except DatabaseError:
+                # Without the session table every old upload counts as orphaned.
+                active = set()
+            for u in stale:
+                if u["UploadId"] not in active and _abort(u["Key"], u["UploadId"]):
+                    reaped += 1
+        if not page.get("IsTruncated"):
+            return reaped
+        kwargs["KeyMarker"] = page.get("NextKeyMarker")
+        kwargs["UploadIdMarker"] = page.get("NextUploadIdMarker")
+
+
+def reap_stale_uploads() -> tuple[int, int]:
+    """(expired sessions aborted, orphaned MinIO uploads aborted)."""
+    try:
+        sessions = reap_expired_sessions()
+    except DatabaseError as e:
+        logger.warning(f"[upload_sessions] Session sweep skipped: {e}")
+        sessions = 0
+    return sessions, reap_orphaned_uploads()
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+from apps.files.minio_client import s3_client, transfer_config
+from apps.files.streaming import invalidate_object_meta
+
+logger = logging.getLogger(__name__)
+
+# Streaming multipart/form-data uploads straight into MinIO.
+#
+# Django's default handlers keep a file of up to FILE_UPLOAD_MAX_MEMORY_SIZE (50 MB) in
+# memory (or spool it to a temp file) before the view calls upload_fileobj. With
+# MinioUploadHandler installed, the body is cut into TransferConfig.multipart_chunksize
+# parts while the request is still being read, and parts are uploaded in parallel
+# (TransferConfig.max_concurrency in flight per upload). Peak memory per upload is
+# therefore about (max_concurrency + 1) parts whatever the file size. A file smaller
+# than one part is sent with a single put_object.
+#
+# The view receives a StreamedFile (already stored under `.key`) in request.FILES.
+# With hash_content=True the SHA-256 of the body is computed on the way through
+# (StreamedFile.sha256, used by apps/files/dedup.py).
+
+
+class UploadRejected(Exception):
+    """The upload was refused or failed; `status`/`message` are for the JSON error response."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class StreamedFile(UploadedFile):
+    """An uploaded file whose bytes are already in MinIO (no local copy to read)."""
+
+    def __init__(
+        self,
+        key: str,
+        name: str,
+        content_type: str,
+        size: int,
+        charset: str | None,
+        etag: str | None,
+        sha256: str | None = None,
+    ):
+        super().__init__(file=None, name=name, content_type=content_type, size=size, charset=charset)
+        self.key = key
+        self.etag = etag
+        self.sha256 = sha256
+
+    def open(self, mode=None):
+        raise ValueError("StreamedFile is stored in MinIO and has no local content")
+
+
+_executor_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+_executor_pid: int | None = None
+
+
+def _part_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for part uploads (rebuilt after fork, like s3_client)."""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                max_workers=int(getattr(settings, "MINIO_UPLOAD_WORKERS", 16)),
+                thread_name_prefix="minio-upload",
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _client_error_message(e: ClientError) -> str:
+    code = (e.response.get("Error") or {}).get("Code")
+    message = (e.response.get("Error") or {}).get("Message", "Upload failed")
+    return f"Upload failed: {code} - {message}"
+
+
+class MinioUploadHandler(FileUploadHandler):
+    """
+    Upload handler that writes the `field_name` file straight into MinIO.
+
+    key_for(file_name, content_type) -> object key is called when the file part starts.
+    content_type overrides the part's Content-Type. Files whose content type does not
+    start with content_type_prefix, or that grow beyond max_size, are rejected; the
+    reason is kept in `.error` (the file is then missing from request.FILES).
+    hash_content computes the SHA-256 of the file while it streams.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        request=None,
+        *,
+        key_for: Callable[[str, str], str],
+        content_type: str | None = None,
+        content_type_prefix: str | None = None,
+        content_type_error: str = "File type not allowed",
+        max_size: int | None = None,
+        field_name: str = "file",
+        hash_content: bool = False,
+    ):
+        super().__init__(request)
+        self.key_for = key_for
+        self.forced_content_type = content_type
+        self.content_type_prefix = content_type_prefix
+        self.content_type_error = content_type_error
+        self.max_size = max_size
+        self.target_field = field_name
+        self.hash_content = hash_content
+        self.error: UploadRejected | None = None
+        config = transfer_config()
+        # S3 parts (except the last) must be at least 5 MB.
+        self.part_size = max(int(config.multipart_chunksize), 5 * 1024 * 1024)
+        self.max_in_flight = max(1, int(config.max_concurrency))
+        self._reset()
+
+    def _reset(self) -> None:
+        self.key: str | None = None
+        self._buffer = bytearray()
+        self._received = 0
+        self._upload_id: str | None = None
+        self._in_flight: deque[Future] = deque()
+        self._parts: list[dict] = []
+        self._sha256 = hashlib.sha256() if self.hash_content else None
+
+    # -- FileUploadHandler API --
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        if field_name != self.target_field or self.error is not None:
+            raise SkipFile()
+        self.content_type = self.forced_content_type or content_type or "application/octet-stream"
+        if self.content_type_prefix and not self.content_type.startswith(self.content_type_prefix):
+            self._reject(400, self.content_type_error)
+        if self.max_size is not None and content_length and content_length > self.max_size:
+            self._reject(400, self._too_large_message())
+        self._reset()
+        self.key = self.key_for(file_name, self.content_type)
+
+    def receive_data_chunk(self, raw_data, start):
+        self._received += len(raw_data)
+        if self.max_size is not None and self._received > self.max_size:
+            self._abort()
+            self._reject(400, self._too_large_message())
+        self._buffer += raw_data
+        if self._sha256 is not None:
+            self._sha256.update(raw_data)
+        try:
+            while len(self._buffer) >= self.part_size:
+                with memoryview(self._buffer) as view:
+                    part = bytes(view[: self.part_size])
+                del self._buffer[: self.part_size]
+                self._submit_part(part)
+        except ClientError as e:
+            self._abort()
+            self._reject(500, _client_error_message(e))
+        return None
+
+    def file_complete(self, file_size):
+        client = s3_client()
+        etag = None
+        try:
+            if self._upload_id is None:
+                resp = client.put_object(
+                    Bucket=settings.MINIO_BUCKET, Key=self.key, Body=bytes(self._buffer), ContentType=self.content_type
+                )
+                etag = resp.get("ETag")
+            else:
+                if self._buffer:
+                    self._submit_part(bytes(self._buffer))
+                self._drain(0)
+                parts = sorted(self._parts, key=lambda p: p["PartNumber"])
+                resp = client.complete_multipart_upload(
+                    Bucket=settings.MINIO_BUCKET,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+                etag = resp.get("ETag")
+        except ClientError as e:
+            self._abort()
+            self.error = UploadRejected(500, _client_error_message(e))
+            logger.error(f"[MinioUploadHandler] Upload of {self.key} failed: {self.error.message}")
+            return None
+        finally:
+            self._buffer = bytearray()
+
+        invalidate_object_meta(self.key)
+        sha256 = self._sha256.hexdigest() if self._sha256 is not None else None
+        return StreamedFile(self.key, self.file_name, self.content_type, file_size, self.charset, etag, sha256)
+
+    def upload_interrupted(self):
+        # Client went away mid-request: do not leave an incomplete multipart upload behind.
+        self._abort()
+
+    # -- helpers --
+
+    def _too_large_message(self) -> str:
+        return f"File is too large (max {self.max_size // (1024 * 1024)}MB)"
+
+    def _reject(self, status: int, message: str):
+        self.error = UploadRejected(status, message)
+        raise SkipFile()
+
+    def _submit_part(self, data: bytes) -> None:
+        client = s3_client()
+        if self._upload_id is None:
+            resp = client.create_multipart_upload(
+                Bucket=settings.MINIO_BUCKET, Key=self.key, ContentType=self.content_type
+            )
+            self._upload_id = resp["UploadId"]
+        # Bound memory: wait for a slot before queueing another part.
+        self._drain(self.max_in_flight - 1)
+        part_number = len(self._parts) + len(self._in_flight) + 1
+        self._in_flight.append(_part_executor().submit(self._upload_part, client, part_number, data))
+
+    def _upload_part(self, client, part_number: int, data: bytes) -> dict:
+        resp = client.upload_part(
+            Bucket=settings.MINIO_BUCKET,
+            Key=self.key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return {"ETag": resp["ETag"], "PartNumber": part_number}
+
+    def _drain(self, keep: int) -> None:
+        """Wait until at most `keep` parts are in flight; re-raises a failed part's error."""
+        while len(self._in_flight) > keep:
+            self._parts.append(self._in_flight.popleft().result())
+
+    def _abort(self) -> None:
+        for future in self._in_flight:
+            future.cancel()
+        for future in self._in_flight:
+            try:
+                future.result()
+            except Exception:
+                pass
+        self._in_flight.clear()
+        if self._upload_id is None:
+            return
+        try:
+            s3_client().abort_multipart_upload(Bucket=settings.MINIO_BUCKET, Key=self.key, UploadId=self._upload_id)
+        except ClientError as e:
+            logger.warning(f"[MinioUploadHandler] Could not abort upload {self._upload_id} for {self.key}: {e}")
+        self._upload_id = None
+
+
+def stream_uploads_to_minio(request, **options) -> MinioUploadHandler:
+    """
+    Install a MinioUploadHandler on a (DRF) request before request.FILES / request.data
+    is first accessed; returns the handler so the view can check `.error`.
+    A multipart upload orphaned by a crashed request is left to the bucket's
+    lifecycle / abort policy.
+    """
+    handler = MinioUploadHandler(getattr(request, "_request", request), **options)
+    request.upload_handlers = [handler]
+    return handler
@@ -1,23 +1,39 @@
+from django.conf import settings
 from django.urls import path, re_path
 
 from apps.files import views
 
+if getattr(settings, "FILES_ASYNC_STREAMING", False):
+    # ASGI (uvicorn) deployment: stream/video/hls are served by the async views.
+    from apps.files import async_views
+
+    StreamView = async_views.AsyncStreamObjectView
+    VideoView = async_views.AsyncVideoStreamView
+    HlsView = async_views.AsyncHlsObjectView
+else:
+    StreamView = views.StreamObjectView
+    VideoView = views.VideoStreamView
+    HlsView = views.HlsObjectView
+
 urlpatterns = [
     path("presign", views.PresignDownloadView.as_view()),
     path("presign-upload", views.PresignUploadView.as_view()),
     path("upload", views.DirectUploadView.as_view()),
     path("multipart/initiate", views.MultipartUploadInitiateView.as_view()),
     path("multipart/upload-part", views.MultipartUploadPartView.as_view()),
+    path("multipart/part-urls", views.MultipartUploadPartUrlsView.as_view()),
     path("multipart/complete", views.MultipartUploadCompleteView.as_view()),
     path("multipart/abort", views.MultipartUploadAbortView.as_view()),
+    path("multipart/status", views.MultipartUploadStatusView.as_view()),
     path("folder-contents", views.FolderContentsView.as_view()),
     path("exists", views.ExistsObjectView.as_view()),
     path("object", views.DeleteObjectView.as_view()),
-    re_path(r"^stream/(?P<key>.+)$", views.StreamObjectView.as_view()),
-    re_path(r"^video/(?P<key>.+)$", views.VideoStreamView.as_view()),  # Public video streaming
-    re_path(r"^hls/(?P<key>.+)$", views.HlsObjectView.as_view()),
+    re_path(r"^stream/(?P<key>.+)$", StreamView.as_view()),
+    re_path(r"^video/(?P<key>.+)$", VideoView.as_view()),  # Public video streaming
+    re_path(r"^hls/(?P<key>.+)$", HlsView.as_view()),
     path("transcode-hls", views.TranscodeHlsView.as_view()),
     path("transcode-jobs/<int:job_id>", views.TranscodeJobView.as_view()),
+    path("hls-cache/stats", views.HlsCacheStatsView.as_view()),
 ]
 
 
@@ -2,22 +2,44 @@ from __future__ import annotations
 
 import json
 import mimetypes
-import re
 
 from botocore.exceptions import ClientError
 from django.conf import settings
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework.permissions import AllowAny
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
 
-from apps.files.hls import is_ffmpeg_available, transcode_mp4_to_hls
-from apps.files.minio_client import presign_get, presign_put, s3_client
+from apps.files import dedup, segment_cache, upload_sessions
+from apps.files.hls import is_ffmpeg_available
+from apps.files.hls_playlist import signed_playlist, signed_segments_enabled
+from apps.files.jobs import enqueue_transcode, is_final_output_key, output_prefix_for
+from apps.files.minio_client import (
+    presign_get,
+    presign_many,
+    presign_put,
+    presign_upload_parts,
+    s3_client,
+    transfer_config,
+)
 from apps.files.models import VideoTranscodeJob
+from apps.files.streaming import (
+    RangeNotSatisfiable,
+    accel_redirect_enabled,
+    accel_redirect_response,
+    conditional_response,
+    effective_range,
+    get_object_meta,
+    has_conditional_headers,
+    invalidate_object_meta,
+    is_not_found,
+    open_object,
+    parse_range,
+)
+from apps.files.uploads import StreamedFile, stream_uploads_to_minio
 from apps.stations.views import IsAdmin
 
 
-_RANGE_RE = re.compile(r"bytes=(\d+)-(\d+)?")
 _VIDEO_EXTENSIONS = {'.mp4', '.webm', '.ogg', '.ogv', '.mov', '.avi', '.mkv', '.flv', '.wmv'}
 _VIDEO_MIME_TYPES = {
     'video/mp4', 'video/webm', 'video/ogg', 'video/quicktime',
@@ -99,6 +121,17 @@ class PresignUploadView(APIView):
         return JsonResponse({"url": url})
 
 
+def _flag(value) -> bool:
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _optional_int(value) -> int | None:
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
 class MultipartUploadInitiateView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -120,7 +153,22 @@ class MultipartUploadInitiateView(APIView):
             upload_id = response.get("UploadId")
             if not upload_id:
                 return JsonResponse({"error": "Failed to initiate multipart upload"}, status=500)
-            return JsonResponse({"uploadId": upload_id, "key": key, "bucket": settings.MINIO_BUCKET})
+            session = upload_sessions.start_session(
+                upload_id,
+                key,
+                content_type,
+                getattr(request.user, "id", None),
+                file_size=_optional_int(request.data.get("fileSize")),
+                part_size=int(getattr(settings, "MULTIPART_CHUNK_SIZE", 10 * 1024 * 1024)),
+            )
+            return JsonResponse(
+                {
+                    "uploadId": upload_id,
+                    "key": key,
+                    "bucket": settings.MINIO_BUCKET,
+                    "expiresAt": session.expires_at.isoformat() if session else None,
+                }
+            )
         except ClientError as e:
             code = (e.response.get("Error") or {}).get("Code")
             message = (e.response.get("Error") or {}).get("Message", "Upload failed")
@@ -170,6 +218,7 @@ class MultipartUploadPartView(APIView):
             etag = response.get("ETag")
             if not etag:
                 return JsonResponse({"error": "Missing ETag from upload_part"}, status=500)
+            upload_sessions.record_part(upload_id, part_number, etag, getattr(file_obj, "size", None))
             return JsonResponse({"etag": etag, "partNumber": part_number})
         except ClientError as e:
             code = (e.response.get("Error") or {}).get("Code")
@@ -177,6 +226,55 @@ class MultipartUploadPartView(APIView):
             return JsonResponse({"error": f"Upload failed: {code} - {message}"}, status=500)
 
 
+class MultipartUploadPartUrlsView(APIView):
+    """
+    POST /files/multipart/part-urls {key, uploadId, partNumbers: [..]}
+    Presigned upload_part URLs, so the browser PUTs parts straight to MinIO (through the
+    /api/minio/ proxy) instead of sending every chunk through a Django worker. The ETag of
+    each PUT response is then passed to files/multipart/complete as usual.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        key = (request.data.get("key") or "").lstrip("/")
+        upload_id = request.data.get("uploadId")
+        part_numbers = request.data.get("partNumbers")
+        if not key or not upload_id or not isinstance(part_numbers, list) or not part_numbers:
+            return JsonResponse({"error": "Missing key, uploadId, or partNumbers"}, status=400)
+
+        max_batch = int(getattr(settings, "MULTIPART_PART_URL_BATCH", 100))
+        if len(part_numbers) > max_batch:
+            return JsonResponse({"error": f"Too many parts requested (max {max_batch})"}, status=400)
+        numbers = [_optional_int(n) for n in part_numbers]
+        # S3 part numbers are 1..10000
+        if any(n is None or n < 1 or n > 10000 for n in numbers):
+            return JsonResponse({"error": "Invalid partNumbers"}, status=400)
+
+        session = upload_sessions.get_session(upload_id)
+        if session is None:
+            # Without a session row the caller cannot be checked against the upload's owner.
+            if not upload_sessions.is_admin(request.user):
+                return JsonResponse({"error": "Upload not found"}, status=404)
+        else:
+            if not upload_sessions.owned_by(session, request.user) or session.object_key != key:
+                return JsonResponse({"error": "Upload not found"}, status=404)
+            if session.status != "active":
+                return JsonResponse({"error": f"Upload is {session.status}"}, status=409)
+            upload_sessions.touch_session(upload_id)
+
+        expires_in = int(getattr(settings, "MULTIPART_PART_URL_TTL_SEC", 3600))
+        urls = presign_upload_parts(key, upload_id, sorted(set(numbers)), expires_in)
+        return JsonResponse(
+            {
+                "uploadId": upload_id,
+                "key": key,
+                "urls": [{"partNumber": n, "url": url} for n, url in urls.items()],
+                "expiresIn": expires_in,
+            }
+        )
+
+
 class MultipartUploadCompleteView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -185,10 +283,18 @@ class MultipartUploadCompleteView(APIView):
         upload_id = request.data.get("uploadId")
         parts = request.data.get("parts")
         content_type = request.data.get("contentType") or None
+        use_dedup = _flag(request.data.get("dedup")) and dedup.dedup_enabled()
 
-        if not key or not upload_id or parts is None:
+        if not key or not upload_id:
             return JsonResponse({"error": "Missing key, uploadId, or parts"}, status=400)
 
+        if parts is None:
+            # Resumed uploads may complete with the parts recorded server-side.
+            session = upload_sessions.get_session(upload_id)
+            if session is None or not upload_sessions.owned_by(session, request.user):
+                return JsonResponse({"error": "Missing key, uploadId, or parts"}, status=400)
+            parts = upload_sessions.session_parts(session)
+
         if isinstance(parts, str):
             try:
                 parts = json.loads(parts)
@@ -210,14 +316,24 @@ class MultipartUploadCompleteView(APIView):
         key = key.lstrip("/")
         client = s3_client()
         try:
-            client.complete_multipart_upload(
+            completed = client.complete_multipart_upload(
                 Bucket=settings.MINIO_BUCKET,
                 Key=key,
                 UploadId=upload_id,
                 MultipartUpload={"Parts": parts_payload},
             )
-            url = presign_get(key, expires_in=60 * 60 * 24 * 7, response_content_type=content_type)
-            return JsonResponse({"key": key, "url": url})
+            invalidate_object_meta(key)
+            upload_sessions.finish_session(upload_id, "completed")
+            payload = {"key": key}
+            content_hash = dedup.multipart_hash(completed.get("ETag")) if use_dedup else None
+            if content_hash:
+                size = get_object_meta(key, refresh=True).size
+                result = dedup.register_upload(content_hash, size, key, content_type)
+                payload = {"key": result.key, "contentHash": content_hash, "deduplicated": result.deduplicated}
+            payload["url"] = presign_get(
+                payload["key"], expires_in=60 * 60 * 24 * 7, response_content_type=content_type
+            )
+            return JsonResponse(payload)
         except ClientError as e:
             code = (e.response.get("Error") or {}).get("Code")
             message = (e.response.get("Error") or {}).get("Message", "Upload failed")
@@ -241,6 +357,7 @@ class MultipartUploadAbortView(APIView):
                 Key=key,
                 UploadId=upload_id,
             )
+            upload_sessions.finish_session(upload_id, "aborted")
             return JsonResponse({"ok": True})
         except ClientError as e:
             code = (e.response.get("Error") or {}).get("Code")
@@ -248,93 +365,218 @@ class MultipartUploadAbortView(APIView):
             return JsonResponse({"error": f"Upload failed: {code} - {message}"}, status=500)
 
 
+class MultipartUploadStatusView(APIView):
+    """
+    GET /files/multipart/status?uploadId=...&key=...
+    Parts already stored for an upload, so an interrupted client can resume from the
+    first missing part. Parts come from the session table; with verify=1 (or, for admins,
+    when no session was recorded) they are read from MinIO itself.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        upload_id = request.query_params.get("uploadId")
+        key = (request.query_params.get("key") or "").lstrip("/")
+        if not upload_id:
+            return JsonResponse({"error": "Missing uploadId"}, status=400)
+
+        session = upload_sessions.get_session(upload_id)
+        if session is not None:
+            if not upload_sessions.owned_by(session, request.user):
+                return JsonResponse({"error": "Upload not found"}, status=404)
+            key = session.object_key
+        elif not key or not upload_sessions.is_admin(request.user):
+            # Only admins may look up uploads that have no session row.
+            return JsonResponse({"error": "Upload not found"}, status=404)
+
+        status = session.status if session is not None else "active"
+        parts: list[dict] = []
+        if status == "active":
+            verify = request.query_params.get("verify") in ("1", "true")
+            if session is not None and not verify:
+                parts = upload_sessions.session_parts(session)
+            else:
+                try:
+                    parts = upload_sessions.minio_parts(key, upload_id)
+                except ClientError as e:
+                    code = (e.response.get("Error") or {}).get("Code")
+                    if code == "NoSuchUpload":
+                        return JsonResponse({"error": "Upload not found"}, status=404)
+                    return JsonResponse({"error": f"Status failed: {code}"}, status=500)
+
+        numbers = {p["partNumber"] for p in parts}
+        next_part = 1
+        while next_part in numbers:
+            next_part += 1
+        return JsonResponse(
+            {
+                "uploadId": upload_id,
+                "key": key,
+                "status": status,
+                "contentType": session.content_type if session else None,
+                "fileSize": session.file_size if session else None,
+                "partSize": session.part_size if session else None,
+                "parts": parts,
+                "uploadedBytes": sum(p.get("size") or 0 for p in parts),
+                "nextPartNumber": next_part,
+                "expiresAt": session.expires_at.isoformat() if session else None,
+            }
+        )
+
+
+_FOLDER_PAGE_MAX = 1000
+
+
+def _folder_entries(page: dict) -> list[dict]:
+    folders = []
+    for cp in page.get("CommonPrefixes", []) or []:
+        p = (cp.get("Prefix") or "").rstrip("/")
+        name = p.split("/")[-1] if p else ""
+        if not name:
+            continue
+        folders.append({"name": name, "path": p, "isFolder": True})
+    return folders
+
+
+def _file_entries(page: dict, with_urls: bool = True) -> list[dict]:
+    """File entries for one list_objects_v2 page; URLs are batch-presigned for this page only."""
+    items = [
+        item
+        for item in page.get("Contents", []) or []
+        if item.get("Key") and not item["Key"].endswith("/")
+    ]
+    content_types = {
+        item["Key"]: mimetypes.guess_type(item["Key"].split("/")[-1])[0] or "application/octet-stream"
+        for item in items
+    }
+    urls = {}
+    if with_urls and items:
+        urls = presign_many(content_types.keys(), expires_in=60 * 60 * 24 * 7, response_content_types=content_types)
+
+    files = []
+    for item in items:
+        key = item["Key"]
+        file_name = key.split("/")[-1]
+        url = urls.get(key)
+        files.append(
+            {
+                "objectName": key,
+                "fileName": file_name,
+                "originalName": file_name,
+                "original_name": file_name,
+                "size": item.get("Size"),
+                "file_size": item.get("Size"),
+                "type": content_types[key],
+                "url": url,
+                "file_url": url,
+                "lastModified": item.get("LastModified"),
+                "uploaded_at": item.get("LastModified"),
+            }
+        )
+    return files
+
+
 class FolderContentsView(APIView):
+    """
+    GET /files/folder-contents?prefix=...
+
+    Modes:
+      - default: whole folder in one JSON body (all MinIO pages, nothing truncated);
+      - paged:   ?limit=N[&cursor=...] -> one page + nextCursor (MinIO continuation token);
+      - stream:  ?stream=1 -> NDJSON, one JSON object per line, emitted as MinIO pages arrive,
+                 each tagged with "kind" (folder/file), ending with {"kind": "end", ...}.
+    ?urls=lazy skips presigning (clients fetch /files/presign?key=... on demand);
+    otherwise URLs are batch-presigned per page.
+    """
+
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         prefix = (request.query_params.get("prefix") or "").lstrip("/")
         clean_prefix = prefix.rstrip("/")
         list_prefix = f"{clean_prefix}/" if clean_prefix else ""
+        with_urls = (request.query_params.get("urls") or "").lower() != "lazy"
+        cursor = request.query_params.get("cursor") or None
+        limit_param = request.query_params.get("limit")
+
+        try:
+            limit = int(limit_param) if limit_param else _FOLDER_PAGE_MAX
+        except ValueError:
+            return JsonResponse({"error": "Invalid limit"}, status=400)
+        limit = max(1, min(limit, _FOLDER_PAGE_MAX))
 
         client = s3_client()
-        response = client.list_objects_v2(
-            Bucket=settings.MINIO_BUCKET,
-            Prefix=list_prefix,
-            Delimiter="/",
-            MaxKeys=1000,
-        )
+        list_kwargs = {"Bucket": settings.MINIO_BUCKET, "Prefix": list_prefix, "Delimiter": "/"}
 
-        folders = []
-        for cp in response.get("CommonPrefixes", []) or []:
-            p = (cp.get("Prefix") or "").rstrip("/")
-            name = p.split("/")[-1] if p else ""
-            if not name:
-                continue
-            folders.append({"name": name, "path": p, "isFolder": True})
+        # Not "?format=": DRF reserves that query parameter for renderer negotiation.
+        if (request.query_params.get("stream") or "").lower() in ("1", "true", "ndjson"):
+            pages = _iter_list_pages(client, list_kwargs, limit, cursor)
+            resp = StreamingHttpResponse(
+                _ndjson_folder_stream(pages, with_urls), content_type="application/x-ndjson"
+            )
+            resp["Cache-Control"] = "no-cache"
+            resp["X-Accel-Buffering"] = "no"
+            return resp
 
-        files = []
-        for item in response.get("Contents", []) or []:
-            key = item.get("Key")
-            if not key or key.endswith("/"):
-                continue
-            file_name = key.split("/")[-1]
-            content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
-            url = presign_get(key, expires_in=60 * 60 * 24 * 7, response_content_type=content_type)
-            files.append(
+        if limit_param or cursor:
+            if cursor:
+                list_kwargs["ContinuationToken"] = cursor
+            try:
+                page = client.list_objects_v2(**list_kwargs, MaxKeys=limit)
+            except ClientError as e:
+                code = (e.response.get("Error") or {}).get("Code")
+                if code in ("InvalidArgument", "InvalidToken"):
+                    return JsonResponse({"error": "Invalid cursor"}, status=400)
+                raise
+            truncated = bool(page.get("IsTruncated"))
+            return JsonResponse(
                 {
-                    "objectName": key,
-                    "fileName": file_name,
-                    "originalName": file_name,
-                    "original_name": file_name,
-                    "size": item.get("Size"),
-                    "file_size": item.get("Size"),
-                    "type": content_type,
-                    "url": url,
-                    "file_url": url,
-                    "lastModified": item.get("LastModified"),
-                    "uploaded_at": item.get("LastModified"),
+                    "folders": _folder_entries(page),
+                    "files": _file_entries(page, with_urls),
+                    "nextCursor": page.get("NextContinuationToken") if truncated else None,
+                    "isTruncated": truncated,
                 }
             )
 
-        return JsonResponse({"folders": folders, "files": files})
+        folders = []
+        files = []
+        for page in _iter_list_pages(client, list_kwargs, _FOLDER_PAGE_MAX):
+            folders.extend(_folder_entries(page))
+            files.extend(_file_entries(page, with_urls))
 
+        return JsonResponse({"folders": folders, "files": files, "isTruncated": False})
 
-def _parse_range_header(range_header: str, total_size: int) -> tuple[int | None, int | None]:
-    """
-    Parse Range header and return (start, end) tuple.
-    Returns (None, None) if invalid or out of range.
-    """
-    if not range_header:
-        return None, None
-    
-    m = _RANGE_RE.match(range_header)
-    if not m:
-        return None, None
-    
+
+def _iter_list_pages(client, list_kwargs: dict, page_size: int, cursor: str | None = None):
+    """Lazily yield list_objects_v2 pages, following MinIO continuation tokens."""
+    token = cursor
+    while True:
+        kwargs = dict(list_kwargs, MaxKeys=page_size)
+        if token:
+            kwargs["ContinuationToken"] = token
+        page = client.list_objects_v2(**kwargs)
+        yield page
+        token = page.get("NextContinuationToken")
+        if not page.get("IsTruncated") or not token:
+            return
+
+
+def _ndjson_folder_stream(pages, with_urls: bool):
+    from django.core.serializers.json import DjangoJSONEncoder
+
+    count = 0
     try:
-        start = int(m.group(1))
-        end_str = m.group(2)
-        
-        # Validate start
-        if start < 0:
-            return None, None
-        if start >= total_size:
-            return None, None
-        
-        # Parse end
-        if end_str:
-            end = int(end_str)
-            if end < start:
-                return None, None
-            if end >= total_size:
-                end = total_size - 1
-        else:
-            # No end specified - stream to the end
-            end = total_size - 1
-        
-        return start, end
-    except (ValueError, TypeError):
-        return None, None
+        for page in pages:
+            lines = [{"kind": "folder", **entry} for entry in _folder_entries(page)]
+            lines += [{"kind": "file", **entry} for entry in _file_entries(page, with_urls)]
+            count += len(lines)
+            if lines:
+                yield "".join(json.dumps(line, cls=DjangoJSONEncoder) + "\n" for line in lines)
+        yield json.dumps({"kind": "end", "count": count}) + "\n"
+    except ClientError as e:
+        code = (e.response.get("Error") or {}).get("Code")
+        yield json.dumps({"kind": "error", "error": f"MinIO error: {code}", "count": count}) + "\n"
 
 
 def _get_content_type(key: str, obj_content_type: str | None) -> str:
@@ -373,6 +615,111 @@ def _is_video(content_type: str, key: str) -> bool:
     return any(key_lower.endswith(ext) for ext in _VIDEO_EXTENSIONS)
 
 
+_VIDEO_CACHE_CONTROL = "public, max-age=86400, must-revalidate"  # 24 hours
+
+
+def _stream_cache_control(content_type: str, key: str) -> str:
+    if _is_video(content_type, key):
+        # Видео: кэшируем долго, но с revalidation
+        return _VIDEO_CACHE_CONTROL
+    if content_type == "application/pdf":
+        return "private, no-cache, no-store, must-revalidate"
+    # Другие файлы: умеренное кэширование
+    return "public, max-age=3600"  # 1 hour
+
+
+def _hls_cache_control(key: str) -> str:
+    # Output of a finished transcode job never changes (a re-transcode gets a new prefix).
+    if is_final_output_key(key):
+        return "public, max-age=31536000, immutable"
+    return "public, max-age=86400"  # 24 hours
+
+
+def _signed_playlist_response(text: str, max_age: int) -> HttpResponse:
+    resp = HttpResponse(text, content_type="application/vnd.apple.mpegurl")
+    resp["Access-Control-Allow-Origin"] = "*"
+    resp["Access-Control-Allow-Methods"] = "GET, HEAD, OPTIONS"
+    resp["Access-Control-Allow-Headers"] = "Range, Content-Type"
+    # The embedded segment URLs expire: cache the playlist only until the signing window ends.
+    resp["Cache-Control"] = f"public, max-age={max_age}"
+    return resp
+
+
+def _accel_content_type(key: str) -> str | None:
+    """Content type from the key's extension for offloaded responses; None = MinIO's stored type."""
+    guessed = _get_content_type(key, None)
+    return None if guessed == "application/octet-stream" else guessed
+
+
+def _check_not_modified(request, key: str, cache_control) -> HttpResponse | None:
+    """
+    304 (or 412) for conditional requests, decided from object metadata (cached or one
+    head_object) so that no MinIO body stream is opened. None = serve normally.
+    `cache_control` is a string or a callable taking the ObjectMeta.
+    """
+    if not has_conditional_headers(request):
+        return None
+    try:
+        meta = get_object_meta(key)
+    except ClientError:
+        # Let the regular path produce the 404/500.
+        return None
+    value = cache_control(meta) if callable(cache_control) else cache_control
+    return conditional_response(request, meta, {"Cache-Control": value})
+
+
+def _iter_file_range(f, start: int, length: int, chunk_size: int = 512 * 1024):
+    try:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def _segment_cache_response(request, key: str, cached, cache_control: str, stream_file=None) -> HttpResponse:
+    """
+    Serve an HLS object from the local disk cache (apps/files/segment_cache.py).
+    `stream_file(f, start, length)` replaces the sync body (FileResponse / generator):
+    the ASGI view passes an async generator, since Django would buffer a sync iterator.
+    """
+    meta = cached.meta
+    not_modified = conditional_response(request, meta, {"Cache-Control": cache_control})
+    if not_modified is not None:
+        cached.file.close()
+        return not_modified
+
+    content_type = meta.content_type or mimetypes.guess_type(key)[0] or "application/octet-stream"
+    requested = parse_range(effective_range(request, key, meta))
+    if requested is not None and requested[0] < meta.size:
+        start, end = requested
+        end = meta.size - 1 if end is None else min(end, meta.size - 1)
+        body = (stream_file or _iter_file_range)(cached.file, start, end - start + 1)
+        resp = StreamingHttpResponse(body, status=206, content_type=content_type)
+        resp["Content-Length"] = str(end - start + 1)
+        resp["Content-Range"] = f"bytes {start}-{end}/{meta.size}"
+    elif stream_file is not None:
+        resp = StreamingHttpResponse(stream_file(cached.file, 0, meta.size), content_type=content_type)
+        resp["Content-Length"] = str(meta.size)
+    else:
+        # Whole file: FileResponse lets gunicorn use sendfile().
+        resp = FileResponse(cached.file, content_type=content_type)
+        resp["Content-Length"] = str(meta.size)
+    resp["Accept-Ranges"] = "bytes"
+    resp["Access-Control-Allow-Origin"] = "*"
+    resp["Access-Control-Allow-Methods"] = "GET, HEAD, OPTIONS"
+    resp["Access-Control-Allow-Headers"] = "Range, Content-Type"
+    resp["Access-Control-Expose-Headers"] = "Content-Length, Content-Range, Accept-Ranges"
+    resp["Cache-Control"] = cache_control
+    for name, value in meta.validator_headers().items():
+        resp[name] = value
+    return resp
+
+
 class StreamObjectView(APIView):
     """
     Secure streaming endpoint for PDF, video, and other files from MinIO.
@@ -397,17 +744,15 @@ class StreamObjectView(APIView):
         if not key:
             return JsonResponse({"error": "Missing key"}, status=400)
         
-        client = s3_client()
         try:
-            head_obj = client.head_object(Bucket=settings.MINIO_BUCKET, Key=key)
+            meta = get_object_meta(key)
         except ClientError as e:
-            code = (e.response.get("Error") or {}).get("Code")
-            if code in ("NoSuchKey", "404", "NotFound"):
+            if is_not_found(e):
                 return JsonResponse({"error": "File not found"}, status=404)
             return JsonResponse({"error": "Failed to retrieve file"}, status=500)
         
-        content_type = _get_content_type(key, head_obj.get("ContentType"))
-        content_length = head_obj.get("ContentLength", 0)
+        content_type = _get_content_type(key, meta.content_type)
+        content_length = meta.size
         
         response = JsonResponse({}, status=200)
         response["Content-Type"] = content_type
@@ -425,8 +770,10 @@ class StreamObjectView(APIView):
             response["Cache-Control"] = "private, no-cache, no-store, must-revalidate"
         else:
             response["Cache-Control"] = "public, max-age=3600"
+        for name, value in meta.validator_headers().items():
+            response[name] = value
         
-        return response
+        return conditional_response(request, meta, {"Cache-Control": response["Cache-Control"]}) or response
 
     def options(self, request, key: str):
         """Handle CORS preflight requests"""
@@ -455,70 +802,43 @@ class StreamObjectView(APIView):
         
         logger.debug(f"[StreamObjectView] Streaming file: {key}")
         
-        client = s3_client()
-        range_header = request.headers.get("Range")
-
-        # First, get object metadata to determine total size
-        try:
-            head_obj = client.head_object(Bucket=settings.MINIO_BUCKET, Key=key)
-            total_size = head_obj.get("ContentLength", 0)
-        except ClientError as e:
-            code = (e.response.get("Error") or {}).get("Code")
-            logger.error(f"[StreamObjectView] MinIO error for key {key}: {code}")
-            if code in ("NoSuchKey", "404", "NotFound"):
-                return JsonResponse({"error": "File not found"}, status=404)
-            return JsonResponse({"error": "Failed to retrieve file"}, status=500)
-        except Exception as e:
-            logger.exception(f"[StreamObjectView] Unexpected error for key {key}: {e}")
-            return JsonResponse({"error": "Internal server error"}, status=500)
-
-        # Parse range header
-        start = None
-        end = None
-        status_code = 200
-        content_range = None
-        
-        if range_header and total_size > 0:
-            start, end = _parse_range_header(range_header, total_size)
-            if start is not None and end is not None:
-                status_code = 206  # Partial Content
-                content_range = f"bytes {start}-{end}/{total_size}"
-                logger.debug(f"[StreamObjectView] Range request: {start}-{end} (total: {total_size})")
-            else:
-                # Invalid range - return 416 Range Not Satisfiable
-                response = JsonResponse({"error": "Range Not Satisfiable"}, status=416)
-                response["Content-Range"] = f"bytes */{total_size}"
-                response["Accept-Ranges"] = "bytes"
-                return response
+        not_modified = _check_not_modified(
+            request, key, lambda meta: _stream_cache_control(_get_content_type(key, meta.content_type), key)
+        )
+        if not_modified is not None:
+            return not_modified
 
-        # Prepare MinIO request
-        extra = {}
-        if start is not None and end is not None:
-            extra["Range"] = f"bytes={start}-{end}"
+        if accel_redirect_enabled():
+            content_type = _accel_content_type(key)
+            return accel_redirect_response(
+                key, content_type, {"Cache-Control": _stream_cache_control(content_type or "", key)}
+            )
 
+        # Single round-trip: the Range header goes straight to get_object.
         try:
-            # Получаем объект из MinIO
-            obj = client.get_object(Bucket=settings.MINIO_BUCKET, Key=key, **extra)
+            opened = open_object(key, effective_range(request, key))
+        except RangeNotSatisfiable as e:
+            response = JsonResponse({"error": "Range Not Satisfiable"}, status=416)
+            response["Content-Range"] = f"bytes */{e.size}"
+            response["Accept-Ranges"] = "bytes"
+            return response
         except ClientError as e:
             code = (e.response.get("Error") or {}).get("Code")
             logger.error(f"[StreamObjectView] MinIO get_object error for key {key}: {code}")
-            if code in ("NoSuchKey", "404", "NotFound"):
+            if is_not_found(e):
                 return JsonResponse({"error": "File not found"}, status=404)
             return JsonResponse({"error": "Failed to retrieve file"}, status=500)
         except Exception as e:
             logger.exception(f"[StreamObjectView] Unexpected error for key {key}: {e}")
             return JsonResponse({"error": "Internal server error"}, status=500)
 
-        body = obj["Body"]
+        body = opened.iter_body()
+        status_code = opened.status
+        content_range = opened.content_range
+        content_length = opened.content_length
         
         # Определяем Content-Type
-        content_type = _get_content_type(key, obj.get("ContentType"))
-        content_length = obj.get("ContentLength")
-        
-        # Если это range request, content_length уже правильный для части
-        # Но для полного файла используем total_size
-        if status_code == 200:
-            content_length = total_size
+        content_type = _get_content_type(key, opened.meta.content_type)
 
         # Создаем streaming response
         resp = StreamingHttpResponse(body, status=status_code, content_type=content_type)
@@ -537,19 +857,13 @@ class StreamObjectView(APIView):
         resp["Access-Control-Expose-Headers"] = "Content-Length, Content-Range, Accept-Ranges"
         
         # Оптимизированное кэширование
-        is_video = _is_video(content_type, key)
-        if is_video:
-            # Видео: кэшируем долго, но с revalidation
-            resp["Cache-Control"] = "public, max-age=86400, must-revalidate"  # 24 hours
-            resp["ETag"] = head_obj.get("ETag", "").strip('"')
-        elif content_type == "application/pdf":
+        resp["Cache-Control"] = _stream_cache_control(content_type, key)
+        if content_type == "application/pdf":
             # PDF: не кэшируем для безопасности
-            resp["Cache-Control"] = "private, no-cache, no-store, must-revalidate"
             resp["Pragma"] = "no-cache"
             resp["Expires"] = "0"
-        else:
-            # Другие файлы: умеренное кэширование
-            resp["Cache-Control"] = "public, max-age=3600"  # 1 hour
+        for name, value in opened.meta.validator_headers().items():
+            resp[name] = value
         
         logger.debug(f"[StreamObjectView] Streaming {content_type} file: {key}, size: {content_length}, range: {content_range}")
         return resp
@@ -579,17 +893,15 @@ class VideoStreamView(APIView):
         if not key:
             return JsonResponse({"error": "Missing key"}, status=400)
         
-        client = s3_client()
         try:
-            head_obj = client.head_object(Bucket=settings.MINIO_BUCKET, Key=key)
+            meta = get_object_meta(key)
         except ClientError as e:
-            code = (e.response.get("Error") or {}).get("Code")
-            if code in ("NoSuchKey", "404", "NotFound"):
+            if is_not_found(e):
                 return JsonResponse({"error": "File not found"}, status=404)
             return JsonResponse({"error": "Failed to retrieve file"}, status=500)
         
-        content_type = _get_content_type(key, head_obj.get("ContentType"))
-        content_length = head_obj.get("ContentLength", 0)
+        content_type = _get_content_type(key, meta.content_type)
+        content_length = meta.size
         
         response = JsonResponse({}, status=200)
         response["Content-Type"] = content_type
@@ -600,10 +912,10 @@ class VideoStreamView(APIView):
         response["Access-Control-Allow-Headers"] = "Range, Content-Type"
         response["Access-Control-Expose-Headers"] = "Content-Length, Content-Range, Accept-Ranges"
         response["Cache-Control"] = "public, max-age=86400"  # 24 hours for video
-        if head_obj.get("ETag"):
-            response["ETag"] = head_obj.get("ETag", "").strip('"')
+        for name, value in meta.validator_headers().items():
+            response[name] = value
         
-        return response
+        return conditional_response(request, meta, {"Cache-Control": response["Cache-Control"]}) or response
 
     def options(self, request, key: str):
         """Handle CORS preflight requests"""
@@ -631,60 +943,33 @@ class VideoStreamView(APIView):
         
         logger.debug(f"[VideoStreamView] Streaming video: {key}")
         
-        client = s3_client()
-        range_header = request.headers.get("Range")
-
-        # Get object metadata first
-        try:
-            head_obj = client.head_object(Bucket=settings.MINIO_BUCKET, Key=key)
-            total_size = head_obj.get("ContentLength", 0)
-        except ClientError as e:
-            code = (e.response.get("Error") or {}).get("Code")
-            logger.error(f"[VideoStreamView] MinIO error for key {key}: {code}")
-            if code in ("NoSuchKey", "404", "NotFound"):
-                return JsonResponse({"error": "File not found"}, status=404)
-            return JsonResponse({"error": "Failed to retrieve file"}, status=500)
+        not_modified = _check_not_modified(request, key, _VIDEO_CACHE_CONTROL)
+        if not_modified is not None:
+            return not_modified
 
-        # Parse range header
-        start = None
-        end = None
-        status_code = 200
-        content_range = None
-        
-        if range_header and total_size > 0:
-            start, end = _parse_range_header(range_header, total_size)
-            if start is not None and end is not None:
-                status_code = 206  # Partial Content
-                content_range = f"bytes {start}-{end}/{total_size}"
-                logger.debug(f"[VideoStreamView] Range request: {start}-{end} (total: {total_size})")
-            else:
-                # Invalid range - return 416 Range Not Satisfiable
-                response = JsonResponse({"error": "Range Not Satisfiable"}, status=416)
-                response["Content-Range"] = f"bytes */{total_size}"
-                response["Accept-Ranges"] = "bytes"
-                response["Access-Control-Allow-Origin"] = "*"
-                return response
-
-        # Prepare MinIO request
-        extra = {}
-        if start is not None and end is not None:
-            extra["Range"] = f"bytes={start}-{end}"
+        if accel_redirect_enabled():
+            return accel_redirect_response(key, _accel_content_type(key), {"Cache-Control": _VIDEO_CACHE_CONTROL})
 
         try:
-            obj = client.get_object(Bucket=settings.MINIO_BUCKET, Key=key, **extra)
+            opened = open_object(key, effective_range(request, key))
+        except RangeNotSatisfiable as e:
+            response = JsonResponse({"error": "Range Not Satisfiable"}, status=416)
+            response["Content-Range"] = f"bytes */{e.size}"
+            response["Accept-Ranges"] = "bytes"
+            response["Access-Control-Allow-Origin"] = "*"
+            return response
         except ClientError as e:
             code = (e.response.get("Error") or {}).get("Code")
             logger.error(f"[VideoStreamView] MinIO get_object error for key {key}: {code}")
-            if code in ("NoSuchKey", "404", "NotFound"):
+            if is_not_found(e):
                 return JsonResponse({"error": "File not found"}, status=404)
             return JsonResponse({"error": "Failed to retrieve file"}, status=500)
 
-        body = obj["Body"]
-        content_type = _get_content_type(key, obj.get("ContentType"))
-        content_length = obj.get("ContentLength")
-        
-        if status_code == 200:
-            content_length = total_size
+        body = opened.iter_body()
+        status_code = opened.status
+        content_range = opened.content_range
+        content_length = opened.content_length
+        content_type = _get_content_type(key, opened.meta.content_type)
 
         resp = StreamingHttpResponse(body, status=status_code, content_type=content_type)
         resp["Accept-Ranges"] = "bytes"
@@ -700,9 +985,9 @@ class VideoStreamView(APIView):
         resp["Access-Control-Expose-Headers"] = "Content-Length, Content-Range, Accept-Ranges"
         
         # Optimized caching for video
-        resp["Cache-Control"] = "public, max-age=86400, must-revalidate"  # 24 hours
-        if head_obj.get("ETag"):
-            resp["ETag"] = head_obj.get("ETag", "").strip('"')
+        resp["Cache-Control"] = _VIDEO_CACHE_CONTROL
+        for name, value in opened.meta.validator_headers().items():
+            resp[name] = value
         
         logger.debug(f"[VideoStreamView] Streaming {content_type} video: {key}, size: {content_length}, range: {content_range}")
         return resp
@@ -713,6 +998,11 @@ class HlsObjectView(APIView):
     Public proxy for HLS playlists and segments stored in MinIO.
     Important: HLS playlists contain relative segment URLs; presigned URLs break that,
     so we serve via a stable Django path that can resolve relative references.
+    With HLS_SIGNED_SEGMENTS, media playlists are rewritten to presigned segment URLs
+    (apps/files/hls_playlist.py) and segments bypass Django entirely.
+    With HLS_DISK_CACHE_DIR, output of finished jobs is served from a local disk cache
+    (apps/files/segment_cache.py); signed segments are then disabled, so segments
+    come through here and hit the cache.
     Optimized for range requests and caching.
     """
 
@@ -723,51 +1013,52 @@ class HlsObjectView(APIView):
         logger = logging.getLogger(__name__)
         
         key = key.lstrip("/")
-        client = s3_client()
-        range_header = request.headers.get("Range")
 
-        # Get metadata first
-        try:
-            head_obj = client.head_object(Bucket=settings.MINIO_BUCKET, Key=key)
-            total_size = head_obj.get("ContentLength", 0)
-        except ClientError as e:
-            code = (e.response.get("Error") or {}).get("Code")
-            logger.error(f"[HlsObjectView] MinIO error for key {key}: {code}")
-            if code in ("NoSuchKey", "404", "NotFound"):
+        if key.endswith(".m3u8") and signed_segments_enabled():
+            try:
+                signed = signed_playlist(key)
+            except ClientError as e:
+                code = (e.response.get("Error") or {}).get("Code")
+                logger.error(f"[HlsObjectView] MinIO error for key {key}: {code}")
                 return JsonResponse({"error": "Not found"}, status=404)
-            return JsonResponse({"error": "Not found"}, status=404)
+            except UnicodeDecodeError:
+                signed = None
+            if signed is not None:
+                return _signed_playlist_response(*signed)
+
+        cache_control = _hls_cache_control(key)
+        if segment_cache.segment_cache_enabled() and is_final_output_key(key):
+            # Immutable output of a finished job: serve from (and fill) the local disk cache.
+            try:
+                cached = segment_cache.get(key)
+            except ClientError as e:
+                code = (e.response.get("Error") or {}).get("Code")
+                logger.error(f"[HlsObjectView] MinIO error for key {key}: {code}")
+                return JsonResponse({"error": "Not found"}, status=404)
+            if cached is not None:
+                return _segment_cache_response(request, key, cached, cache_control)
 
-        # Parse range header
-        start = None
-        end = None
-        status_code = 200
-        content_range = None
-        
-        if range_header and total_size > 0:
-            start, end = _parse_range_header(range_header, total_size)
-            if start is not None and end is not None:
-                status_code = 206
-                content_range = f"bytes {start}-{end}/{total_size}"
+        not_modified = _check_not_modified(request, key, cache_control)
+        if not_modified is not None:
+            return not_modified
 
-        # Prepare MinIO request
-        extra = {}
-        if start is not None and end is not None:
-            extra["Range"] = f"bytes={start}-{end}"
+        if accel_redirect_enabled():
+            # Playlists/segments were uploaded with their content type; keep it.
+            return accel_redirect_response(key, None, {"Cache-Control": cache_control})
 
+        # Malformed or out-of-bounds ranges are ignored here (whole object is served).
         try:
-            obj = client.get_object(Bucket=settings.MINIO_BUCKET, Key=key, **extra)
+            opened = open_object(key, effective_range(request, key), strict_range=False)
         except ClientError as e:
             code = (e.response.get("Error") or {}).get("Code")
-            if code in ("NoSuchKey", "404", "NotFound"):
-                return JsonResponse({"error": "Not found"}, status=404)
+            logger.error(f"[HlsObjectView] MinIO error for key {key}: {code}")
             return JsonResponse({"error": "Not found"}, status=404)
 
-        body = obj["Body"]
-        content_type = obj.get("ContentType") or mimetypes.guess_type(key)[0] or "application/octet-stream"
-        content_length = obj.get("ContentLength")
-        
-        if status_code == 200:
-            content_length = total_size
+        body = opened.iter_body()
+        status_code = opened.status
+        content_range = opened.content_range
+        content_length = opened.content_length
+        content_type = opened.meta.content_type or mimetypes.guess_type(key)[0] or "application/octet-stream"
 
         resp = StreamingHttpResponse(body, status=status_code, content_type=content_type)
         resp["Accept-Ranges"] = "bytes"
@@ -782,19 +1073,18 @@ class HlsObjectView(APIView):
         resp["Access-Control-Allow-Headers"] = "Range, Content-Type"
         resp["Access-Control-Expose-Headers"] = "Content-Length, Content-Range, Accept-Ranges"
         
-        # Cache HLS segments aggressively for better performance
-        # HLS segments are small and immutable, so long cache is safe
-        resp["Cache-Control"] = "public, max-age=86400"  # 24 hours
-        if head_obj.get("ETag"):
-            resp["ETag"] = head_obj.get("ETag", "").strip('"')
+        resp["Cache-Control"] = cache_control
+        for name, value in opened.meta.validator_headers().items():
+            resp[name] = value
         
         return resp
 
 
 class TranscodeHlsView(APIView):
     """
-    Admin endpoint: create an async HLS transcode job for an uploaded MP4 in MinIO.
-    It updates the target record (promo_video or topic_file) when finished.
+    Admin endpoint: queue an HLS transcode job for an uploaded MP4 in MinIO.
+    A transcode worker picks it up and updates the target record (promo_video or topic_file)
+    when finished.
     """
 
     permission_classes = [IsAdmin]
@@ -827,59 +1117,14 @@ class TranscodeHlsView(APIView):
             except Exception:
                 station_id_int = None
 
-        job = VideoTranscodeJob.objects.create(
-            target_type=str(target_type),
-            target_id=target_id,
-            station_id=station_id_int,
-            source_object_key=str(source_key).lstrip("/"),
-            status="queued",
-        )
-
-        # Determine output prefix (stable; HLS playlists need relative URLs)
-        output_prefix = f"videos/hls/{job.target_type}/{job.target_id}/{job.id}"
-
-        import threading
-        import traceback
-
-        def _run():
-            try:
-                VideoTranscodeJob.objects.filter(id=job.id).update(status="processing")
-                master_key = transcode_mp4_to_hls(job.source_object_key, output_prefix)
-
-                # Update target DB record
-                if job.target_type == "promo_video" and job.station_id:
-                    from apps.stations.models import StationPromoVideo
-
-                    StationPromoVideo.objects.filter(station_id=job.station_id, is_active=True).update(
-                        object_key=master_key
-                    )
-                elif job.target_type == "topic_file":
-                    from apps.courses.models import CourseProgramTopicFile
-
-                    CourseProgramTopicFile.objects.filter(id=job.target_id).update(
-                        object_key=master_key,
-                        mime_type="application/vnd.apple.mpegurl",
-                    )
-
-                VideoTranscodeJob.objects.filter(id=job.id).update(
-                    status="done",
-                    master_object_key=master_key,
-                    error=None,
-                )
-            except Exception as e:
-                VideoTranscodeJob.objects.filter(id=job.id).update(
-                    status="failed",
-                    error=str(e)[:4000],
-                )
-                traceback.print_exc()
-
-        threading.Thread(target=_run, daemon=True).start()
+        # Executed by `manage.py run_transcode_worker` (apps/files/jobs.py), not in the web worker.
+        job = enqueue_transcode(str(target_type), target_id, station_id_int, str(source_key))
 
         return JsonResponse(
             {
                 "jobId": job.id,
                 "status": job.status,
-                "outputPrefix": output_prefix,
+                "outputPrefix": output_prefix_for(job),
             }
         )
 
@@ -897,12 +1142,37 @@ class TranscodeJobView(APIView):
             "master_object_key",
             "status",
             "error",
+            "attempts",
+            "max_attempts",
+            "started_at",
+            "heartbeat_at",
+            "finished_at",
+            "upload_bytes",
+            "upload_files",
+            "upload_seconds",
+            "upload_retries",
+            "poster_object_key",
+            "thumbnails_object_key",
         ).first()
         if not job:
             return JsonResponse({"error": "Not found"}, status=404)
+        seconds = job.get("upload_seconds") or 0
+        job["upload_mb_per_sec"] = round(job["upload_bytes"] / seconds / 1e6, 2) if job.get("upload_bytes") and seconds else None
+        # Poster straight from MinIO; the thumbnails WebVTT references its sprite sheets
+        # relatively, so it is loaded through files/hls/<thumbnails_object_key>.
+        job["poster_url"] = presign_get(job["poster_object_key"]) if job.get("poster_object_key") else None
         return JsonResponse({"job": job})
 
 
+class HlsCacheStatsView(APIView):
+    """Admin/monitoring: hit rate and bytes saved by the HLS disk cache."""
+
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return JsonResponse(segment_cache.stats())
+
+
 class ExistsObjectView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -946,10 +1216,12 @@ class DeleteObjectView(APIView):
         except ClientError as e:
             code = (e.response.get("Error") or {}).get("Code")
             if code in ("NoSuchKey", "404", "NotFound"):
+                invalidate_object_meta(key)
                 # idempotent delete
                 return JsonResponse({"ok": True, "deleted": False})
             return JsonResponse({"error": "Failed to delete object"}, status=500)
 
+        invalidate_object_meta(key)
         return JsonResponse({"ok": True, "deleted": True})
 
 
@@ -958,14 +1230,45 @@ class DirectUploadView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
-        key = request.data.get("key")
+        # With ?key= the target is known before the body is read: the file is streamed
+        # into MinIO as it arrives (apps/files/uploads.py) instead of being buffered first.
+        query_key = (request.query_params.get("key") or "").lstrip("/")
+        # ?dedup=1 (training materials): reuse an already stored copy of the same bytes
+        use_dedup = _flag(request.query_params.get("dedup")) and dedup.dedup_enabled()
+        upload = None
+        if query_key:
+            upload = stream_uploads_to_minio(
+                request,
+                key_for=lambda _name, _ct: query_key,
+                content_type=request.query_params.get("contentType") or None,
+                hash_content=use_dedup,
+            )
+
+        key = query_key or request.data.get("key")
         if not key:
             return JsonResponse({"error": "Missing key"}, status=400)
 
+        if upload is not None and upload.error is not None:
+            return JsonResponse({"error": upload.error.message}, status=upload.error.status)
         if "file" not in request.FILES:
             return JsonResponse({"error": "Missing file"}, status=400)
 
         file_obj = request.FILES["file"]
+        if isinstance(file_obj, StreamedFile):
+            if use_dedup and file_obj.sha256:
+                result = dedup.register_upload(
+                    dedup.sha256_hash(file_obj.sha256), file_obj.size, file_obj.key, file_obj.content_type
+                )
+                return JsonResponse(
+                    {
+                        "ok": True,
+                        "key": result.key,
+                        "contentHash": result.content_hash,
+                        "deduplicated": result.deduplicated,
+                    }
+                )
+            return JsonResponse({"ok": True, "key": file_obj.key})
+
         content_type = request.data.get("contentType") or file_obj.content_type or "application/octet-stream"
 
         client = s3_client()
@@ -975,7 +1278,9 @@ class DirectUploadView(APIView):
                 settings.MINIO_BUCKET,
                 key,
                 ExtraArgs={"ContentType": content_type},
+                Config=transfer_config(),
             )
+            invalidate_object_meta(key)
             return JsonResponse({"ok": True, "key": key})
         except ClientError as e:
             code = (e.response.get("Error") or {}).get("Code")
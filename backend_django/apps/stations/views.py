@@ -16,6 +16,7 @@ from apps.courses.models import (
     CourseProgramLessonTest,
     FinalTest,
 )
+from apps.courses.material_totals import bump_content_version, bump_content_version_for_topic
 from apps.stations.models import (
     Department,
     Station,
@@ -134,22 +135,33 @@ def _serialize_course_program(program: CourseProgram) -> dict:
     files_by_topic: dict[int, list[dict]] = {}
     if topic_ids:
         with connection.cursor() as cur:
+            # Poster / seek-preview thumbnails of transcoded videos (apps/files/hls.py), so the
+            # lesson viewer can show them without loading any video bytes.
             cur.execute(
                 """
                 select
-                    id,
-                    course_program_topic_id,
-                    title,
-                    original_name,
-                    object_key,
-                    file_type,
-                    is_main,
-                    order_index,
-                    file_size,
-                    mime_type
-                from course_program_topic_files
-                where is_active = true and course_program_topic_id = any(%s)
-                order by course_program_topic_id, order_index, id
+                    f.id,
+                    f.course_program_topic_id,
+                    f.title,
+                    f.original_name,
+                    f.object_key,
+                    f.file_type,
+                    f.is_main,
+                    f.order_index,
+                    f.file_size,
+                    f.mime_type,
+                    j.poster_object_key,
+                    j.thumbnails_object_key
+                from course_program_topic_files f
+                left join lateral (
+                    select poster_object_key, thumbnails_object_key
+                    from video_transcode_jobs
+                    where master_object_key = f.object_key and status = 'done'
+                    order by id desc
+                    limit 1
+                ) j on f.file_type = 'video'
+                where f.is_active = true and f.course_program_topic_id = any(%s)
+                order by f.course_program_topic_id, f.order_index, f.id
                 """,
                 [topic_ids],
             )
@@ -164,6 +176,8 @@ def _serialize_course_program(program: CourseProgram) -> dict:
                 order_index,
                 file_size,
                 mime_type,
+                poster_key,
+                thumbnails_key,
             ) in cur.fetchall():
                 files_by_topic.setdefault(cpt_id, []).append(
                     {
@@ -176,6 +190,8 @@ def _serialize_course_program(program: CourseProgram) -> dict:
                         "orderIndex": int(order_index or 0),
                         "fileSize": file_size,
                         "mimeType": mime_type,
+                        "posterKey": poster_key,
+                        "thumbnailsKey": thumbnails_key,
                     }
                 )
 
@@ -584,6 +600,9 @@ class StationCourseProgramUpdateView(APIView):
                     .update(is_active=False)
                 )
 
+            # Lessons/topics/tests may have changed: new content version for the cached totals
+            bump_content_version(program.id)
+
         return JsonResponse({"courseProgram": _serialize_course_program(program)})
 
 
@@ -599,22 +618,33 @@ class StationCourseProgramTopicFilesView(APIView):
             return JsonResponse({"error": "Topic not found"}, status=404)
 
         with connection.cursor() as cur:
+            # Poster / seek-preview thumbnails of transcoded videos (apps/files/hls.py), so the
+            # page can show them without loading any video bytes.
             cur.execute(
                 """
                 select
-                    id,
-                    title,
-                    original_name,
-                    object_key,
-                    file_type,
-                    is_main,
-                    order_index,
-                    file_size,
-                    mime_type,
-                    is_active
-                from course_program_topic_files
-                where course_program_topic_id = %s AND is_active = true
-                order by order_index, id
+                    f.id,
+                    f.title,
+                    f.original_name,
+                    f.object_key,
+                    f.file_type,
+                    f.is_main,
+                    f.order_index,
+                    f.file_size,
+                    f.mime_type,
+                    f.is_active,
+                    j.poster_object_key,
+                    j.thumbnails_object_key
+                from course_program_topic_files f
+                left join lateral (
+                    select poster_object_key, thumbnails_object_key
+                    from video_transcode_jobs
+                    where master_object_key = f.object_key and status = 'done'
+                    order by id desc
+                    limit 1
+                ) j on f.file_type = 'video'
+                where f.course_program_topic_id = %s AND f.is_active = true
+                order by f.order_index, f.id
                 """,
                 [topic_id],
             )
@@ -630,6 +660,8 @@ class StationCourseProgramTopicFilesView(APIView):
                 file_size,
                 mime_type,
                 is_active,
+                poster_key,
+                thumbnails_key,
             ) in cur.fetchall():
                 rows.append(
                     {
@@ -643,6 +675,8 @@ class StationCourseProgramTopicFilesView(APIView):
                         "fileSize": file_size,
                         "mimeType": mime_type,
                         "isActive": bool(is_active),
+                        "posterKey": poster_key,
+                        "thumbnailsKey": thumbnails_key,
                     }
                 )
 
@@ -681,6 +715,18 @@ class StationCourseProgramTopicFileCreateView(APIView):
         if is_main and file_type != "pdf":
             is_main = False
 
+        hls_reused = False
+        if file_type == "video":
+            # The same video (e.g. a deduplicated upload, apps/files/dedup.py) was already
+            # transcoded for another topic: attach its HLS output, no new ffmpeg run needed.
+            from apps.files.jobs import finished_job_for
+
+            previous = finished_job_for(object_key)
+            if previous is not None:
+                object_key = previous.master_object_key
+                mime_type = "application/vnd.apple.mpegurl"
+                hls_reused = True
+
         with transaction.atomic():
             # Allow multiple main files per topic (removed single-main restriction)
 
@@ -696,6 +742,7 @@ class StationCourseProgramTopicFileCreateView(APIView):
                     [topic_id, title or None, original_name, object_key, file_type, is_main, order_index, file_size, mime_type],
                 )
                 new_id = cur.fetchone()[0]
+            bump_content_version_for_topic(topic_id)
 
         return JsonResponse(
             {
@@ -710,6 +757,7 @@ class StationCourseProgramTopicFileCreateView(APIView):
                     "fileSize": file_size,
                     "mimeType": mime_type,
                     "isActive": True,
+                    "hlsReused": hls_reused,
                 }
             }
         )
@@ -784,6 +832,9 @@ class StationCourseProgramTopicFileUpdateView(APIView):
                         f"update course_program_topic_files set {', '.join(sets)}, updated_at = CURRENT_TIMESTAMP where id = %s",
                         [*params, file_id],
                     )
+                if is_active is not None:
+                    # only the active flag changes the program's material totals
+                    bump_content_version_for_topic(topic_id)
 
         return JsonResponse({"ok": True})
 
@@ -824,8 +875,19 @@ class StationCourseProgramTopicFileDeleteView(APIView):
                     "update course_program_topic_files set is_active = false, updated_at = CURRENT_TIMESTAMP where id = %s",
                     [file_id],
                 )
+            bump_content_version_for_topic(topic_id)
 
-        if delete_object and object_key:
+            shared = False
+            if delete_object and object_key:
+                # Deduplicated uploads / reused HLS output: other topics may use the same object
+                with connection.cursor() as cur:
+                    cur.execute(
+                        "select 1 from course_program_topic_files where object_key = %s and is_active = true and id <> %s limit 1",
+                        [object_key, file_id],
+                    )
+                    shared = cur.fetchone() is not None
+
+        if delete_object and object_key and not shared:
             try:
                 from django.conf import settings
                 from apps.files.minio_client import s3_client
@@ -836,6 +898,9 @@ class StationCourseProgramTopicFileDeleteView(APIView):
                 client = s3_client()
                 client.delete_object(Bucket=settings.MINIO_BUCKET, Key=str(object_key))
                 logger.info(f"[StationCourseProgramTopicFileDeleteView] Deleted MinIO object: {object_key}")
+                from apps.files.dedup import forget_object
+
+                forget_object(str(object_key))
             except ClientError as e:
                 error_code = e.response.get("Error", {}).get("Code", "Unknown")
                 if error_code in ("NoSuchKey", "404", "NotFound"):
@@ -848,7 +913,7 @@ class StationCourseProgramTopicFileDeleteView(APIView):
                 logger.error(f"[StationCourseProgramTopicFileDeleteView] Unexpected error deleting MinIO object {object_key}: {e}")
                 # Continue anyway - record is already soft-deleted
 
-        return JsonResponse({"ok": True, "deleted": True, "objectKey": object_key})
+        return JsonResponse({"ok": True, "deleted": True, "objectKey": object_key, "objectShared": shared})
 
 
 class StationPromoVideoView(APIView):
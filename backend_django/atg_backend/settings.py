@@ -139,6 +139,38 @@ DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
 # Multipart upload settings
 MULTIPART_CHUNK_SIZE = 10 * 1024 * 1024  # 10MB
 MULTIPART_THRESHOLD = 100 * 1024 * 1024  # 100MB
+# Server-side uploads (apps/files/uploads.py, upload_fileobj): parts of MULTIPART_CHUNK_SIZE,
+# up to MINIO_UPLOAD_CONCURRENCY in flight per upload, on a pool of MINIO_UPLOAD_WORKERS threads.
+MINIO_UPLOAD_CONCURRENCY = int(env("MINIO_UPLOAD_CONCURRENCY", "4"))
+MINIO_UPLOAD_WORKERS = int(env("MINIO_UPLOAD_WORKERS", "16"))
+# Browser multipart upload sessions (apps/files/upload_sessions.py): resumable while parts keep
+# arriving; aborted by the reaper after this long without activity.
+MULTIPART_SESSION_TTL_HOURS = float(env("MULTIPART_SESSION_TTL_HOURS", "24"))
+MULTIPART_REAP_INTERVAL_SEC = int(env("MULTIPART_REAP_INTERVAL_SEC", "3600"))
+# Browser-direct part uploads (files/multipart/part-urls): presigned upload_part URLs,
+# at most MULTIPART_PART_URL_BATCH per request, valid for MULTIPART_PART_URL_TTL_SEC.
+MULTIPART_PART_URL_BATCH = int(env("MULTIPART_PART_URL_BATCH", "100"))
+MULTIPART_PART_URL_TTL_SEC = int(env("MULTIPART_PART_URL_TTL_SEC", "3600"))
+# Content-addressed deduplication of uploads that ask for it (?dedup=1, apps/files/dedup.py)
+CONTENT_DEDUP_ENABLED = env("CONTENT_DEDUP_ENABLED", "true").lower() in ("true", "1", "yes")
+# Admin analytics rollups (apps/courses/analytics_rollups.py): rebuilt every
+# ANALYTICS_ROLLUP_REFRESH_SEC by `manage.py refresh_analytics_rollups --loop`; the analytics
+# endpoints compute live numbers instead when the last refresh is older than ANALYTICS_ROLLUP_MAX_AGE_SEC.
+ANALYTICS_ROLLUPS_ENABLED = env("ANALYTICS_ROLLUPS_ENABLED", "true").lower() in ("true", "1", "yes")
+ANALYTICS_ROLLUP_REFRESH_SEC = int(env("ANALYTICS_ROLLUP_REFRESH_SEC", "300"))
+ANALYTICS_ROLLUP_MAX_AGE_SEC = int(env("ANALYTICS_ROLLUP_MAX_AGE_SEC", "900"))
+ANALYTICS_ROLLUP_DAYS = int(env("ANALYTICS_ROLLUP_DAYS", "90"))  # days of daily activity rebuilt per refresh
+# Per-program material totals cache (apps/courses/material_totals.py), keyed by content version;
+# per-process LRU of PROGRAM_TOTALS_CACHE_SIZE entries plus Redis (if REDIS_URL) for PROGRAM_TOTALS_CACHE_TTL_SEC.
+PROGRAM_TOTALS_CACHE_SIZE = int(env("PROGRAM_TOTALS_CACHE_SIZE", "2000"))
+PROGRAM_TOTALS_CACHE_TTL_SEC = int(env("PROGRAM_TOTALS_CACHE_TTL_SEC", "86400"))
+PROGRAM_TOTALS_CACHE_REDIS = env("PROGRAM_TOTALS_CACHE_REDIS", "true").lower() in ("true", "1", "yes")
+# Write-behind buffer for video/PDF position saves (apps/courses/progress_buffer.py): positions are
+# coalesced (Redis if REDIS_URL, else per process) and upserted in batches every MATERIAL_PROGRESS_FLUSH_SEC.
+MATERIAL_PROGRESS_BUFFER_ENABLED = env("MATERIAL_PROGRESS_BUFFER_ENABLED", "true").lower() in ("true", "1", "yes")
+MATERIAL_PROGRESS_BUFFER_REDIS = env("MATERIAL_PROGRESS_BUFFER_REDIS", "true").lower() in ("true", "1", "yes")
+MATERIAL_PROGRESS_FLUSH_SEC = int(env("MATERIAL_PROGRESS_FLUSH_SEC", "10"))
+MATERIAL_PROGRESS_FLUSH_BATCH = int(env("MATERIAL_PROGRESS_FLUSH_BATCH", "500"))
 
 # JWT
 JWT_ACCESS_SECRET = env("JWT_ACCESS_SECRET", "dev-access-secret-change-me")
@@ -173,6 +205,84 @@ else:
     # Public endpoint already, use as-is or from env
     MINIO_PUBLIC_ENDPOINT = env("MINIO_PUBLIC_ENDPOINT", MINIO_ENDPOINT)
 
+# MinIO client pool (one shared client per worker process, see apps/files/minio_client.py)
+MINIO_MAX_POOL_CONNECTIONS = int(env("MINIO_MAX_POOL_CONNECTIONS", "32"))
+MINIO_TCP_KEEPALIVE = env("MINIO_TCP_KEEPALIVE", "true").lower() in ("true", "1", "yes")
+MINIO_CONNECT_TIMEOUT = float(env("MINIO_CONNECT_TIMEOUT", "10"))
+MINIO_READ_TIMEOUT = float(env("MINIO_READ_TIMEOUT", "60"))
+MINIO_MAX_ATTEMPTS = int(env("MINIO_MAX_ATTEMPTS", "3"))
+# Per-process cache of object metadata (size/ETag/content type) used by the streaming
+# proxies for HEAD and Range validation. 0 disables it.
+MINIO_META_CACHE_TTL = float(env("MINIO_META_CACHE_TTL", "30"))
+MINIO_META_CACHE_SIZE = int(env("MINIO_META_CACHE_SIZE", "5000"))
+# Read size (bytes) when proxying object bodies; 256 KB - 1 MB keeps per-chunk overhead low.
+MINIO_STREAM_CHUNK_SIZE = int(env("MINIO_STREAM_CHUNK_SIZE", str(512 * 1024)))
+# Offload proxied downloads to nginx: views only check permissions and answer with
+# X-Accel-Redirect to this internal location (see nginx.conf), which streams from MinIO.
+# Only enable behind the nginx from this repo.
+MINIO_ACCEL_REDIRECT = env("MINIO_ACCEL_REDIRECT", "false").lower() in ("true", "1", "yes")
+MINIO_ACCEL_REDIRECT_LOCATION = env("MINIO_ACCEL_REDIRECT_LOCATION", "/_minio_internal/")
+MINIO_ACCEL_REDIRECT_EXPIRES = int(env("MINIO_ACCEL_REDIRECT_EXPIRES", "300"))
+# Serve files/stream|video|hls with the async views (apps/files/async_views.py). Only for
+# the uvicorn (ASGI) `backend-stream` service; under gunicorn every request would get its
+# own event loop and lose connection pooling.
+FILES_ASYNC_STREAMING = env("FILES_ASYNC_STREAMING", "false").lower() in ("true", "1", "yes")
+MINIO_ASYNC_MAX_CONNECTIONS = int(env("MINIO_ASYNC_MAX_CONNECTIONS", "512"))
+# Sign presigned GET URLs locally (SigV4) instead of through botocore.
+MINIO_LOCAL_PRESIGN = env("MINIO_LOCAL_PRESIGN", "true").lower() in ("true", "1", "yes")
+# Presigned URL cache (apps/files/presign_cache.py): signing time is rounded to this window (seconds)
+# so identical URLs are reused; entries are kept in a per-process LRU and, if REDIS_URL is set, in Redis.
+MINIO_PRESIGN_CACHE_WINDOW = int(env("MINIO_PRESIGN_CACHE_WINDOW", "3600"))
+MINIO_PRESIGN_CACHE_SIZE = int(env("MINIO_PRESIGN_CACHE_SIZE", "10000"))
+MINIO_PRESIGN_CACHE_REDIS = env("MINIO_PRESIGN_CACHE_REDIS", "true").lower() in ("true", "1", "yes")
+
+# Redis (optional, e.g. redis://redis:6379/0 in docker-compose). Unset = in-process caches only.
+REDIS_URL = env("REDIS_URL", None)
+REDIS_SOCKET_TIMEOUT = float(env("REDIS_SOCKET_TIMEOUT", "0.5"))
+
+# HLS transcode job queue (apps/files/jobs.py, run by `manage.py run_transcode_worker`)
+TRANSCODE_WORKER_CONCURRENCY = int(env("TRANSCODE_WORKER_CONCURRENCY", "1"))
+TRANSCODE_POLL_INTERVAL_SEC = float(env("TRANSCODE_POLL_INTERVAL_SEC", "5"))
+TRANSCODE_HEARTBEAT_SEC = float(env("TRANSCODE_HEARTBEAT_SEC", "15"))
+TRANSCODE_STALE_AFTER_SEC = int(env("TRANSCODE_STALE_AFTER_SEC", "120"))
+TRANSCODE_MAX_ATTEMPTS = int(env("TRANSCODE_MAX_ATTEMPTS", "3"))
+# A failed attempt is re-queued after TRANSCODE_RETRY_BACKOFF_SEC, doubled on every further attempt.
+TRANSCODE_RETRY_BACKOFF_SEC = int(env("TRANSCODE_RETRY_BACKOFF_SEC", "30"))
+# Pipelined HLS transcode: ffmpeg reads the source from MinIO over HTTP and segments are
+# uploaded while encoding. Set to false to download the full source to a temp dir first.
+HLS_PIPELINED = env("HLS_PIPELINED", "true").lower() in ("true", "1", "yes")
+HLS_UPLOAD_CONCURRENCY = int(env("HLS_UPLOAD_CONCURRENCY", "8"))
+HLS_UPLOAD_RETRIES = int(env("HLS_UPLOAD_RETRIES", "4"))
+# Rewrite media playlists served by files/hls/ to presigned segment URLs, so players fetch
+# segments from MinIO through HLS_SEGMENT_URL_PREFIX (nginx/vite /api/minio proxy) instead
+# of through Django. Empty prefix = absolute MINIO_ENDPOINT URLs (endpoint reachable by clients).
+# Ignored (with a warning) when HLS_DISK_CACHE_DIR is set: the disk cache needs segments to come
+# through Django, so use HLS_SIGNED_SEGMENTS=false together with the cache.
+HLS_SIGNED_SEGMENTS = env("HLS_SIGNED_SEGMENTS", "true").lower() in ("true", "1", "yes")
+HLS_SEGMENT_URL_PREFIX = env("HLS_SEGMENT_URL_PREFIX", "/api/minio")
+HLS_SEGMENT_URL_EXPIRES = int(env("HLS_SEGMENT_URL_EXPIRES", str(6 * 60 * 60)))
+# Local disk LRU for immutable HLS output served by files/hls/ (apps/files/segment_cache.py).
+# Empty dir = disabled. The directory can be shared by all backend processes/containers.
+HLS_DISK_CACHE_DIR = env("HLS_DISK_CACHE_DIR", "")
+HLS_DISK_CACHE_BYTES = int(env("HLS_DISK_CACHE_BYTES", str(2 * 1024 * 1024 * 1024)))
+HLS_DISK_CACHE_MAX_OBJECT_BYTES = int(env("HLS_DISK_CACHE_MAX_OBJECT_BYTES", str(64 * 1024 * 1024)))
+# Encoder profile from apps.files.hls_ladder.DEFAULT_PROFILES: fast | balanced | quality | nvenc | qsv.
+# HLS_ENCODER_PROFILES / HLS_RENDITIONS may be overridden here to change the profiles or the ladder.
+HLS_ENCODER_PROFILE = env("HLS_ENCODER_PROFILE", "fast")
+HLS_ENCODER_PROFILES = None
+HLS_RENDITIONS = None
+# ffmpeg -threads per job; 0 = CPU count divided by TRANSCODE_WORKER_CONCURRENCY.
+HLS_FFMPEG_THREADS = int(env("HLS_FFMPEG_THREADS", "0"))
+# Poster frame + seek-preview sprite sheets (WebVTT) rendered in the transcode pass, stored
+# next to master.m3u8: one HLS_THUMBNAIL_WIDTH px tile every HLS_THUMBNAIL_INTERVAL_SEC
+# (widened so long videos stay at HLS_THUMBNAIL_MAX_TILES). HLS_POSTER_FORMAT: jpg | webp.
+HLS_THUMBNAILS = env("HLS_THUMBNAILS", "true").lower() in ("true", "1", "yes")
+HLS_POSTER_FORMAT = env("HLS_POSTER_FORMAT", "jpg")
+HLS_POSTER_WIDTH = int(env("HLS_POSTER_WIDTH", "1280"))
+HLS_THUMBNAIL_INTERVAL_SEC = int(env("HLS_THUMBNAIL_INTERVAL_SEC", "10"))
+HLS_THUMBNAIL_WIDTH = int(env("HLS_THUMBNAIL_WIDTH", "160"))
+HLS_THUMBNAIL_MAX_TILES = int(env("HLS_THUMBNAIL_MAX_TILES", "300"))
+
 # LDAP
 LDAP_ENABLED = env("LDAP_ENABLED", "false").lower() in ("true", "1", "yes")
 LDAP_SERVER = env("LDAP_SERVER", "ldap://localhost:389")
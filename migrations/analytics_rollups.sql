@@ -0,0 +1,101 @@
+-- Pre-aggregated admin analytics (apps/courses/analytics_rollups.py).
+-- Rebuilt by `manage.py refresh_analytics_rollups` (scheduled, --loop); the admin
+-- analytics endpoints read these tables instead of scanning user_course_programs,
+-- user_course_materials and test_results on every page load, and fall back to live
+-- queries while the rollups are missing or older than ANALYTICS_ROLLUP_MAX_AGE_SEC.
+-- Idempotent / safe to re-run
+
+-- One row per rollup refresh target; refreshed_at drives the freshness check.
+CREATE TABLE IF NOT EXISTS analytics_rollup_state (
+    name VARCHAR(50) PRIMARY KEY,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    duration_ms INTEGER NOT NULL DEFAULT 0
+);
+
+-- Site-wide totals (single row, id = 1)
+CREATE TABLE IF NOT EXISTS analytics_overview_rollup (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    total_users INTEGER NOT NULL DEFAULT 0,
+    active_users INTEGER NOT NULL DEFAULT 0,
+    total_course_programs INTEGER NOT NULL DEFAULT 0,
+    total_enrollments INTEGER NOT NULL DEFAULT 0,
+    not_started_enrollments INTEGER NOT NULL DEFAULT 0,
+    active_enrollments INTEGER NOT NULL DEFAULT 0,
+    completed_enrollments INTEGER NOT NULL DEFAULT 0,
+    total_materials_viewed INTEGER NOT NULL DEFAULT 0,
+    average_progress NUMERIC(6, 2) NOT NULL DEFAULT 0,
+    average_test_score NUMERIC(6, 2) NOT NULL DEFAULT 0,
+    -- {"video": n, "pdf": n, "test": n}: active materials / completions by type
+    materials_total JSONB NOT NULL DEFAULT '{}'::jsonb,
+    materials_completed JSONB NOT NULL DEFAULT '{}'::jsonb,
+    -- top 20 completed materials: [{"material_key", "material_type", "course_title", "view_count"}]
+    most_viewed JSONB NOT NULL DEFAULT '[]'::jsonb,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS analytics_station_rollup (
+    station_id INTEGER PRIMARY KEY,
+    course_programs INTEGER NOT NULL DEFAULT 0,
+    total_enrollments INTEGER NOT NULL DEFAULT 0,
+    active_enrollments INTEGER NOT NULL DEFAULT 0,
+    completed_enrollments INTEGER NOT NULL DEFAULT 0,
+    unique_users INTEGER NOT NULL DEFAULT 0,
+    active_users INTEGER NOT NULL DEFAULT 0,
+    average_progress NUMERIC(6, 2) NOT NULL DEFAULT 0,
+    total_hours NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    average_test_score NUMERIC(6, 2) NOT NULL DEFAULT 0,
+    test_attempts INTEGER NOT NULL DEFAULT 0,
+    tests_passed INTEGER NOT NULL DEFAULT 0,
+    -- {"video", "pdf", "text", "presentation", "test"}
+    materials_total JSONB NOT NULL DEFAULT '{}'::jsonb,
+    materials_completed JSONB NOT NULL DEFAULT '{}'::jsonb,
+    last_activity TIMESTAMP WITH TIME ZONE NULL,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS analytics_program_rollup (
+    course_program_id INTEGER PRIMARY KEY,
+    station_id INTEGER NULL,
+    total_enrollments INTEGER NOT NULL DEFAULT 0,
+    active_enrollments INTEGER NOT NULL DEFAULT 0,
+    completed_enrollments INTEGER NOT NULL DEFAULT 0,
+    average_progress NUMERIC(6, 2) NOT NULL DEFAULT 0,
+    -- {"video", "pdf", "test"}
+    materials_total JSONB NOT NULL DEFAULT '{}'::jsonb,
+    materials_completed JSONB NOT NULL DEFAULT '{}'::jsonb,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_analytics_program_rollup_station ON analytics_program_rollup (station_id);
+
+CREATE TABLE IF NOT EXISTS analytics_user_rollup (
+    user_id UUID PRIMARY KEY,
+    total_enrollments INTEGER NOT NULL DEFAULT 0,
+    active_courses INTEGER NOT NULL DEFAULT 0,
+    completed_courses INTEGER NOT NULL DEFAULT 0,
+    total_hours_studied NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    average_progress NUMERIC(6, 2) NOT NULL DEFAULT 0,
+    average_test_score NUMERIC(6, 2) NOT NULL DEFAULT 0,
+    -- {"video", "pdf", "text", "presentation", "test"}
+    materials_completed JSONB NOT NULL DEFAULT '{}'::jsonb,
+    last_activity TIMESTAMP WITH TIME ZONE NULL,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Site-wide activity per day (the overview timeline)
+CREATE TABLE IF NOT EXISTS analytics_daily_activity (
+    day DATE PRIMARY KEY,
+    enrollments INTEGER NOT NULL DEFAULT 0,
+    completions INTEGER NOT NULL DEFAULT 0,
+    materials_viewed INTEGER NOT NULL DEFAULT 0,
+    refreshed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+-- Per-user test averages are grouped by user
+-- (test_results is created outside these migrations; skip while it does not exist)
+DO $$
+BEGIN
+    IF to_regclass('test_results') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_test_results_user ON test_results (user_id);
+    END IF;
+END $$;
@@ -0,0 +1,24 @@
+-- Content-addressed index of uploaded training materials (apps/files/dedup.py):
+-- content hash -> the one MinIO object holding those bytes, so a file uploaded again
+-- (e.g. the same PDF/MP4 for several stations' topics) reuses the stored object and
+-- any finished HLS transcode of it.
+-- Idempotent / safe to re-run
+
+CREATE TABLE IF NOT EXISTS content_blobs (
+    id SERIAL PRIMARY KEY,
+    -- "sha256:<hex>" (hashed while streaming through Django) or
+    -- "s3-multipart:<etag>" (MinIO's multipart ETag: MD5 over the part MD5s)
+    content_hash VARCHAR(200) NOT NULL UNIQUE,
+    size BIGINT NOT NULL,
+    object_key VARCHAR(1000) NOT NULL,
+    content_type VARCHAR(255) NULL,
+    reuse_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_content_blobs_object_key ON content_blobs (object_key);
+
+-- Finished transcodes are looked up by source object when a duplicate video is attached
+CREATE INDEX IF NOT EXISTS idx_video_transcode_jobs_source_done
+ON video_transcode_jobs (source_object_key) WHERE status = 'done';
@@ -0,0 +1,33 @@
+-- Server-side state of browser multipart uploads (files/multipart/*), so an interrupted
+-- upload can be resumed and stale ones aborted by the reaper
+-- (apps/files/upload_sessions.py, `manage.py reap_multipart_uploads`).
+-- Idempotent / safe to re-run
+
+CREATE TABLE IF NOT EXISTS multipart_upload_sessions (
+    id SERIAL PRIMARY KEY,
+    upload_id VARCHAR(1024) NOT NULL UNIQUE,
+    object_key VARCHAR(1000) NOT NULL,
+    content_type VARCHAR(255) NULL,
+    user_id UUID NULL,
+    file_size BIGINT NULL,
+    part_size INTEGER NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'active',
+    expires_at TIMESTAMP NOT NULL,
+    completed_at TIMESTAMP NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_multipart_upload_sessions_user_key ON multipart_upload_sessions (user_id, object_key);
+CREATE INDEX IF NOT EXISTS idx_multipart_upload_sessions_expiring ON multipart_upload_sessions (expires_at) WHERE status = 'active';
+
+-- Parts confirmed by MinIO (one row per part; a re-sent part overwrites its row)
+CREATE TABLE IF NOT EXISTS multipart_upload_parts (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES multipart_upload_sessions(id) ON DELETE CASCADE,
+    part_number INTEGER NOT NULL,
+    etag VARCHAR(255) NOT NULL,
+    size BIGINT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (session_id, part_number)
+);
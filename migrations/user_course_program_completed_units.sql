@@ -0,0 +1,20 @@
+-- Denormalized per-enrollment counter of completed materials (apps/courses/progress.py):
+-- incremented when a user_course_materials row flips to completed, so progress polls
+-- no longer count the user's materials on every call.
+-- Idempotent / safe to re-run (the backfill also repairs a drifted counter)
+
+ALTER TABLE user_course_programs
+ADD COLUMN IF NOT EXISTS completed_units INTEGER NOT NULL DEFAULT 0;
+
+UPDATE user_course_programs ucp
+SET completed_units = c.cnt
+FROM (
+    SELECT e.id, COUNT(m.id) AS cnt
+    FROM user_course_programs e
+    LEFT JOIN user_course_materials m
+      ON m.user_id = e.user_id
+     AND m.course_program_id = e.course_program_id
+     AND m.is_completed = true
+    GROUP BY e.id
+) c
+WHERE c.id = ucp.id AND ucp.completed_units <> c.cnt;
@@ -0,0 +1,43 @@
+-- Per-material playback/reading position for auto-resume (UserMaterialProgress).
+-- Written by apps/courses/progress_buffer.py with multi-row
+-- INSERT ... ON CONFLICT (user_id, course_program_id, material_key) DO UPDATE,
+-- which needs a unique index on exactly those columns.
+-- Idempotent / safe to re-run
+
+CREATE TABLE IF NOT EXISTS user_material_progress (
+    id UUID PRIMARY KEY,
+    user_id UUID NOT NULL,
+    course_program_id INTEGER NOT NULL,
+    lesson_id INTEGER NULL,
+    topic_id INTEGER NULL,
+    material_key TEXT NOT NULL,
+    material_type VARCHAR(20) NOT NULL,
+    position_seconds INTEGER NOT NULL DEFAULT 0,
+    duration_seconds INTEGER NULL,
+    progress_percent INTEGER NOT NULL DEFAULT 0,
+    is_completed BOOLEAN NOT NULL DEFAULT false,
+    last_viewed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_material_progress_user_program
+    ON user_material_progress (user_id, course_program_id);
+
+-- Tables created by Django (unique_together) already carry an equivalent unique constraint
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        WHERE i.indrelid = 'user_material_progress'::regclass
+          AND i.indisunique
+          AND (
+              SELECT array_agg(a.attname::text ORDER BY a.attname::text)
+              FROM pg_attribute a
+              WHERE a.attrelid = i.indrelid AND a.attnum = ANY (i.indkey)
+          ) = ARRAY['course_program_id', 'material_key', 'user_id']
+    ) THEN
+        CREATE UNIQUE INDEX idx_user_material_progress_unique
+            ON user_material_progress (user_id, course_program_id, material_key);
+    END IF;
+END $$;
@@ -17,3 +17,28 @@ CREATE TABLE IF NOT EXISTS video_transcode_jobs (
 CREATE INDEX IF NOT EXISTS idx_video_transcode_jobs_target ON video_transcode_jobs (target_type, target_id);
 
 
+-- Job runner columns (claimed by `manage.py run_transcode_worker` with FOR UPDATE SKIP LOCKED)
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS max_attempts INTEGER NOT NULL DEFAULT 3;
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS worker_id VARCHAR(255) NULL;
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP NULL;
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS started_at TIMESTAMP NULL;
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS finished_at TIMESTAMP NULL;
+-- Failed attempts are re-queued with a backoff: not claimed before retry_after
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS retry_after TIMESTAMP NULL;
+
+-- Upload statistics of the HLS output (throughput = upload_bytes / upload_seconds)
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS upload_bytes BIGINT NULL;
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS upload_files INTEGER NULL;
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS upload_seconds DOUBLE PRECISION NULL;
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS upload_retries INTEGER NULL;
+
+CREATE INDEX IF NOT EXISTS idx_video_transcode_jobs_queued ON video_transcode_jobs (id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_video_transcode_jobs_processing ON video_transcode_jobs (heartbeat_at) WHERE status = 'processing';
+
+-- Poster frame / thumbnail sprite WebVTT rendered in the same ffmpeg pass (apps/files/hls.py)
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS poster_object_key VARCHAR(1000) NULL;
+ALTER TABLE video_transcode_jobs ADD COLUMN IF NOT EXISTS thumbnails_object_key VARCHAR(1000) NULL;
+-- Topic file listings look up the previews of the master playlist they point at
+CREATE INDEX IF NOT EXISTS idx_video_transcode_jobs_master_done
+ON video_transcode_jobs (master_object_key) WHERE status = 'done';
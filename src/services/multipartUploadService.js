@@ -1,8 +1,16 @@
+import { getFrontendUrl } from '@/services/minioService'
+
 const API_BASE_URL = '/api'
 
 export const MULTIPART_CHUNK_SIZE = 10 * 1024 * 1024 // 10MB
 export const MULTIPART_THRESHOLD = 100 * 1024 * 1024 // 100MB
 
+// Parts go straight to MinIO (presigned upload_part URLs via /api/minio) instead of through
+// Django; VITE_DIRECT_PART_UPLOADS=false falls back to the proxied files/multipart/upload-part.
+const DIRECT_PART_UPLOADS = import.meta.env.VITE_DIRECT_PART_UPLOADS !== 'false'
+const PART_UPLOAD_CONCURRENCY = 4
+const PART_URL_BATCH = 20
+
 function getAuthToken() {
   const token = localStorage.getItem('auth_token')
   if (typeof token === 'string' && token.trim()) {
@@ -40,17 +48,31 @@ async function apiJsonRequest(url, options = {}) {
   return response.json()
 }
 
-export async function initiateUpload(key, contentType) {
+export async function initiateUpload(key, contentType, fileSize) {
   return apiJsonRequest('/files/multipart/initiate', {
     method: 'POST',
     body: JSON.stringify({
       key,
       contentType: contentType || 'application/octet-stream',
+      fileSize,
     }),
   })
 }
 
-export async function completeUpload(uploadId, key, parts, contentType) {
+export async function getUploadStatus(uploadId, key, verify = false) {
+  const params = new URLSearchParams({ uploadId, key })
+  if (verify) params.set('verify', '1')
+  return apiJsonRequest(`/files/multipart/status?${params}`, { method: 'GET' })
+}
+
+export async function getPartUrls(uploadId, key, partNumbers) {
+  return apiJsonRequest('/files/multipart/part-urls', {
+    method: 'POST',
+    body: JSON.stringify({ uploadId, key, partNumbers }),
+  })
+}
+
+export async function completeUpload(uploadId, key, parts, contentType, { dedup = false } = {}) {
   return apiJsonRequest('/files/multipart/complete', {
     method: 'POST',
     body: JSON.stringify({
@@ -58,6 +80,7 @@ export async function completeUpload(uploadId, key, parts, contentType) {
       key,
       parts,
       contentType: contentType || 'application/octet-stream',
+      dedup,
     }),
   })
 }
@@ -118,46 +141,212 @@ export function uploadPart(uploadId, key, partNumber, chunk, onProgress) {
   })
 }
 
-export async function uploadFile(file, key, onProgress) {
+// PUT one part to its presigned MinIO URL; MinIO returns the part's ETag as a header.
+export function uploadPartDirect(url, partNumber, chunk, onProgress) {
+  return new Promise((resolve, reject) => {
+    const xhr = new XMLHttpRequest()
+    xhr.open('PUT', url)
+
+    xhr.upload.onprogress = (event) => {
+      if (onProgress && event.lengthComputable) {
+        onProgress(event.loaded, event.total)
+      }
+    }
+
+    xhr.onload = () => {
+      if (xhr.status >= 200 && xhr.status < 300) {
+        const etag = xhr.getResponseHeader('ETag')
+        if (!etag) {
+          reject(new Error('Missing ETag from MinIO'))
+          return
+        }
+        resolve({ partNumber, etag })
+        return
+      }
+      const error = new Error(`Part upload failed: HTTP ${xhr.status}`)
+      error.status = xhr.status
+      reject(error)
+    }
+
+    xhr.onerror = () => {
+      reject(new Error('Network error during upload'))
+    }
+
+    xhr.send(chunk)
+  })
+}
+
+// Unfinished uploads are remembered per file and destination folder, so re-selecting the
+// same file after a reload or network failure resumes from the parts the server already has.
+const RESUME_STORAGE_PREFIX = 'multipart-upload:'
+const PART_RETRIES = 3
+
+function resumeStorageKey(file, key) {
+  const folder = key.includes('/') ? key.slice(0, key.lastIndexOf('/')) : ''
+  return `${RESUME_STORAGE_PREFIX}${folder}:${file.name}:${file.size}:${file.lastModified}`
+}
+
+function loadResumeState(storageKey) {
+  try {
+    return JSON.parse(localStorage.getItem(storageKey) || 'null')
+  } catch {
+    return null
+  }
+}
+
+async function findResumableUpload(storageKey) {
+  const saved = loadResumeState(storageKey)
+  if (!saved?.uploadId || !saved?.key) return null
+  try {
+    // Parts sent straight to MinIO are not recorded by Django: ask MinIO for them
+    const status = await getUploadStatus(saved.uploadId, saved.key, DIRECT_PART_UPLOADS)
+    if (status.status === 'active' && status.partSize === MULTIPART_CHUNK_SIZE) {
+      return { uploadId: saved.uploadId, key: status.key || saved.key, parts: status.parts || [] }
+    }
+  } catch (error) {
+    console.warn('[multipartUploadService] Saved upload cannot be resumed:', error)
+  }
+  localStorage.removeItem(storageKey)
+  return null
+}
+
+async function uploadPartWithRetry(send) {
+  for (let attempt = 1; ; attempt += 1) {
+    try {
+      return await send(attempt)
+    } catch (error) {
+      if (attempt >= PART_RETRIES || !isRetryable(error)) throw error
+      await new Promise((resolve) => setTimeout(resolve, 1000 * 2 ** (attempt - 1)))
+    }
+  }
+}
+
+function isNetworkError(error) {
+  return error?.message === 'Network error during upload'
+}
+
+// 403 from MinIO: the presigned part URL expired; retried with a fresh URL
+function isRetryable(error) {
+  return isNetworkError(error) || error?.status === 403 || error?.status >= 500
+}
+
+// Presigned part URLs are fetched lazily, PART_URL_BATCH parts per request, so a long
+// upload never holds URLs that expire before their part is sent.
+function createPartUrlSource(uploadId, key, partNumbers) {
+  const urls = new Map()
+  return (partNumber, fresh = false) => {
+    if (fresh) urls.delete(partNumber)
+    if (!urls.has(partNumber)) {
+      const start = partNumbers.indexOf(partNumber)
+      const batch = partNumbers.slice(start, start + PART_URL_BATCH).filter((n) => n === partNumber || !urls.has(n))
+      const request = getPartUrls(uploadId, key, batch).then(
+        (data) => new Map((data.urls || []).map((u) => [u.partNumber, getFrontendUrl(u.url)])),
+      )
+      for (const n of batch) {
+        urls.set(n, request.then((byNumber) => byNumber.get(n)))
+      }
+      // A failed batch request must not poison later lookups
+      request.catch(() => batch.forEach((n) => urls.delete(n)))
+    }
+    return urls.get(partNumber)
+  }
+}
+
+// dedup: let the server reuse an already stored copy of the same file (the returned key may differ)
+export async function uploadFile(file, key, onProgress, { dedup = false } = {}) {
   let uploadId = null
+  const storageKey = resumeStorageKey(file, key)
   try {
-    const init = await initiateUpload(key, file.type || 'application/octet-stream')
-    uploadId = init.uploadId
+    const resumed = await findResumableUpload(storageKey)
+    const done = new Map()
+    if (resumed) {
+      uploadId = resumed.uploadId
+      key = resumed.key
+      for (const part of resumed.parts) {
+        done.set(part.partNumber, part)
+      }
+    } else {
+      const init = await initiateUpload(key, file.type || 'application/octet-stream', file.size)
+      uploadId = init.uploadId
+      localStorage.setItem(storageKey, JSON.stringify({ uploadId, key }))
+    }
 
     const totalParts = Math.ceil(file.size / MULTIPART_CHUNK_SIZE)
     const parts = []
-    let uploadedBytes = 0
+    const pending = []
+    const loadedByPart = new Map()
+    const chunkFor = (partNumber) => {
+      const start = (partNumber - 1) * MULTIPART_CHUNK_SIZE
+      return file.slice(start, Math.min(start + MULTIPART_CHUNK_SIZE, file.size))
+    }
+    const reportProgress = () => {
+      if (!onProgress) return
+      let loaded = 0
+      for (const value of loadedByPart.values()) loaded += value
+      onProgress(Math.floor((loaded / file.size) * 100), loaded, file.size)
+    }
 
     for (let partNumber = 1; partNumber <= totalParts; partNumber += 1) {
-      const start = (partNumber - 1) * MULTIPART_CHUNK_SIZE
-      const end = Math.min(start + MULTIPART_CHUNK_SIZE, file.size)
-      const chunk = file.slice(start, end)
-
-      const part = await uploadPart(uploadId, key, partNumber, chunk, (loaded) => {
-        if (!onProgress) return
-        const overallLoaded = uploadedBytes + loaded
-        const percent = Math.floor((overallLoaded / file.size) * 100)
-        onProgress(percent, overallLoaded, file.size)
-      })
+      const chunk = chunkFor(partNumber)
+      const existing = done.get(partNumber)
+      if (existing && existing.etag && (existing.size == null || existing.size === chunk.size)) {
+        // Already stored before the interruption
+        parts.push({ partNumber, etag: existing.etag })
+        loadedByPart.set(partNumber, chunk.size)
+      } else {
+        pending.push(partNumber)
+      }
+    }
+    reportProgress()
 
-      parts.push({
-        partNumber: part.partNumber || partNumber,
-        etag: part.etag,
+    const partUrl = DIRECT_PART_UPLOADS ? createPartUrlSource(uploadId, key, pending) : null
+    const sendPart = async (partNumber) => {
+      const chunk = chunkFor(partNumber)
+      const onLoaded = (loaded) => {
+        loadedByPart.set(partNumber, loaded)
+        reportProgress()
+      }
+      const part = await uploadPartWithRetry(async (attempt) => {
+        if (!partUrl) return uploadPart(uploadId, key, partNumber, chunk, onLoaded)
+        const url = await partUrl(partNumber, attempt > 1)
+        if (!url) throw new Error(`No upload URL for part ${partNumber}`)
+        return uploadPartDirect(url, partNumber, chunk, onLoaded)
       })
-      uploadedBytes += chunk.size
-      if (onProgress) {
-        const percent = Math.floor((uploadedBytes / file.size) * 100)
-        onProgress(percent, uploadedBytes, file.size)
+      parts.push({ partNumber: part.partNumber || partNumber, etag: part.etag })
+      loadedByPart.set(partNumber, chunk.size)
+      reportProgress()
+    }
+
+    // Parts are independent: with direct uploads several are in flight at once, so the
+    // throughput is bounded by the network rather than by Django workers.
+    let nextIndex = 0
+    let failed = false
+    const worker = async () => {
+      while (!failed && nextIndex < pending.length) {
+        try {
+          await sendPart(pending[nextIndex++])
+        } catch (error) {
+          // Stop the other workers before the upload is aborted
+          failed = true
+          throw error
+        }
       }
     }
+    const concurrency = DIRECT_PART_UPLOADS ? PART_UPLOAD_CONCURRENCY : 1
+    await Promise.all(Array.from({ length: Math.min(concurrency, pending.length) }, worker))
+    parts.sort((a, b) => a.partNumber - b.partNumber)
 
-    const completed = await completeUpload(uploadId, key, parts, file.type || 'application/octet-stream')
+    const completed = await completeUpload(uploadId, key, parts, file.type || 'application/octet-stream', { dedup })
+    localStorage.removeItem(storageKey)
     if (onProgress) {
       onProgress(100, file.size, file.size)
     }
     return completed
   } catch (error) {
-    if (uploadId) {
+    // After a network failure keep the upload so that the next attempt resumes it
+    // (the server aborts it if it is never resumed).
+    if (uploadId && !isNetworkError(error)) {
+      localStorage.removeItem(storageKey)
       try {
         await abortUpload(uploadId, key)
       } catch (abortError) {
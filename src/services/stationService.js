@@ -576,13 +576,14 @@ class StationService {
    * Upload file to Minio via direct upload (bypasses presigned URL issues)
    * @param {File} file - File object to upload
    * @param {string} prefix - Folder prefix (e.g., 'stations/photos')
+   * @param {boolean} dedup - Reuse an already stored copy of the same file (training materials)
    * @returns {Promise<string>} - The uploaded file key (path in Minio)
    */
-  async uploadFile(file, prefix = 'uploads', { onProgress } = {}) {
+  async uploadFile(file, prefix = 'uploads', { onProgress, dedup = false } = {}) {
     const key = `${prefix}/${Date.now()}_${file.name}`.replace(/\s+/g, '_')
     
     if (file.size > MULTIPART_THRESHOLD) {
-      const result = await multipartUploadFile(file, key, onProgress)
+      const result = await multipartUploadFile(file, key, onProgress, { dedup })
       return result.key || key
     }
 
@@ -595,7 +596,10 @@ class StationService {
     // Upload directly through Django backend (uses correct Minio credentials)
     // Use fetch directly instead of apiRequest to avoid Content-Type header issues with FormData
     const token = getAuthToken()
-    const fullUrl = `${API_BASE_URL}/files/upload`
+    // key/contentType in the query let the backend stream the body straight into MinIO
+    const params = new URLSearchParams({ key, contentType: file.type || 'application/octet-stream' })
+    if (dedup) params.set('dedup', '1')
+    const fullUrl = `${API_BASE_URL}/files/upload?${params}`
     
     const headers = {}
     if (token) {
@@ -628,7 +632,8 @@ class StationService {
     if (onProgress) {
       onProgress(100, file.size, file.size)
     }
-    return key
+    // With dedup the server may answer with the key of an identical, already stored file
+    return data.key || key
   }
 }
 
@@ -172,7 +172,8 @@ export function useCourseProgram(station, isEditing) {
       }
 
       const folder = `stations/${station.value.id}/course_program/topics/${activeTopic.value.topicKey || activeTopic.value.id}`
-      const objectKey = await stationService.uploadFile(file, folder)
+      // Одинаковые материалы для разных станций хранятся в MinIO один раз (dedup)
+      const objectKey = await stationService.uploadFile(file, folder, { dedup: true })
 
       const fileType = newTopicFileType.value
       const isMain = !!newTopicFileIsMain.value